@@ -28,6 +28,7 @@ CONTEXT = """
 - `customer_email`, `customer_name`, `description`
 - `source_type` (CharField) — what this payment is for: appointment, sale, invoice, link
 - `source_id` (UUIDField) — UUID of the linked record
+- `payment_link` (FK → PaymentLink, nullable, related_name='transactions') — link the payment was made through
 - `refund_amount`, `refunded_at`, `completed_at`, `error_message`
 - `metadata` (JSONField) — arbitrary extra data
 
@@ -40,14 +41,19 @@ CONTEXT = """
 - `customer_email` — optional pre-fill
 - `source_type`, `source_id` — link to the originating record (invoice, booking, etc.)
 
+**PaymentRefund**
+- `transaction` (FK → PaymentTransaction, related_name='refunds')
+- `amount`, `reason`, `gateway_refund_id` (unique per transaction when set), `created_at`
+
 ### Key flows
 
 1. **Setup**: Configure `PaymentGatewaySettings` with active_gateway and credentials.
 2. **Charge**: Create PaymentTransaction with status='pending', call gateway, then `.mark_completed()` or `.mark_failed(error)`.
-3. **Refund**: Call `.process_refund(amount)` — auto-sets status to refunded or partially_refunded.
-4. **Payment link**: Create PaymentLink with amount and title → share `full_url` → track `current_uses`.
+3. **Refund**: Call `.process_refund(amount, reason=...)` — records a PaymentRefund and auto-sets status to refunded or partially_refunded. The total can never exceed the transaction amount, even with concurrent refunds.
+4. **Payment link**: Create PaymentLink with amount and title → share `full_url` → track `current_uses` (consumed when a transaction with `payment_link` set is completed).
 
 ### Relationships
-- No direct FK to other models — uses `source_type` + `source_id` pattern to link to any record
+- No direct FK to other modules' models — uses `source_type` + `source_id` pattern to link to any record
+- PaymentTransaction.payment_link → PaymentLink; PaymentRefund.transaction → PaymentTransaction
 - PaymentTransaction and PaymentLink both use `source_type`/`source_id` for cross-module references
 """
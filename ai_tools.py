@@ -13,18 +13,22 @@ class ListPaymentTransactions(AssistantTool):
         "properties": {
             "status": {"type": "string", "description": "pending, processing, completed, failed, refunded"},
             "gateway": {"type": "string"}, "limit": {"type": "integer"},
+            "date_from": {"type": "string", "description": "First day included (YYYY-MM-DD)"},
+            "date_to": {"type": "string", "description": "Last day included (YYYY-MM-DD)"},
         },
         "required": [],
         "additionalProperties": False,
     }
 
     def execute(self, args, request):
+        from online_payments.dateranges import filter_date_range
         from online_payments.models import PaymentTransaction
         qs = PaymentTransaction.objects.all()
         if args.get('status'):
             qs = qs.filter(status=args['status'])
         if args.get('gateway'):
             qs = qs.filter(gateway=args['gateway'])
+        qs = filter_date_range(qs, 'created_at', args.get('date_from'), args.get('date_to'))
         limit = args.get('limit', 20)
         return {"transactions": [{"id": str(t.id), "transaction_id": t.transaction_id, "gateway": t.gateway, "amount": str(t.amount), "currency": t.currency, "status": t.status, "customer_name": t.customer_name, "created_at": t.created_at.isoformat()} for t in qs.order_by('-created_at')[:limit]]}
 
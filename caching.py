@@ -0,0 +1,154 @@
+"""
+Process-local caching helpers for the Online Payments module.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+_MISSING = object()
+
+_instances = []
+
+
+def clear_all():
+    """Empty every LocalCache in this process (used by tests and deploy hooks)."""
+    for cache in _instances:
+        cache.clear()
+
+
+class LocalCache:
+    """
+    Thread-safe LRU cache with an optional per-entry time to live.
+
+    Args:
+        maxsize: Maximum number of entries; the least recently used entry
+            is evicted when full.
+        ttl: Seconds an entry stays valid, or None to keep entries until
+            they are evicted.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        _instances.append(self)
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            value, expires = item
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=_MISSING):
+        ttl = self.ttl if ttl is _MISSING else ttl
+        expires = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._data)
+
+
+class HubObjectCache:
+    """
+    Per-hub object cache: process-local TTL LRU in front of an optional
+    Django cache backend.
+
+    Besides positive entries it keeps a short-lived negative entry for hubs
+    whose object is known not to exist yet, and a per-hub lock, so that
+    concurrent get-or-create paths collapse into a single INSERT.
+
+    Args:
+        prefix: Key prefix in the shared Django cache.
+        ttl: Seconds entries stay valid in both levels.
+        backend_alias: Django cache alias for the shared level, or None to
+            use the process-local level only.
+        maxsize: Maximum entries in the process-local level.
+        negative_ttl: Seconds a hub stays marked as missing.
+    """
+
+    def __init__(self, prefix, ttl=60, backend_alias=None, maxsize=1024,
+                 negative_ttl=5):
+        self.prefix = prefix
+        self.ttl = ttl
+        self.backend_alias = backend_alias
+        self._local = LocalCache(maxsize=maxsize, ttl=ttl)
+        self._missing = LocalCache(maxsize=maxsize, ttl=negative_ttl)
+        self._locks = LocalCache(maxsize=maxsize)
+        self._locks_guard = threading.Lock()
+
+    def _key(self, hub_id):
+        return f'{self.prefix}:{hub_id}'
+
+    def _backend(self):
+        if not self.backend_alias:
+            return None
+        from django.core.cache import caches
+        return caches[self.backend_alias]
+
+    def get(self, hub_id):
+        key = self._key(hub_id)
+        value = self._local.get(key)
+        if value is not None:
+            return value
+        backend = self._backend()
+        if backend is not None:
+            value = backend.get(key)
+            if value is not None:
+                self._local.set(key, value)
+        return value
+
+    def set(self, hub_id, value):
+        key = self._key(hub_id)
+        self._local.set(key, value)
+        self._missing.delete(key)
+        backend = self._backend()
+        if backend is not None:
+            backend.set(key, value, self.ttl)
+
+    def invalidate(self, hub_id):
+        key = self._key(hub_id)
+        self._local.delete(key)
+        self._missing.delete(key)
+        backend = self._backend()
+        if backend is not None:
+            backend.delete(key)
+
+    def mark_missing(self, hub_id):
+        self._missing.set(self._key(hub_id), True)
+
+    def is_known_missing(self, hub_id):
+        return self._key(hub_id) in self._missing
+
+    def lock(self, hub_id):
+        """Return the lock serialising get-or-create for ``hub_id``."""
+        key = self._key(hub_id)
+        with self._locks_guard:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = threading.Lock()
+                self._locks.set(key, lock)
+            return lock
@@ -0,0 +1,68 @@
+"""
+Half-open timestamp ranges for calendar-day filters.
+
+Filtering with ``created_at__date__gte=...`` makes the database cast every
+row's timestamp to a date before comparing, so no index on the column can
+be used. These helpers turn inclusive local dates into
+``[start, end)`` timestamp bounds instead, which compare directly against
+the indexed column. Days are taken in the active (hub) timezone, the same
+one ``__date`` lookups use.
+"""
+
+from datetime import date, datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+
+def parse_day(value):
+    """
+    Return ``value`` as a date, or None if it is empty or invalid.
+
+    Accepts a ``date`` or an ISO ``YYYY-MM-DD`` string.
+    """
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return parse_date(str(value).strip())
+    except ValueError:
+        return None
+
+
+def day_start(day, tz=None):
+    """Aware datetime of local midnight at the start of ``day``."""
+    return timezone.make_aware(
+        datetime.combine(day, time.min),
+        tz or timezone.get_current_timezone(),
+    )
+
+
+def day_range(day, tz=None):
+    """Half-open ``(start, end)`` bounds covering the local ``day``."""
+    return day_start(day, tz), day_start(day + timedelta(days=1), tz)
+
+
+def filter_date_range(queryset, field, date_from=None, date_to=None, tz=None):
+    """
+    Restrict ``queryset`` to rows whose ``field`` falls on the given days.
+
+    Args:
+        queryset: Queryset to filter.
+        field: Name of a DateTimeField.
+        date_from: First day included (date or ISO string). Optional.
+        date_to: Last day included (date or ISO string). Optional.
+        tz: Timezone the days are expressed in. Defaults to the active one.
+
+    Invalid or empty bounds are ignored.
+    """
+    date_from = parse_day(date_from)
+    date_to = parse_day(date_to)
+    if date_from:
+        queryset = queryset.filter(**{f'{field}__gte': day_start(date_from, tz)})
+    if date_to:
+        queryset = queryset.filter(**{f'{field}__lt': day_start(date_to + timedelta(days=1), tz)})
+    return queryset
@@ -0,0 +1,136 @@
+"""
+Bulk creation of payment links.
+
+Rows are validated one at a time with PaymentLinkForm and inserted in
+chunks with ``bulk_create``; slugs are generated up front and checked for
+collisions with one query per chunk instead of one per link.
+"""
+
+import csv
+import json
+
+from django.db import transaction
+
+from .forms import PaymentLinkForm
+from .models import PaymentLink
+
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Model defaults for columns a row may omit (e.g. currency, max_uses), so
+# bulk rows behave like links created through the model.
+ROW_DEFAULTS = {
+    name: PaymentLink._meta.get_field(name).get_default()
+    for name in PaymentLinkForm._meta.fields
+    if PaymentLink._meta.get_field(name).has_default()
+}
+
+
+class BulkLinkResult:
+    """Outcome of a bulk creation: created links and rejected rows."""
+
+    def __init__(self):
+        self.created = []
+        self.errors = []
+
+    @property
+    def created_count(self):
+        return len(self.created)
+
+    def as_dict(self):
+        return {
+            'created': self.created_count,
+            'links': self.created,
+            'errors': self.errors,
+        }
+
+
+def generate_slugs(count):
+    """
+    Return ``count`` new slugs unused in the database.
+
+    Slugs are drawn the same way as PaymentLink._generate_slug(); the rare
+    collisions are found with a single ``slug__in`` query and redrawn.
+    """
+    slugs = set()
+    while len(slugs) < count:
+        candidates = set()
+        while len(candidates) < count - len(slugs):
+            candidate = PaymentLink._generate_slug()
+            if candidate not in slugs:
+                candidates.add(candidate)
+        taken = set(
+            PaymentLink.all_objects.filter(slug__in=candidates)
+            .values_list('slug', flat=True)
+        )
+        slugs |= candidates - taken
+    return list(slugs)
+
+
+def _flush(hub_id, pending, result):
+    links = [link for _row, link in pending]
+    for link, slug in zip(links, generate_slugs(len(links))):
+        link.hub_id = hub_id
+        link.slug = slug
+    with transaction.atomic():
+        PaymentLink.all_objects.bulk_create(links)
+    result.created.extend(
+        {'row': row, 'id': str(link.id), 'slug': link.slug}
+        for row, link in pending
+    )
+
+
+def bulk_create_payment_links(hub_id, rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Validate and insert payment links in chunks.
+
+    Args:
+        hub_id: Hub the links belong to.
+        rows: Iterable of dicts with PaymentLinkForm fields. Consumed
+            lazily, so it may be a generator over a large file.
+        chunk_size: Links inserted per ``bulk_create`` call.
+
+    Returns:
+        BulkLinkResult. Invalid rows are reported by 1-based row number
+        and do not prevent the valid ones from being created.
+    """
+    result = BulkLinkResult()
+    pending = []
+
+    for row_number, row in enumerate(rows, start=1):
+        form = PaymentLinkForm(data={**ROW_DEFAULTS, **row})
+        if not form.is_valid():
+            result.errors.append({
+                'row': row_number,
+                'errors': {field: [str(e) for e in errs] for field, errs in form.errors.items()},
+            })
+            continue
+        pending.append((row_number, form.save(commit=False)))
+        if len(pending) >= chunk_size:
+            _flush(hub_id, pending, result)
+            pending = []
+
+    if pending:
+        _flush(hub_id, pending, result)
+
+    return result
+
+
+def read_rows(f, fmt):
+    """
+    Iterate over rows of a CSV (with header) or JSON Lines file.
+
+    Args:
+        f: Open text file.
+        fmt: ``csv`` or ``jsonl``.
+    """
+    if fmt == 'csv':
+        for row in csv.DictReader(f):
+            yield {key: value for key, value in row.items() if value not in (None, '')}
+    elif fmt == 'jsonl':
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    else:
+        raise ValueError(f'Unsupported format: {fmt}')
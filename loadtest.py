@@ -0,0 +1,377 @@
+"""
+Webhook load-test harness with a local fake gateway.
+
+FakeGateway produces Stripe- and Redsys-style notifications for a set of
+pending transactions, including duplicate deliveries, out-of-order events
+and refunds. Deliveries are replayed against ``api_webhook`` from a thread
+pool, either in-process through the Django test client or over HTTP to a
+running server, and the run is summarized as throughput, latency
+percentiles and lock contention.
+
+Stripe deliveries carry a real Stripe-Signature header. Redsys
+deliveries are signed with HMAC-SHA256 over Ds_MerchantParameters, but
+the per-order key is derived with SHA-256 instead of Redsys' 3DES, so
+Ds_Signature would not pass a verifier implementing the gateway's
+algorithm. The endpoint does not verify signatures today.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import PaymentTransaction
+from .search import build_search_text
+
+
+DEFAULT_SECRET = 'whsec_loadtest'
+
+# Sampling interval of the PostgreSQL lock monitor, in seconds.
+LOCK_SAMPLE_INTERVAL = 0.05
+
+LOCK_ERROR_MARKERS = ('lock', 'deadlock', 'could not serialize')
+
+
+class Delivery:
+    """One HTTP notification as the gateway would send it."""
+
+    __slots__ = ('gateway', 'body', 'headers', 'kind')
+
+    def __init__(self, gateway, body, headers, kind):
+        self.gateway = gateway
+        self.body = body
+        self.headers = headers
+        self.kind = kind
+
+
+class FakeGateway:
+    """Builds signed Stripe and Redsys notifications for load tests."""
+
+    def __init__(self, secret=DEFAULT_SECRET, seed=0):
+        self.secret = secret
+        self.rng = random.Random(seed)
+
+    def _stripe(self, event_type, obj, kind):
+        payload = {
+            'gateway': 'stripe',
+            'id': f'evt_{self.rng.getrandbits(96):024x}',
+            'type': event_type,
+            'created': int(time.time()),
+            'data': {'object': obj},
+        }
+        body = json.dumps(payload, separators=(',', ':')).encode()
+        timestamp = str(int(time.time()))
+        signature = hmac.new(
+            self.secret.encode(), f'{timestamp}.'.encode() + body, hashlib.sha256,
+        ).hexdigest()
+        return Delivery('stripe', body, {'Stripe-Signature': f't={timestamp},v1={signature}'}, kind)
+
+    def _redsys(self, order, response, amount, kind, transaction_type='0'):
+        params = {
+            'Ds_Order': order,
+            'Ds_Response': response,
+            'Ds_Amount': str(int(amount * 100)),
+            'Ds_Currency': '978',
+            'Ds_TransactionType': transaction_type,
+            'Ds_AuthorisationCode': f'{self.rng.randint(0, 999999):06d}',
+        }
+        encoded = base64.b64encode(json.dumps(params).encode()).decode()
+        # Not Redsys' 3DES order key: this only exercises the payload shape.
+        signature = base64.urlsafe_b64encode(hmac.new(
+            hashlib.sha256(self.secret.encode() + order.encode()).digest(),
+            encoded.encode(), hashlib.sha256,
+        ).digest()).decode()
+        payload = {
+            'gateway': 'redsys',
+            **params,
+            'Ds_MerchantParameters': encoded,
+            'Ds_Signature': signature,
+            'Ds_SignatureVersion': 'HMAC_SHA256_V1',
+        }
+        return Delivery('redsys', json.dumps(payload, separators=(',', ':')).encode(), {}, kind)
+
+    def notifications(self, transaction):
+        """Return the notifications a gateway would send for one payment."""
+        if transaction.gateway == 'redsys':
+            if self.rng.random() < 0.1:
+                return [self._redsys(transaction.transaction_id, '0190', transaction.amount, 'failed')]
+            return [self._redsys(transaction.transaction_id, '0000', transaction.amount, 'completed')]
+
+        metadata = {'transaction_id': transaction.transaction_id}
+        if self.rng.random() < 0.1:
+            return [self._stripe('checkout.session.expired', {'metadata': metadata}, 'failed')]
+        return [self._stripe('checkout.session.completed', {
+            'metadata': metadata,
+            'payment_intent': f'pi_{self.rng.getrandbits(96):024x}',
+            'payment_method_types': ['card'],
+        }, 'completed')]
+
+    def refund(self, transaction):
+        """Return a full refund notification for a Stripe payment."""
+        return self._stripe('charge.refunded', {
+            'metadata': {'transaction_id': transaction.transaction_id},
+            'amount_refunded': int(transaction.amount * 100),
+        }, 'refund')
+
+    def scenario(self, transactions, duplicate_ratio=0.1, out_of_order_ratio=0.1,
+                 refund_ratio=0.05):
+        """
+        Build a delivery sequence for ``transactions``.
+
+        Args:
+            transactions: PaymentTransaction instances to notify about.
+            duplicate_ratio: Share of deliveries redelivered later on.
+            out_of_order_ratio: Share of refunds sent before the payment
+                they refund, plus random neighbour swaps.
+            refund_ratio: Share of Stripe payments that are refunded.
+        """
+        deliveries = []
+        for txn in transactions:
+            events = self.notifications(txn)
+            if (txn.gateway == 'stripe' and events[0].kind == 'completed'
+                    and self.rng.random() < refund_ratio):
+                refund = self.refund(txn)
+                if self.rng.random() < out_of_order_ratio:
+                    events.insert(0, refund)
+                else:
+                    events.append(refund)
+            deliveries.extend(events)
+
+        for i in range(len(deliveries) - 1):
+            if self.rng.random() < out_of_order_ratio / 2:
+                deliveries[i], deliveries[i + 1] = deliveries[i + 1], deliveries[i]
+
+        duplicates = [d for d in deliveries if self.rng.random() < duplicate_ratio]
+        for delivery in duplicates:
+            deliveries.insert(self.rng.randint(0, len(deliveries)), delivery)
+        return deliveries
+
+
+def create_pending_transactions(hub_id, count, seed=0):
+    """Insert ``count`` pending transactions to receive notifications."""
+    rng = random.Random(seed)
+    now = timezone.now()
+    rows = []
+    for i in range(count):
+        txn = PaymentTransaction(
+            hub_id=hub_id,
+            transaction_id=f'TXN-{now:%Y%m%d%H%M%S}-{rng.getrandbits(32):08X}',
+            gateway=rng.choice(('stripe', 'stripe', 'redsys')),
+            amount=Decimal(rng.randint(500, 20000)) / 100,
+            currency='EUR',
+            status='pending',
+            customer_name=f'Load {i}',
+            customer_email=f'load{i}@example.com',
+        )
+        txn.search_text = build_search_text(txn)
+        rows.append(txn)
+    return PaymentTransaction.all_objects.bulk_create(rows, batch_size=2000)
+
+
+# =============================================================================
+# Transports
+# =============================================================================
+
+def _allowed_host():
+    """Return a Host header ALLOWED_HOSTS accepts outside the test runner."""
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+    return 'localhost'
+
+
+class InProcessTransport:
+    """
+    Posts deliveries through the Django test client (no network).
+
+    The client's default ``testserver`` host is only allowed under the
+    test runner, so requests use a host from ALLOWED_HOSTS instead.
+    """
+
+    def __init__(self):
+        from django.test import Client
+        self.url = reverse('online_payments:api_webhook')
+        self.host = _allowed_host()
+        self._local = threading.local()
+        self._client_class = Client
+
+    def _client(self):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self._client_class(
+                HTTP_HOST=self.host, SERVER_NAME=self.host,
+            )
+        return client
+
+    def send(self, delivery):
+        extra = {
+            'HTTP_' + name.upper().replace('-', '_'): value
+            for name, value in delivery.headers.items()
+        }
+        try:
+            response = self._client().post(
+                self.url, data=delivery.body, content_type='application/json', **extra,
+            )
+            return response.status_code, response.content
+        finally:
+            close_old_connections()
+
+
+class HttpTransport:
+    """Posts deliveries to a running server over a local socket."""
+
+    def __init__(self, url, timeout=30):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, delivery):
+        request = urllib.request.Request(
+            self.url, data=delivery.body, method='POST',
+            headers={'Content-Type': 'application/json', **delivery.headers},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+# =============================================================================
+# Runner
+# =============================================================================
+
+class LockMonitor:
+    """
+    Samples waiting lock requests on PostgreSQL while a run is active.
+
+    Other backends report zero; lock failures still show up as
+    ``lock_errors`` in the report.
+    """
+
+    def __init__(self, interval=LOCK_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples = 0
+        self.waits = 0
+        self.max_waiting = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if connection.vendor == 'postgresql':
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        try:
+            with connection.cursor() as cursor:
+                while not self._stop.wait(self.interval):
+                    cursor.execute('SELECT count(*) FROM pg_locks WHERE NOT granted')
+                    waiting = cursor.fetchone()[0]
+                    self.samples += 1
+                    self.waits += waiting
+                    self.max_waiting = max(self.max_waiting, waiting)
+        finally:
+            connection.close()
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_load(deliveries, transport=None, concurrency=8):
+    """
+    Send ``deliveries`` concurrently and report how the endpoint coped.
+
+    Returns:
+        dict with ``sent``, ``errors``, ``duplicates``, ``lock_errors``,
+        ``seconds``, ``throughput`` (requests/s), ``p50_ms``, ``p99_ms``,
+        ``max_ms`` and the PostgreSQL lock monitor figures
+        ``lock_wait_samples`` and ``max_waiting_locks``.
+    """
+    transport = transport or InProcessTransport()
+    latencies = []
+    counters = {'errors': 0, 'duplicates': 0, 'lock_errors': 0}
+    lock = threading.Lock()
+
+    def send(delivery):
+        start = time.perf_counter()
+        status, content = transport.send(delivery)
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            if status >= 400:
+                counters['errors'] += 1
+                text = content.decode(errors='replace').lower()
+                if any(marker in text for marker in LOCK_ERROR_MARKERS):
+                    counters['lock_errors'] += 1
+            elif b'"duplicate": true' in content:
+                counters['duplicates'] += 1
+
+    with LockMonitor() as monitor:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(send, deliveries))
+        seconds = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'sent': len(deliveries),
+        **counters,
+        'seconds': round(seconds, 3),
+        'throughput': round(len(deliveries) / seconds, 1) if seconds else 0.0,
+        'p50_ms': round(_percentile(latencies, 0.50), 2),
+        'p99_ms': round(_percentile(latencies, 0.99), 2),
+        'max_ms': round(latencies[-1], 2) if latencies else 0.0,
+        'lock_wait_samples': monitor.waits,
+        'max_waiting_locks': monitor.max_waiting,
+    }
+
+
+def drain_queue(concurrency=4, batch_size=500):
+    """
+    Process queued webhook events until the queue is empty.
+
+    Returns:
+        dict with ``processed`` events, ``seconds`` and ``throughput``
+        (events/s), for sizing the webhook workers.
+    """
+    from .webhooks import process_pending_events
+
+    processed = 0
+    with LockMonitor() as monitor:
+        started = time.perf_counter()
+        while True:
+            result = process_pending_events(limit=batch_size, concurrency=concurrency)
+            processed += result['processed']
+            if not result['claimed']:
+                break
+        seconds = time.perf_counter() - started
+
+    return {
+        'processed': processed,
+        'seconds': round(seconds, 3),
+        'throughput': round(processed / seconds, 1) if seconds else 0.0,
+        'lock_wait_samples': monitor.waits,
+        'max_waiting_locks': monitor.max_waiting,
+    }
@@ -0,0 +1,148 @@
+"""
+Scheduled maintenance jobs for the Online Payments module.
+
+Each job works in bounded batches, one short database transaction per
+batch, so it can run against a live hub without holding long locks.
+"""
+
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import PaymentDailyRollup, PaymentLink, PaymentTransaction
+
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Sessions that never got a gateway confirmation are expired after this.
+DEFAULT_STALE_AFTER = timedelta(hours=24)
+
+STALE_STATUSES = ('pending', 'processing')
+
+# Manual payments are confirmed by staff, not by a gateway callback, and
+# may legitimately stay open for days; they are never expired.
+NON_EXPIRING_GATEWAYS = ('manual',)
+
+EXPIRED_ERROR_MESSAGE = 'Expired: no confirmation received from the gateway'
+
+
+def _stale_hubs(statuses, cutoff):
+    return list(
+        PaymentTransaction.all_objects.filter(
+            status__in=statuses, created_at__lt=cutoff,
+        ).exclude(gateway__in=NON_EXPIRING_GATEWAYS).order_by().values_list('hub_id', flat=True).distinct()
+    )
+
+
+def _expire_batch(hub_id, status, cutoff, batch_size, now):
+    """Expire one batch of stale rows; returns the number of rows expired."""
+    with transaction.atomic():
+        rows = list(
+            PaymentTransaction.all_objects.select_for_update(skip_locked=True)
+            .filter(hub_id=hub_id, status=status, created_at__lt=cutoff)
+            .exclude(gateway__in=NON_EXPIRING_GATEWAYS)
+            .order_by('created_at')
+            .values_list('id', 'gateway', 'currency')[:batch_size]
+        )
+        if not rows:
+            return 0
+
+        expired = PaymentTransaction.all_objects.filter(
+            id__in=[pk for pk, _gateway, _currency in rows],
+            status=status,
+        ).update(
+            status='failed',
+            failed_at=now,
+            error_message=EXPIRED_ERROR_MESSAGE,
+            version=F('version') + 1,
+            updated_at=now,
+        )
+
+        buckets = Counter((gateway, currency) for _pk, gateway, currency in rows)
+        for (gateway, currency), count in buckets.items():
+            PaymentDailyRollup.record(hub_id, gateway, currency, now, failed_count=count)
+
+    return expired
+
+
+def expire_stale_transactions(hub_id=None, stale_after=DEFAULT_STALE_AFTER,
+                              statuses=STALE_STATUSES, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Mark pending/processing transactions older than ``stale_after`` as failed.
+
+    Works per hub and status so every batch is served by the
+    ``(hub_id, status, -created_at)`` index. Each batch locks its rows,
+    flips them with a single UPDATE and adds them to the day's
+    ``failed_count`` rollup in the same transaction. Rows locked by a
+    concurrent webhook are skipped and picked up on the next run. Manual
+    payments (NON_EXPIRING_GATEWAYS) are left alone.
+
+    Args:
+        hub_id: Only sweep this hub. Defaults to every hub.
+        stale_after: Age after which an unconfirmed transaction expires.
+        statuses: Statuses considered unconfirmed.
+        batch_size: Rows expired per UPDATE.
+
+    Returns:
+        Number of transactions expired.
+    """
+    now = timezone.now()
+    cutoff = now - stale_after
+    hubs = [hub_id] if hub_id else _stale_hubs(statuses, cutoff)
+
+    total = 0
+    for hub in hubs:
+        for status in statuses:
+            while True:
+                expired = _expire_batch(hub, status, cutoff, batch_size, now)
+                total += expired
+                if expired < batch_size:
+                    break
+    return total
+
+
+def _unavailable_links(now):
+    """Live links that can no longer be paid: expired or out of uses."""
+    return PaymentLink.all_objects.filter(
+        is_active=True, is_deleted=False,
+    ).filter(
+        Q(expires_at__lte=now) | Q(max_uses__gt=0, current_uses__gte=F('max_uses')),
+    )
+
+
+def deactivate_unavailable_links(hub_id=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Flip expired and exhausted payment links to inactive.
+
+    Scans only live links (served by the partial index on active links)
+    and deactivates them one batch per UPDATE. The UPDATE repeats the
+    availability condition, so a link extended concurrently is left alone.
+
+    Args:
+        hub_id: Only process this hub. Defaults to every hub.
+        batch_size: Links deactivated per UPDATE.
+
+    Returns:
+        Number of links deactivated.
+    """
+    now = timezone.now()
+    candidates = _unavailable_links(now)
+    if hub_id:
+        candidates = candidates.filter(hub_id=hub_id)
+
+    total = 0
+    while True:
+        ids = list(candidates.order_by().values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        total += _unavailable_links(now).filter(id__in=ids).update(
+            is_active=False,
+            version=F('version') + 1,
+            updated_at=now,
+        )
+        if len(ids) < batch_size:
+            break
+    return total
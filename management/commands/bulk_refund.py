@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from online_payments.models import PaymentTransaction
+from online_payments.refunds import DEFAULT_CHUNK_SIZE, DEFAULT_CONCURRENCY, bulk_refund
+
+
+class Command(BaseCommand):
+    help = 'Fully refund many transactions, e.g. all payments of a cancelled event.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hub', dest='hub_id', required=True, help='Hub ID the transactions belong to.')
+        parser.add_argument(
+            '--ids-file', default=None,
+            help='File with one transaction ID (TXN-...) per line.',
+        )
+        parser.add_argument(
+            '--source-type', default='',
+            help='Refund every transaction of this source type (with --source-id).',
+        )
+        parser.add_argument('--source-id', default=None, help='Source record UUID.')
+        parser.add_argument('--reason', default='', help='Reason stored on every refund.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help='Transactions loaded and written back per batch.',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+            help='Maximum gateway refund calls in flight.',
+        )
+
+    def handle(self, *args, **options):
+        selection = {}
+        if options['ids_file']:
+            try:
+                with open(options['ids_file'], encoding='utf-8') as f:
+                    selection['transaction_ids'] = [line.strip() for line in f if line.strip()]
+            except OSError as e:
+                raise CommandError(str(e))
+        elif options['source_type'] and options['source_id']:
+            selection['queryset'] = PaymentTransaction.objects.filter(
+                source_type=options['source_type'], source_id=options['source_id'],
+            )
+        else:
+            raise CommandError('Pass --ids-file, or --source-type and --source-id.')
+
+        result = bulk_refund(
+            options['hub_id'], reason=options['reason'][:255],
+            chunk_size=options['chunk_size'], concurrency=options['concurrency'],
+            **selection,
+        )
+
+        for error in result.errors:
+            self.stderr.write(f"{error['transaction_id']}: {error['error']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{result.refunded_count} transactions refunded ({result.refunded_amount}), '
+            f'{len(result.errors)} failed.'
+        ))
@@ -0,0 +1,43 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from online_payments.links import DEFAULT_CHUNK_SIZE, bulk_create_payment_links, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Create payment links in bulk from a CSV or JSON Lines file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with a header row, or JSON Lines file.')
+        parser.add_argument('--hub', dest='hub_id', required=True, help='Hub ID the links belong to.')
+        parser.add_argument(
+            '--format', choices=['csv', 'jsonl'], default=None,
+            help='Input format. Defaults to the file extension.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help='Links inserted per INSERT statement.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if fmt not in ('csv', 'jsonl'):
+            raise CommandError('Cannot infer the format; pass --format csv or --format jsonl.')
+
+        try:
+            with open(path, encoding='utf-8', newline='') as f:
+                result = bulk_create_payment_links(
+                    options['hub_id'], read_rows(f, fmt),
+                    chunk_size=options['chunk_size'],
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for error in result.errors:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{result.created_count} payment links created, {len(result.errors)} rows rejected.'
+        ))
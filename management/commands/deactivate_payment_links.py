@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from online_payments.maintenance import DEFAULT_BATCH_SIZE, deactivate_unavailable_links
+
+
+class Command(BaseCommand):
+    help = 'Deactivate payment links that have expired or used up all their uses.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hub', dest='hub_id', default=None,
+            help='Only process this hub ID.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help='Links deactivated per UPDATE.',
+        )
+
+    def handle(self, *args, **options):
+        deactivated = deactivate_unavailable_links(
+            hub_id=options['hub_id'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'{deactivated} payment links deactivated.'))
@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from online_payments.maintenance import (
+    DEFAULT_BATCH_SIZE, DEFAULT_STALE_AFTER, expire_stale_transactions,
+)
+
+
+class Command(BaseCommand):
+    help = 'Expire pending/processing transactions that never got a gateway confirmation.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hub', dest='hub_id', default=None,
+            help='Only sweep this hub ID.',
+        )
+        parser.add_argument(
+            '--older-than-hours', type=float,
+            default=DEFAULT_STALE_AFTER.total_seconds() / 3600,
+            help='Age after which an unconfirmed transaction expires.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help='Transactions expired per UPDATE.',
+        )
+
+    def handle(self, *args, **options):
+        expired = expire_stale_transactions(
+            hub_id=options['hub_id'],
+            stale_after=timedelta(hours=options['older_than_hours']),
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'{expired} stale transactions expired.'))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from online_payments.rollups import rebuild_rollups
+from online_payments.synthetic import DEFAULT_CHUNK_SIZE, generate
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic payment links and transactions for load testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hub', dest='hub_id', required=True, help='Hub ID to fill.')
+        parser.add_argument('--transactions', type=int, default=10000)
+        parser.add_argument('--links', type=int, default=100)
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Random seed. Use a new seed to add more rows to the same hub.',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='How far back in time transactions are spread.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help='Rows per INSERT statement.',
+        )
+        parser.add_argument(
+            '--skip-rollups', action='store_true',
+            help='Do not rebuild the daily rollups afterwards.',
+        )
+
+    def handle(self, *args, **options):
+        created = generate(
+            options['hub_id'],
+            transactions=options['transactions'],
+            links=options['links'],
+            seed=options['seed'],
+            days=options['days'],
+            chunk_size=options['chunk_size'],
+        )
+        self.stdout.write(
+            f"{created['transactions']} transactions and {created['links']} links created."
+        )
+
+        if not options['skip_rollups']:
+            written = rebuild_rollups(hub_id=options['hub_id'])
+            self.stdout.write(f'{written} rollup rows written.')
+
+        self.stdout.write(self.style.SUCCESS('Done.'))
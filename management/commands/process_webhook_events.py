@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from online_payments.webhooks import process_pending_events
+
+
+class Command(BaseCommand):
+    help = 'Process queued payment gateway webhook events.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Number of worker threads.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Events taken from the queue per batch.',
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep polling the queue instead of exiting when it is empty.',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Seconds to wait between polls when the queue is empty.',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            result = process_pending_events(
+                limit=options['batch_size'],
+                concurrency=options['concurrency'],
+            )
+            total += result['processed']
+            if result['claimed']:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'{total} webhook events processed.'))
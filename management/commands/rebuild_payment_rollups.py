@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from online_payments.rollups import DEFAULT_BATCH_SIZE, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily payment rollups from the transaction history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hub', dest='hub_id', default=None,
+            help='Only rebuild the rollups of this hub ID.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help='Transactions read per chunk and rollups written per INSERT.',
+        )
+
+    def handle(self, *args, **options):
+        written = rebuild_rollups(
+            hub_id=options['hub_id'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'{written} rollup rows written.'))
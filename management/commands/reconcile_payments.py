@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from online_payments.reconciliation import DEFAULT_CHUNK_SIZE, PARSERS, reconcile_file
+
+
+class Command(BaseCommand):
+    help = 'Reconcile the local ledger against a gateway settlement file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Settlement file exported from the gateway.')
+        parser.add_argument('--hub', dest='hub_id', required=True, help='Hub ID to reconcile.')
+        parser.add_argument('--gateway', required=True, choices=sorted(PARSERS))
+        parser.add_argument(
+            '--from', dest='period_start', default=None,
+            help='First day (YYYY-MM-DD) covered by the file.',
+        )
+        parser.add_argument(
+            '--to', dest='period_end', default=None,
+            help='Last day (YYYY-MM-DD) covered by the file.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help='Settlement rows joined against the ledger per query.',
+        )
+
+    def handle(self, *args, **options):
+        period = {}
+        for key in ('period_start', 'period_end'):
+            if options[key]:
+                period[key] = parse_date(options[key])
+                if period[key] is None:
+                    raise CommandError(f'Invalid date: {options[key]}')
+
+        try:
+            run = reconcile_file(
+                options['hub_id'], options['gateway'], options['path'],
+                chunk_size=options['chunk_size'], **period,
+            )
+        except OSError as e:
+            raise CommandError(str(e))
+
+        if run.status == 'failed':
+            raise CommandError(f'Reconciliation {run.pk} failed: {run.error_message}')
+
+        for kind, count in sorted(run.summary.items()):
+            self.stdout.write(f'  {kind}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Reconciliation {run.pk}: {run.records_count} records, '
+            f'{run.matched_count} matched, {run.mismatch_count} mismatches.'
+        ))
@@ -0,0 +1,55 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from online_payments.webhooks import process_events
+
+
+class Command(BaseCommand):
+    help = 'Replay gateway notifications from a JSON Lines export.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File with one webhook body per line.')
+        parser.add_argument(
+            '--hub', dest='hub_id', required=True,
+            help='Hub ID whose transactions the events apply to.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Events applied per batch.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        applied = errors = 0
+
+        def flush(batch):
+            nonlocal applied, errors
+            for result in process_events(batch, options['hub_id']):
+                if result['result'] == 'applied':
+                    applied += 1
+                elif result['result'] == 'error':
+                    errors += 1
+
+        batch = []
+        try:
+            with open(options['path'], encoding='utf-8') as f:
+                for line_number, line in enumerate(f, start=1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        batch.append(json.loads(line))
+                    except json.JSONDecodeError as e:
+                        raise CommandError(f'Line {line_number}: {e}')
+                    if len(batch) >= batch_size:
+                        flush(batch)
+                        batch = []
+        except OSError as e:
+            raise CommandError(str(e))
+        if batch:
+            flush(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{applied} events applied, {errors} errors.'
+        ))
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+
+from online_payments.loadtest import (
+    DEFAULT_SECRET, FakeGateway, HttpTransport, InProcessTransport,
+    create_pending_transactions, drain_queue, run_load,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay fake Stripe/Redsys notifications against api_webhook and report '
+        'throughput, latency percentiles and lock contention. Creates pending '
+        'transactions in the given hub; run it against a disposable database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hub', dest='hub_id', required=True, help='Hub ID to create payments in.')
+        parser.add_argument('--transactions', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent senders.')
+        parser.add_argument('--duplicates', type=float, default=0.1, help='Share of redelivered notifications.')
+        parser.add_argument('--out-of-order', type=float, default=0.1, help='Share of reordered notifications.')
+        parser.add_argument('--refunds', type=float, default=0.05, help='Share of Stripe payments refunded.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--secret', default=DEFAULT_SECRET, help='Signing secret of the fake gateway.')
+        parser.add_argument(
+            '--url', default=None,
+            help='Webhook URL of a running server. Defaults to in-process requests.',
+        )
+        parser.add_argument(
+            '--drain', action='store_true',
+            help='Process the queued events afterwards and report worker throughput.',
+        )
+        parser.add_argument('--workers', type=int, default=4, help='Worker threads used with --drain.')
+
+    def handle(self, *args, **options):
+        transactions = create_pending_transactions(
+            options['hub_id'], options['transactions'], seed=options['seed'],
+        )
+        deliveries = FakeGateway(options['secret'], seed=options['seed']).scenario(
+            transactions,
+            duplicate_ratio=options['duplicates'],
+            out_of_order_ratio=options['out_of_order'],
+            refund_ratio=options['refunds'],
+        )
+        transport = HttpTransport(options['url']) if options['url'] else InProcessTransport()
+
+        self.stdout.write(f"Sending {len(deliveries)} notifications with {options['concurrency']} senders...")
+        report = run_load(deliveries, transport, concurrency=options['concurrency'])
+        self._print('Ingest', report)
+
+        if options['drain']:
+            self._print('Workers', drain_queue(concurrency=options['workers']))
+
+        self.stdout.write(self.style.SUCCESS('Done.'))
+
+    def _print(self, title, report):
+        self.stdout.write(f'{title}:')
+        for key, value in report.items():
+            self.stdout.write(f'  {key}: {value}')
@@ -0,0 +1,44 @@
+# Generated by Django 6.0.2 on 2026-10-17 09:12
+
+import uuid
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('online_payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentDailyRollup',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('hub_id', models.UUIDField(blank=True, db_index=True, editable=False, help_text='Hub this record belongs to (for multi-tenancy)', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.UUIDField(blank=True, help_text='UUID of the user who created this record', null=True)),
+                ('updated_by', models.UUIDField(blank=True, help_text='UUID of the user who last updated this record', null=True)),
+                ('is_deleted', models.BooleanField(db_index=True, default=False, help_text='Soft delete flag - record is hidden but not removed')),
+                ('deleted_at', models.DateTimeField(blank=True, help_text='Timestamp when record was soft deleted', null=True)),
+                ('date', models.DateField(verbose_name='Date')),
+                ('gateway', models.CharField(max_length=20, verbose_name='Gateway')),
+                ('currency', models.CharField(default='EUR', max_length=3, verbose_name='Currency')),
+                ('completed_count', models.PositiveIntegerField(default=0, verbose_name='Completed Count')),
+                ('completed_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Completed Amount')),
+                ('failed_count', models.PositiveIntegerField(default=0, verbose_name='Failed Count')),
+                ('refund_count', models.PositiveIntegerField(default=0, verbose_name='Refund Count')),
+                ('refunded_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Refunded Amount')),
+            ],
+            options={
+                'verbose_name': 'Payment Daily Rollup',
+                'verbose_name_plural': 'Payment Daily Rollups',
+                'db_table': 'online_payments_daily_rollup',
+                'ordering': ['-date'],
+                'abstract': False,
+                'unique_together': {('hub_id', 'date', 'gateway', 'currency')},
+            },
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 6.0.2 on 2026-10-17 10:03
+
+from django.db import DatabaseError, migrations, models, transaction
+
+
+BATCH_SIZE = 2000
+
+SEARCH_FIELDS = (
+    'transaction_id', 'customer_name', 'customer_email', 'gateway_reference',
+)
+
+TRIGRAM_INDEX = 'online_payments_txn_search_trgm'
+
+
+def _normalize(value):
+    return ' '.join(str(value).split()).lower().replace('|', ' ')
+
+
+def backfill_search_text(apps, schema_editor):
+    PaymentTransaction = apps.get_model('online_payments', 'PaymentTransaction')
+    db_alias = schema_editor.connection.alias
+    queryset = PaymentTransaction.objects.using(db_alias).order_by('pk')
+
+    last_pk = None
+    while True:
+        batch_qs = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        batch = list(batch_qs.only('pk', *SEARCH_FIELDS)[:BATCH_SIZE])
+        if not batch:
+            break
+        for txn in batch:
+            txn.search_text = '|'.join(
+                _normalize(getattr(txn, field) or '') for field in SEARCH_FIELDS
+            )
+        PaymentTransaction.objects.using(db_alias).bulk_update(batch, ['search_text'])
+        last_pk = batch[-1].pk
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # pg_trgm may be unavailable to unprivileged roles; search still works
+    # without the index, only slower.
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} '
+                'ON online_payments_transaction USING gin (search_text gin_trgm_ops)'
+            )
+    except DatabaseError:
+        pass
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {TRIGRAM_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('online_payments', '0002_paymentdailyrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymenttransaction',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False, help_text='Normalized copy of the searchable fields.', verbose_name='Search Text'),
+        ),
+        migrations.AlterField(
+            model_name='paymenttransaction',
+            name='gateway_reference',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='Gateway-specific transaction ID.', max_length=255, verbose_name='Gateway Reference'),
+        ),
+        migrations.RunPython(backfill_search_text, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0.2 on 2026-10-17 12:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('online_payments', '0004_webhookevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webhookevent',
+            name='event_id',
+            field=models.CharField(blank=True, default='', help_text='Gateway event identifier used for deduplication.', max_length=255, verbose_name='Event ID'),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='duplicate_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of redeliveries rejected for this event.', verbose_name='Duplicate Count'),
+        ),
+        migrations.AddConstraint(
+            model_name='webhookevent',
+            constraint=models.UniqueConstraint(condition=models.Q(('event_id', ''), _negated=True), fields=('gateway', 'event_id'), name='online_payments_webhook_event_uniq'),
+        ),
+    ]
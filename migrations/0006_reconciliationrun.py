@@ -0,0 +1,48 @@
+# Generated by Django 6.0.2 on 2026-10-17 14:05
+
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('online_payments', '0005_webhookevent_dedup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReconciliationRun',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('hub_id', models.UUIDField(blank=True, db_index=True, editable=False, help_text='Hub this record belongs to (for multi-tenancy)', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.UUIDField(blank=True, help_text='UUID of the user who created this record', null=True)),
+                ('updated_by', models.UUIDField(blank=True, help_text='UUID of the user who last updated this record', null=True)),
+                ('is_deleted', models.BooleanField(db_index=True, default=False, help_text='Soft delete flag - record is hidden but not removed')),
+                ('deleted_at', models.DateTimeField(blank=True, help_text='Timestamp when record was soft deleted', null=True)),
+                ('gateway', models.CharField(max_length=20, verbose_name='Gateway')),
+                ('source_name', models.CharField(blank=True, default='', help_text='Settlement file the run was computed from.', max_length=255, verbose_name='Source')),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='running', max_length=20, verbose_name='Status')),
+                ('period_start', models.DateField(blank=True, null=True, verbose_name='Period Start')),
+                ('period_end', models.DateField(blank=True, help_text='Inclusive. Local transactions completed in the period but absent from the file are reported as missing.', null=True, verbose_name='Period End')),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Started At')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Finished At')),
+                ('records_count', models.PositiveIntegerField(default=0, verbose_name='Records')),
+                ('matched_count', models.PositiveIntegerField(default=0, verbose_name='Matched')),
+                ('mismatch_count', models.PositiveIntegerField(default=0, verbose_name='Mismatches')),
+                ('summary', models.JSONField(blank=True, default=dict, help_text='Mismatch counts by kind.', verbose_name='Summary')),
+                ('mismatches', models.JSONField(blank=True, default=list, verbose_name='Mismatches')),
+                ('error_message', models.TextField(blank=True, default='', verbose_name='Error Message')),
+            ],
+            options={
+                'verbose_name': 'Reconciliation Run',
+                'verbose_name_plural': 'Reconciliation Runs',
+                'db_table': 'online_payments_reconciliation_run',
+                'ordering': ['-started_at'],
+                'abstract': False,
+            },
+        ),
+    ]
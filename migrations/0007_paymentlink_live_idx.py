@@ -0,0 +1,17 @@
+# Generated by Django 6.0.2 on 2026-10-17 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('online_payments', '0006_reconciliationrun'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paymentlink',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_deleted', False)), fields=['hub_id', '-created_at'], name='online_payments_link_live_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.2 on 2026-10-17 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('online_payments', '0007_paymentlink_live_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paymenttransaction',
+            index=models.Index(fields=['hub_id', '-created_at'], name='online_paym_hub_id_ae658a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymenttransaction',
+            index=models.Index(fields=['hub_id', 'gateway', '-created_at'], name='online_paym_hub_id_f12ba4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymenttransaction',
+            index=models.Index(fields=['hub_id', 'completed_at'], name='online_paym_hub_id_7afe8c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentlink',
+            index=models.Index(fields=['hub_id', 'is_active', '-created_at'], name='online_paym_hub_id_1b96b3_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.2 on 2026-10-17 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('online_payments', '0008_query_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymenttransaction',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented on every write; used for optimistic concurrency.', verbose_name='Version'),
+        ),
+        migrations.AddField(
+            model_name='paymentlink',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented on every write; used for optimistic concurrency.', verbose_name='Version'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.0.2 on 2026-10-17 16:45
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('online_payments', '0009_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentRefund',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('hub_id', models.UUIDField(blank=True, db_index=True, editable=False, help_text='Hub this record belongs to (for multi-tenancy)', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.UUIDField(blank=True, help_text='UUID of the user who created this record', null=True)),
+                ('updated_by', models.UUIDField(blank=True, help_text='UUID of the user who last updated this record', null=True)),
+                ('is_deleted', models.BooleanField(db_index=True, default=False, help_text='Soft delete flag - record is hidden but not removed')),
+                ('deleted_at', models.DateTimeField(blank=True, help_text='Timestamp when record was soft deleted', null=True)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Amount')),
+                ('reason', models.CharField(blank=True, default='', max_length=255, verbose_name='Reason')),
+                ('gateway_refund_id', models.CharField(blank=True, default='', help_text='Refund identifier returned by the gateway (e.g. re_... on Stripe).', max_length=255, verbose_name='Gateway Refund ID')),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='refunds', to='online_payments.paymenttransaction', verbose_name='Transaction')),
+            ],
+            options={
+                'verbose_name': 'Payment Refund',
+                'verbose_name_plural': 'Payment Refunds',
+                'db_table': 'online_payments_refund',
+                'ordering': ['-created_at'],
+                'abstract': False,
+                'indexes': [models.Index(fields=['transaction', '-created_at'], name='online_paym_transac_92c80c_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('gateway_refund_id', ''), _negated=True), fields=('transaction', 'gateway_refund_id'), name='online_payments_refund_gateway_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.2 on 2026-10-17 17:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('online_payments', '0010_paymentrefund'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymenttransaction',
+            name='payment_link',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transactions', to='online_payments.paymentlink', verbose_name='Payment Link'),
+        ),
+        migrations.AddIndex(
+            model_name='paymenttransaction',
+            index=models.Index(fields=['payment_link', '-created_at'], name='online_paym_payment_c7ba20_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 6.0.2 on 2026-10-17 17:12
+
+from django.db import migrations, transaction
+
+
+BATCH_SIZE = 2000
+
+
+def backfill_payment_link(apps, schema_editor):
+    """Resolve metadata['payment_link_slug'] into the payment_link FK."""
+    PaymentTransaction = apps.get_model('online_payments', 'PaymentTransaction')
+    PaymentLink = apps.get_model('online_payments', 'PaymentLink')
+    db_alias = schema_editor.connection.alias
+    queryset = PaymentTransaction.objects.using(db_alias).filter(
+        payment_link__isnull=True, metadata__has_key='payment_link_slug',
+    ).order_by('pk')
+
+    last_pk = None
+    while True:
+        batch_qs = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        batch = list(batch_qs.values_list('pk', 'hub_id', 'metadata')[:BATCH_SIZE])
+        if not batch:
+            break
+        last_pk = batch[-1][0]
+
+        slugs = {metadata.get('payment_link_slug') for _pk, _hub, metadata in batch} - {'', None}
+        links = {
+            slug: (link_id, hub_id)
+            for slug, link_id, hub_id in PaymentLink.objects.using(db_alias)
+            .filter(slug__in=slugs).values_list('slug', 'id', 'hub_id')
+        }
+        updates = []
+        for pk, hub_id, metadata in batch:
+            link = links.get(metadata.get('payment_link_slug'))
+            if link and link[1] == hub_id:
+                updates.append(PaymentTransaction(pk=pk, payment_link_id=link[0]))
+        # One short transaction per batch, so the backfill never holds
+        # locks on the whole table.
+        with transaction.atomic(using=db_alias):
+            PaymentTransaction.objects.using(db_alias).bulk_update(updates, ['payment_link'])
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('online_payments', '0011_paymenttransaction_payment_link'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_payment_link, migrations.RunPython.noop),
+    ]
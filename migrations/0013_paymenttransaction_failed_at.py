@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-17 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('online_payments', '0012_backfill_transaction_payment_link'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymenttransaction',
+            name='failed_at',
+            field=models.DateTimeField(blank=True, help_text='When the transaction failed; its day holds the failure in the rollups.', null=True, verbose_name='Failed At'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.0.2 on 2026-10-17 18:41
+
+from django.db import migrations, transaction
+from django.db.models import F
+
+
+BATCH_SIZE = 2000
+
+
+def backfill_failed_at(apps, schema_editor):
+    """Freeze the failure time of failed rows at their current updated_at."""
+    PaymentTransaction = apps.get_model('online_payments', 'PaymentTransaction')
+    db_alias = schema_editor.connection.alias
+    queryset = PaymentTransaction.objects.using(db_alias).filter(
+        status='failed', failed_at__isnull=True,
+    ).order_by('pk')
+
+    last_pk = None
+    while True:
+        batch_qs = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        pks = list(batch_qs.values_list('pk', flat=True)[:BATCH_SIZE])
+        if not pks:
+            break
+        last_pk = pks[-1]
+        # One short transaction per batch, so the backfill never holds
+        # locks on the whole table.
+        with transaction.atomic(using=db_alias):
+            PaymentTransaction.objects.using(db_alias).filter(pk__in=pks).update(
+                failed_at=F('updated_at'),
+            )
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('online_payments', '0013_paymenttransaction_failed_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_failed_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-17 19:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('online_payments', '0014_backfill_transaction_failed_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paymentrefund',
+            name='transaction',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='refunds', to='online_payments.paymenttransaction', verbose_name='Transaction'),
+        ),
+    ]
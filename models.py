@@ -1,17 +1,93 @@
+import copy
 import uuid
 from decimal import Decimal
 
-from django.db import models
+from django.conf import settings as django_settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest, Least
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from apps.core.models import HubBaseModel
 
+from .caching import HubObjectCache
+from .search import SEARCH_FIELDS, build_search_text
+
+
+class ConcurrentUpdateError(Exception):
+    """The row changed between being read and being written; reload and retry."""
+
+
+def retry_on_conflict(instance, apply, attempts=3):
+    """
+    Call ``apply(instance)``, reloading the instance after a conflict.
+
+    Args:
+        instance: Versioned model instance the operation writes.
+        apply: Callable taking the instance; it must re-validate against
+            the reloaded state, as the model write methods do.
+        attempts: Calls made before the ConcurrentUpdateError is re-raised.
+
+    Returns:
+        Whatever ``apply`` returns.
+    """
+    for attempt in range(attempts):
+        try:
+            return apply(instance)
+        except ConcurrentUpdateError:
+            if attempt == attempts - 1:
+                raise
+            instance.refresh_from_db()
+
+
+def save_versioned(instance, save, *args, **kwargs):
+    """
+    Run ``save`` for a versioned instance as a compare-and-swap on ``version``.
+
+    New rows are saved as usual. An existing row is first moved to the next
+    version with ``UPDATE ... WHERE id = ? AND version = ?``, then written
+    in full in the same database transaction, so a plain ``save()`` cannot
+    overwrite a concurrent transition, refund or save.
+
+    Raises:
+        ConcurrentUpdateError: The row was written since ``instance`` was
+            loaded. Reload and retry (see retry_on_conflict()).
+    """
+    if instance._state.adding or kwargs.get('force_insert'):
+        return save(*args, **kwargs)
+
+    if kwargs.get('update_fields') is not None:
+        kwargs['update_fields'] = [*kwargs['update_fields'], 'version']
+    manager = type(instance).all_objects
+    expected = instance.version
+    with transaction.atomic(using=kwargs.get('using')):
+        if not manager.filter(pk=instance.pk, version=expected).update(version=expected + 1):
+            current = manager.filter(pk=instance.pk).values_list('version', flat=True).first()
+            raise ConcurrentUpdateError(
+                f'{type(instance).__name__} {instance.pk} changed (version {expected} -> {current}).'
+            )
+        instance.version = expected + 1
+        try:
+            return save(*args, **kwargs)
+        except Exception:
+            instance.version = expected
+            raise
+
 
 # ---------------------------------------------------------------------------
 # Payment Gateway Settings
 # ---------------------------------------------------------------------------
 
+# Settings are read on every dashboard, checkout and session request but
+# change rarely; cache them per hub and invalidate on write.
+settings_cache = HubObjectCache(
+    'online_payments:settings',
+    ttl=getattr(django_settings, 'ONLINE_PAYMENTS_SETTINGS_CACHE_TTL', 60),
+    backend_alias=getattr(django_settings, 'ONLINE_PAYMENTS_SETTINGS_CACHE', None),
+)
+
+
 class PaymentGatewaySettings(HubBaseModel):
     """Per-hub payment gateway configuration."""
 
@@ -130,17 +206,56 @@ class PaymentGatewaySettings(HubBaseModel):
     def __str__(self):
         return f"Payment Gateway Settings (hub {self.hub_id})"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._invalidate_cache()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self._invalidate_cache()
+        return result
+
+    def _invalidate_cache(self):
+        hub_id = self.hub_id
+        settings_cache.invalidate(hub_id)
+        # Readers may have re-cached the old row before our transaction
+        # committed; drop it again once the write is visible.
+        transaction.on_commit(lambda: settings_cache.invalidate(hub_id))
+
     @classmethod
     def get_settings(cls, hub_id):
-        """Get or create settings singleton for the given hub."""
-        try:
-            return cls.all_objects.get(hub_id=hub_id)
-        except cls.DoesNotExist:
-            from django.db import IntegrityError
+        """Get or create settings singleton for the given hub.
+
+        Served from ``settings_cache``; callers get their own copy and may
+        modify and save it.
+        """
+        settings = settings_cache.get(hub_id)
+        if settings is None:
+            settings = cls._get_or_create_settings(hub_id)
+            settings_cache.set(hub_id, settings)
+        return copy.copy(settings)
+
+    @classmethod
+    def _get_or_create_settings(cls, hub_id):
+        if not settings_cache.is_known_missing(hub_id):
             try:
-                return cls.all_objects.create(hub_id=hub_id)
-            except IntegrityError:
                 return cls.all_objects.get(hub_id=hub_id)
+            except cls.DoesNotExist:
+                settings_cache.mark_missing(hub_id)
+
+        # Only one thread per hub attempts the INSERT; the others wait and
+        # pick up the cached row.
+        with settings_cache.lock(hub_id):
+            settings = settings_cache.get(hub_id)
+            if settings is not None:
+                return settings
+            try:
+                with transaction.atomic():
+                    settings = cls.all_objects.create(hub_id=hub_id)
+            except IntegrityError:
+                settings = cls.all_objects.get(hub_id=hub_id)
+            settings_cache.set(hub_id, settings)
+            return settings
 
 
 # ---------------------------------------------------------------------------
@@ -191,6 +306,7 @@ class PaymentTransaction(HubBaseModel):
         max_length=255,
         blank=True,
         default='',
+        db_index=True,
         help_text=_('Gateway-specific transaction ID.'),
     )
     payment_method_type = models.CharField(
@@ -232,6 +348,16 @@ class PaymentTransaction(HubBaseModel):
         null=True,
         blank=True,
     )
+    payment_link = models.ForeignKey(
+        'PaymentLink',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='transactions',
+        verbose_name=_('Payment Link'),
+        # Covered by the (payment_link, -created_at) index below.
+        db_index=False,
+    )
 
     # Metadata
     metadata = models.JSONField(
@@ -267,6 +393,29 @@ class PaymentTransaction(HubBaseModel):
         blank=True,
     )
 
+    # Failure
+    failed_at = models.DateTimeField(
+        _('Failed At'),
+        null=True,
+        blank=True,
+        help_text=_('When the transaction failed; its day holds the failure in the rollups.'),
+    )
+
+    # Search
+    search_text = models.TextField(
+        _('Search Text'),
+        blank=True,
+        default='',
+        editable=False,
+        help_text=_('Normalized copy of the searchable fields.'),
+    )
+    version = models.PositiveIntegerField(
+        _('Version'),
+        default=1,
+        editable=False,
+        help_text=_('Incremented on every write; used for optimistic concurrency.'),
+    )
+
     class Meta(HubBaseModel.Meta):
         db_table = 'online_payments_transaction'
         verbose_name = _('Payment Transaction')
@@ -275,6 +424,14 @@ class PaymentTransaction(HubBaseModel):
         indexes = [
             models.Index(fields=['hub_id', 'status', '-created_at']),
             models.Index(fields=['hub_id', 'source_type', 'source_id']),
+            # Unfiltered transaction list and dashboard recent transactions
+            models.Index(fields=['hub_id', '-created_at']),
+            # Transaction list filtered by gateway
+            models.Index(fields=['hub_id', 'gateway', '-created_at']),
+            # Completion-date ranges (reconciliation of a settlement period)
+            models.Index(fields=['hub_id', 'completed_at']),
+            # Payments of a link, newest first (per-link listings and analytics)
+            models.Index(fields=['payment_link', '-created_at']),
         ]
 
     def __str__(self):
@@ -283,7 +440,55 @@ class PaymentTransaction(HubBaseModel):
     def save(self, *args, **kwargs):
         if not self.transaction_id:
             self.transaction_id = self._generate_transaction_id()
-        super().save(*args, **kwargs)
+        self.search_text = build_search_text(self)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = list(update_fields)
+            if set(update_fields) & set(SEARCH_FIELDS):
+                update_fields.append('search_text')
+            kwargs['update_fields'] = update_fields
+        save_versioned(self, super().save, *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        """Soft-delete the transaction and take it out of the daily rollups."""
+        if self.is_deleted:
+            return super().delete(*args, **kwargs)
+        # Read before the soft delete moves updated_at.
+        contributions = self._rollup_contributions()
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            for when, deltas in contributions:
+                PaymentDailyRollup.record(
+                    self.hub_id, self.gateway, self.currency, when,
+                    **{field: -value for field, value in deltas.items()},
+                )
+        return result
+
+    def _rollup_contributions(self):
+        """
+        Return the rollup deltas this transaction added, as rebuild_rollups()
+        counts them: [(when, {counter: delta})].
+        """
+        contributions = []
+        if self.completed_at is not None:
+            contributions.append((
+                self.completed_at, {'completed_count': 1, 'completed_amount': self.amount},
+            ))
+        if self.status == 'failed':
+            contributions.append((self.failure_time(), {'failed_count': 1}))
+        refunds = list(self.refunds.values_list('amount', 'created_at'))
+        for amount, created_at in refunds:
+            contributions.append((created_at, {'refund_count': 1, 'refunded_amount': amount}))
+        if not refunds and self.refund_amount and self.refunded_at is not None:
+            contributions.append((
+                self.refunded_at, {'refund_count': 1, 'refunded_amount': self.refund_amount},
+            ))
+        return contributions
+
+    def failure_time(self):
+        """When the transaction failed; rows failed before failed_at existed fall back to updated_at."""
+        return self.failed_at or self.updated_at
 
     @staticmethod
     def _generate_transaction_id():
@@ -293,28 +498,199 @@ class PaymentTransaction(HubBaseModel):
         suffix = uuid.uuid4().hex[:8].upper()
         return f"TXN-{prefix}-{suffix}"
 
-    def mark_completed(self):
-        """Mark the transaction as completed."""
-        self.status = 'completed'
-        self.completed_at = timezone.now()
-        self.save(update_fields=['status', 'completed_at', 'updated_at'])
+    # Statuses each target status may be entered from.
+    TRANSITIONS = {
+        'processing': ('pending',),
+        'completed': ('pending', 'processing', 'failed'),
+        'failed': ('pending', 'processing'),
+        'refunded': ('completed', 'partially_refunded'),
+        'partially_refunded': ('completed', 'partially_refunded'),
+    }
+
+    REFUNDABLE_STATUSES = ('completed', 'partially_refunded')
+
+    def transition(self, status, allowed_from=None, expected=None, **changes):
+        """
+        Atomically move the transaction to ``status``.
+
+        Issues a single ``UPDATE ... WHERE id = ? AND version = ? AND
+        status IN (...)`` that also carries ``changes`` and bumps the
+        version, so of two concurrent writers only one can apply, without
+        taking a row lock.
+
+        Args:
+            status: Target status.
+            allowed_from: Statuses the row must currently be in. Defaults
+                to TRANSITIONS[status].
+            expected: Extra ``{field: value}`` the row must still hold.
+            **changes: Other fields written in the same UPDATE.
+
+        Returns:
+            True if the row was updated; the instance then reflects the new
+            state. False if the row is in a state the transition does not
+            allow; the instance is left untouched.
+
+        Raises:
+            ConcurrentUpdateError: The row was written since this instance
+                was loaded. Reload and retry (see retry_on_conflict()).
+        """
+        if allowed_from is None:
+            allowed_from = self.TRANSITIONS[status]
+
+        values = {'status': status, 'updated_at': timezone.now(), **changes}
+        if status == 'failed':
+            values.setdefault('failed_at', values['updated_at'])
+        if set(values) & set(SEARCH_FIELDS):
+            preview = copy.copy(self)
+            for field, value in values.items():
+                setattr(preview, field, value)
+            values['search_text'] = build_search_text(preview)
+
+        manager = type(self).all_objects
+        updated = manager.filter(
+            pk=self.pk, version=self.version, status__in=allowed_from,
+            **(expected or {}),
+        ).update(version=F('version') + 1, **values)
+        if not updated:
+            current = manager.filter(pk=self.pk).values_list('version', flat=True).first()
+            if current != self.version:
+                raise ConcurrentUpdateError(
+                    f'Transaction {self.transaction_id} changed (version {self.version} -> {current}).'
+                )
+            return False
+
+        for field, value in values.items():
+            setattr(self, field, value)
+        self.version += 1
+        return True
+
+    def mark_completed(self, **changes):
+        """
+        Mark the transaction as completed.
+
+        Gateway fields passed as keyword arguments (e.g. gateway_reference)
+        are written in the same UPDATE. A use of the payment link the
+        transaction was paid through is consumed in the same database
+        transaction.
+
+        Returns:
+            True if this call completed the transaction, False if it was
+            already completed or can no longer be completed.
+        """
+        # A late completion of a failed payment takes back its failure,
+        # which was counted on the day it failed.
+        failed_at = self.failure_time() if self.status == 'failed' else None
+        with transaction.atomic():
+            applied = self.transition('completed', completed_at=timezone.now(), **changes)
+            if applied:
+                PaymentDailyRollup.record(
+                    self.hub_id, self.gateway, self.currency, self.completed_at,
+                    completed_count=1, completed_amount=self.amount,
+                )
+                if failed_at is not None:
+                    PaymentDailyRollup.record(
+                        self.hub_id, self.gateway, self.currency, failed_at,
+                        failed_count=-1,
+                    )
+                if self.payment_link_id:
+                    PaymentLink.consume(pk=self.payment_link_id)
+        return applied
 
     def mark_failed(self, error=''):
-        """Mark the transaction as failed."""
-        self.status = 'failed'
-        self.error_message = error
-        self.save(update_fields=['status', 'error_message', 'updated_at'])
+        """
+        Mark the transaction as failed.
 
-    def process_refund(self, amount=None):
+        Returns:
+            True if this call failed the transaction, False if it had
+            already left the pending/processing states.
+        """
+        with transaction.atomic():
+            applied = self.transition('failed', error_message=error)
+            if applied:
+                PaymentDailyRollup.record(
+                    self.hub_id, self.gateway, self.currency, self.failed_at,
+                    failed_count=1,
+                )
+        return applied
+
+    def process_refund(self, amount=None, reason='', gateway_refund_id=''):
         """
         Process a refund for this transaction.
 
+        Adds the amount to ``refund_amount`` with a single guarded UPDATE
+        (``refund_amount + amount <= amount``) and records a PaymentRefund
+        in the same database transaction. Concurrent partial refunds all
+        apply as long as their total fits, without a row lock and without
+        comparing the version.
+
         Args:
-            amount: Amount to refund. If None, refunds the full amount.
+            amount: Amount to refund. If None, refunds the remaining amount.
+            reason: Why the refund was issued.
+            gateway_refund_id: Gateway identifier of the refund. A refund
+                already recorded under the same identifier is not applied
+                again.
+
+        Returns:
+            True if the refund was applied, False if the transaction is not
+            refundable, the stored refunds leave no room for the amount or
+            the gateway refund was already recorded.
+
+        Raises:
+            ValueError: If the amount is invalid.
         """
         if amount is None:
-            amount = self.amount
+            amount = self.amount - self.refund_amount
+        amount = self.validate_refund(amount)
+        now = timezone.now()
+        manager = type(self).all_objects
+
+        try:
+            with transaction.atomic():
+                updated = manager.filter(
+                    pk=self.pk,
+                    status__in=self.REFUNDABLE_STATUSES,
+                    refund_amount__lte=F('amount') - amount,
+                ).update(
+                    refund_amount=F('refund_amount') + amount,
+                    status=Case(
+                        When(refund_amount__gte=F('amount') - amount, then=Value('refunded')),
+                        default=Value('partially_refunded'),
+                    ),
+                    refunded_at=now,
+                    updated_at=now,
+                    version=F('version') + 1,
+                )
+                if not updated:
+                    return False
+                PaymentRefund.all_objects.create(
+                    hub_id=self.hub_id,
+                    transaction=self,
+                    amount=amount,
+                    reason=reason,
+                    gateway_refund_id=gateway_refund_id,
+                )
+                PaymentDailyRollup.record(
+                    self.hub_id, self.gateway, self.currency, now,
+                    refund_count=1, refunded_amount=amount,
+                )
+        except IntegrityError:
+            # The gateway refund was recorded by a concurrent delivery.
+            return False
 
+        self.refresh_from_db(fields=['status', 'refund_amount', 'refunded_at', 'updated_at', 'version'])
+        return True
+
+    def validate_refund(self, amount):
+        """
+        Check a refund amount against the loaded refund total.
+
+        Returns:
+            The amount as a Decimal.
+
+        Raises:
+            ValueError: If the amount is not positive or exceeds the
+                remaining refundable amount.
+        """
         amount = Decimal(str(amount))
 
         if amount <= Decimal('0.00'):
@@ -326,18 +702,159 @@ class PaymentTransaction(HubBaseModel):
                 _('Refund amount (%(amount)s) exceeds maximum refundable (%(max)s).')
                 % {'amount': amount, 'max': max_refundable}
             )
+        return amount
+
+
+# ---------------------------------------------------------------------------
+# Payment Refund
+# ---------------------------------------------------------------------------
+
+class PaymentRefund(HubBaseModel):
+    """One refund issued against a transaction."""
+
+    transaction = models.ForeignKey(
+        PaymentTransaction,
+        on_delete=models.CASCADE,
+        related_name='refunds',
+        verbose_name=_('Transaction'),
+        # Covered by the (transaction, -created_at) index below.
+        db_index=False,
+    )
+    amount = models.DecimalField(
+        _('Amount'),
+        max_digits=10,
+        decimal_places=2,
+    )
+    reason = models.CharField(
+        _('Reason'),
+        max_length=255,
+        blank=True,
+        default='',
+    )
+    gateway_refund_id = models.CharField(
+        _('Gateway Refund ID'),
+        max_length=255,
+        blank=True,
+        default='',
+        help_text=_('Refund identifier returned by the gateway (e.g. re_... on Stripe).'),
+    )
+
+    class Meta(HubBaseModel.Meta):
+        db_table = 'online_payments_refund'
+        verbose_name = _('Payment Refund')
+        verbose_name_plural = _('Payment Refunds')
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['transaction', '-created_at']),
+        ]
+        constraints = [
+            # Redelivered gateway notifications must not record a refund twice.
+            models.UniqueConstraint(
+                fields=['transaction', 'gateway_refund_id'],
+                condition=~models.Q(gateway_refund_id=''),
+                name='online_payments_refund_gateway_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Refund {self.amount} ({self.gateway_refund_id or self.pk})"
+
+
+# ---------------------------------------------------------------------------
+# Payment Daily Rollup
+# ---------------------------------------------------------------------------
+
+class PaymentDailyRollup(HubBaseModel):
+    """Per-hub daily payment KPIs, maintained incrementally on state changes."""
+
+    date = models.DateField(
+        _('Date'),
+    )
+    gateway = models.CharField(
+        _('Gateway'),
+        max_length=20,
+    )
+    currency = models.CharField(
+        _('Currency'),
+        max_length=3,
+        default='EUR',
+    )
+
+    # Completed bucket
+    completed_count = models.PositiveIntegerField(
+        _('Completed Count'),
+        default=0,
+    )
+    completed_amount = models.DecimalField(
+        _('Completed Amount'),
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+    )
+
+    # Failed bucket
+    failed_count = models.PositiveIntegerField(
+        _('Failed Count'),
+        default=0,
+    )
+
+    # Refund bucket
+    refund_count = models.PositiveIntegerField(
+        _('Refund Count'),
+        default=0,
+    )
+    refunded_amount = models.DecimalField(
+        _('Refunded Amount'),
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+    )
+
+    COUNTER_FIELDS = (
+        'completed_count', 'completed_amount', 'failed_count',
+        'refund_count', 'refunded_amount',
+    )
+
+    class Meta(HubBaseModel.Meta):
+        db_table = 'online_payments_daily_rollup'
+        verbose_name = _('Payment Daily Rollup')
+        verbose_name_plural = _('Payment Daily Rollups')
+        ordering = ['-date']
+        unique_together = [('hub_id', 'date', 'gateway', 'currency')]
+
+    def __str__(self):
+        return f"Rollup {self.date} {self.gateway} {self.currency} (hub {self.hub_id})"
 
-        self.refund_amount += amount
-        self.refunded_at = timezone.now()
+    @classmethod
+    def record(cls, hub_id, gateway, currency, when, **deltas):
+        """
+        Add counter deltas to a rollup bucket.
 
-        if self.refund_amount >= self.amount:
-            self.status = 'refunded'
-        else:
-            self.status = 'partially_refunded'
+        Must run inside the same database transaction as the state change
+        it accounts for. Counters are incremented with F() expressions so
+        concurrent writers never lose updates.
 
-        self.save(update_fields=[
-            'refund_amount', 'refunded_at', 'status', 'updated_at',
-        ])
+        Args:
+            hub_id: Hub the bucket belongs to.
+            gateway: Gateway of the accounted transactions.
+            currency: Currency of the accounted transactions.
+            when: Datetime of the event; its local date selects the day.
+            **deltas: Counter field increments (see COUNTER_FIELDS).
+                Negative deltas never take a counter below zero.
+        """
+        rollup, _created = cls.all_objects.get_or_create(
+            hub_id=hub_id,
+            date=timezone.localdate(when),
+            gateway=gateway,
+            currency=currency,
+        )
+        cls.all_objects.filter(pk=rollup.pk).update(
+            updated_at=timezone.now(),
+            **{
+                field: F(field) + value if value >= 0 else Greatest(F(field) + value, 0)
+                for field, value in deltas.items()
+            },
+        )
 
 
 # ---------------------------------------------------------------------------
@@ -407,12 +924,29 @@ class PaymentLink(HubBaseModel):
         null=True,
         blank=True,
     )
+    version = models.PositiveIntegerField(
+        _('Version'),
+        default=1,
+        editable=False,
+        help_text=_('Incremented on every write; used for optimistic concurrency.'),
+    )
 
     class Meta(HubBaseModel.Meta):
         db_table = 'online_payments_link'
         verbose_name = _('Payment Link')
         verbose_name_plural = _('Payment Links')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['hub_id', 'is_active', '-created_at']),
+            # Live links only: serves the dashboard count, the active
+            # listing and the deactivation job without touching the
+            # ever-growing set of inactive links.
+            models.Index(
+                fields=['hub_id', '-created_at'],
+                condition=models.Q(is_active=True, is_deleted=False),
+                name='online_payments_link_live_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.amount} {self.currency})"
@@ -420,13 +954,82 @@ class PaymentLink(HubBaseModel):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = self._generate_slug()
-        super().save(*args, **kwargs)
+        save_versioned(self, super().save, *args, **kwargs)
 
     @staticmethod
     def _generate_slug():
         """Generate a unique URL-safe slug."""
         return uuid.uuid4().hex[:12]
 
+    @classmethod
+    def consume(cls, **lookup):
+        """
+        Atomically consume one use of the link matching ``lookup``.
+
+        Runs a single conditional UPDATE, so concurrent payers can neither
+        lose increments nor push ``current_uses`` past ``max_uses``.
+
+        Returns:
+            True if a use was granted, False if the link is exhausted or
+            does not exist.
+        """
+        updated = cls.all_objects.filter(**lookup).filter(
+            models.Q(max_uses=0) | models.Q(current_uses__lt=F('max_uses')),
+        ).update(
+            current_uses=F('current_uses') + 1,
+            version=F('version') + 1,
+            updated_at=timezone.now(),
+        )
+        return updated > 0
+
+    @classmethod
+    def consume_bulk(cls, counts):
+        """
+        Consume several uses per link, one UPDATE per link.
+
+        Usage is capped at ``max_uses`` for limited links.
+
+        Args:
+            counts: Mapping of link id to number of uses to consume.
+        """
+        now = timezone.now()
+        for link_id, count in counts.items():
+            cls.all_objects.filter(pk=link_id).update(
+                current_uses=Case(
+                    When(max_uses=0, then=F('current_uses') + count),
+                    default=Least(F('current_uses') + count, F('max_uses')),
+                ),
+                version=F('version') + 1,
+                updated_at=now,
+            )
+
+    def consume_use(self):
+        """Consume one use of this link. Returns True if the use was granted."""
+        granted = type(self).consume(pk=self.pk)
+        if granted:
+            self.current_uses += 1
+            self.version += 1
+        return granted
+
+    def deactivate(self):
+        """
+        Deactivate the link if it has not changed since it was loaded.
+
+        Raises:
+            ConcurrentUpdateError: The link was written concurrently.
+        """
+        now = timezone.now()
+        updated = type(self).all_objects.filter(pk=self.pk, version=self.version).update(
+            is_active=False,
+            version=F('version') + 1,
+            updated_at=now,
+        )
+        if not updated:
+            raise ConcurrentUpdateError(f'Payment link {self.slug} changed.')
+        self.is_active = False
+        self.version += 1
+        self.updated_at = now
+
     @property
     def is_expired(self):
         """Check if the payment link has expired."""
@@ -450,3 +1053,179 @@ class PaymentLink(HubBaseModel):
         """Return the full public URL for this payment link."""
         from django.urls import reverse
         return reverse('online_payments:checkout', kwargs={'slug': self.slug})
+
+
+# ---------------------------------------------------------------------------
+# Webhook Event
+# ---------------------------------------------------------------------------
+
+class WebhookEvent(HubBaseModel):
+    """Inbound gateway notification, stored on receipt and processed asynchronously."""
+
+    STATUS_CHOICES = [
+        ('pending', _('Pending')),
+        ('processing', _('Processing')),
+        ('processed', _('Processed')),
+        ('failed', _('Failed')),
+    ]
+
+    gateway = models.CharField(
+        _('Gateway'),
+        max_length=20,
+    )
+    event_id = models.CharField(
+        _('Event ID'),
+        max_length=255,
+        blank=True,
+        default='',
+        help_text=_('Gateway event identifier used for deduplication.'),
+    )
+    payload = models.TextField(
+        _('Payload'),
+        help_text=_('Raw request body as received from the gateway.'),
+    )
+    status = models.CharField(
+        _('Status'),
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending',
+    )
+    received_at = models.DateTimeField(
+        _('Received At'),
+        default=timezone.now,
+    )
+    processed_at = models.DateTimeField(
+        _('Processed At'),
+        null=True,
+        blank=True,
+    )
+    attempts = models.PositiveSmallIntegerField(
+        _('Attempts'),
+        default=0,
+    )
+    error_message = models.TextField(
+        _('Error Message'),
+        blank=True,
+        default='',
+    )
+    duplicate_count = models.PositiveIntegerField(
+        _('Duplicate Count'),
+        default=0,
+        help_text=_('Number of redeliveries rejected for this event.'),
+    )
+
+    class Meta(HubBaseModel.Meta):
+        db_table = 'online_payments_webhook_event'
+        verbose_name = _('Webhook Event')
+        verbose_name_plural = _('Webhook Events')
+        ordering = ['received_at']
+        indexes = [
+            models.Index(fields=['status', 'received_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['gateway', 'event_id'],
+                condition=~models.Q(event_id=''),
+                name='online_payments_webhook_event_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Webhook {self.gateway} {self.received_at:%Y-%m-%d %H:%M:%S} ({self.status})"
+
+
+# =============================================================================
+# Reconciliation
+# =============================================================================
+
+class ReconciliationRun(HubBaseModel):
+    """Result of comparing the local ledger against a gateway settlement file."""
+
+    STATUS_CHOICES = [
+        ('running', _('Running')),
+        ('completed', _('Completed')),
+        ('failed', _('Failed')),
+    ]
+
+    MISMATCH_KINDS = (
+        'missing_local',
+        'missing_remote',
+        'amount_drift',
+        'status_drift',
+    )
+
+    gateway = models.CharField(
+        _('Gateway'),
+        max_length=20,
+    )
+    source_name = models.CharField(
+        _('Source'),
+        max_length=255,
+        blank=True,
+        default='',
+        help_text=_('Settlement file the run was computed from.'),
+    )
+    status = models.CharField(
+        _('Status'),
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='running',
+    )
+    period_start = models.DateField(
+        _('Period Start'),
+        null=True,
+        blank=True,
+    )
+    period_end = models.DateField(
+        _('Period End'),
+        null=True,
+        blank=True,
+        help_text=_('Inclusive. Local transactions completed in the period '
+                    'but absent from the file are reported as missing.'),
+    )
+    started_at = models.DateTimeField(
+        _('Started At'),
+        default=timezone.now,
+    )
+    finished_at = models.DateTimeField(
+        _('Finished At'),
+        null=True,
+        blank=True,
+    )
+    records_count = models.PositiveIntegerField(
+        _('Records'),
+        default=0,
+    )
+    matched_count = models.PositiveIntegerField(
+        _('Matched'),
+        default=0,
+    )
+    mismatch_count = models.PositiveIntegerField(
+        _('Mismatches'),
+        default=0,
+    )
+    summary = models.JSONField(
+        _('Summary'),
+        default=dict,
+        blank=True,
+        help_text=_('Mismatch counts by kind.'),
+    )
+    mismatches = models.JSONField(
+        _('Mismatches'),
+        default=list,
+        blank=True,
+    )
+    error_message = models.TextField(
+        _('Error Message'),
+        blank=True,
+        default='',
+    )
+
+    class Meta(HubBaseModel.Meta):
+        db_table = 'online_payments_reconciliation_run'
+        verbose_name = _('Reconciliation Run')
+        verbose_name_plural = _('Reconciliation Runs')
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"Reconciliation {self.gateway} {self.started_at:%Y-%m-%d %H:%M} ({self.status})"
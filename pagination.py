@@ -0,0 +1,126 @@
+"""
+Keyset (cursor) pagination for transaction listings.
+
+Pages are addressed by the ``(created_at, id)`` of their boundary rows
+instead of an OFFSET, so fetching a page costs the same regardless of how
+deep it is, and no COUNT(*) over the filtered queryset is needed.
+"""
+
+import base64
+import json
+import uuid
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class CursorPage:
+    """A page of results plus opaque cursors to its neighbours."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def encode_cursor(obj, direction):
+    """Encode an opaque cursor pointing at ``obj`` in the given direction."""
+    payload = json.dumps({
+        'd': direction,
+        't': obj.created_at.isoformat(),
+        'id': str(obj.pk),
+    }, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Decode a cursor produced by encode_cursor().
+
+    Returns:
+        (direction, created_at, pk) or None if the token is malformed.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction = payload['d']
+        created_at = parse_datetime(payload['t'])
+        pk = uuid.UUID(payload['id'])
+    except (ValueError, TypeError, KeyError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or created_at is None:
+        return None
+    return direction, created_at, pk
+
+
+def paginate_by_cursor(queryset, cursor, per_page):
+    """
+    Return one CursorPage of ``queryset`` ordered newest first.
+
+    Args:
+        queryset: Filtered queryset; its ordering is replaced by
+            ``(-created_at, -id)``.
+        cursor: Token from a previous page, or empty for the first page.
+        per_page: Number of rows per page.
+    """
+    decoded = decode_cursor(cursor) if cursor else None
+
+    if decoded is None:
+        rows = list(queryset.order_by('-created_at', '-id')[:per_page + 1])
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        return CursorPage(
+            rows,
+            next_cursor=encode_cursor(rows[-1], NEXT) if has_more else None,
+        )
+
+    direction, created_at, pk = decoded
+
+    if direction == NEXT:
+        rows = list(queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk),
+        ).order_by('-created_at', '-id')[:per_page + 1])
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        if not rows:
+            return CursorPage(rows)
+        return CursorPage(
+            rows,
+            next_cursor=encode_cursor(rows[-1], NEXT) if has_more else None,
+            previous_cursor=encode_cursor(rows[0], PREVIOUS),
+        )
+
+    rows = list(queryset.filter(
+        Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk),
+    ).order_by('created_at', 'id')[:per_page + 1])
+    has_more = len(rows) > per_page
+    rows = list(reversed(rows[:per_page]))
+    if not rows:
+        return CursorPage(rows)
+    return CursorPage(
+        rows,
+        next_cursor=encode_cursor(rows[-1], NEXT),
+        previous_cursor=encode_cursor(rows[0], PREVIOUS) if has_more else None,
+    )
@@ -0,0 +1,380 @@
+"""
+Reconciliation of the local ledger against gateway settlement files.
+
+Settlement files are streamed and processed in chunks. Each chunk is
+indexed in memory by ``transaction_id`` and ``gateway_reference`` and
+joined against the ledger with a single query, instead of one lookup per
+settlement row. Mismatches are stored on a ReconciliationRun.
+"""
+
+import csv
+import os
+import unicodedata
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from typing import NamedTuple
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .dateranges import filter_date_range
+from .models import PaymentTransaction, ReconciliationRun
+
+
+DEFAULT_CHUNK_SIZE = 5000
+
+# Only the first mismatches are stored on the run; counts are always complete.
+MAX_STORED_MISMATCHES = 10000
+
+SETTLED_STATUSES = ('completed', 'refunded', 'partially_refunded')
+REFUNDED_STATUSES = ('refunded', 'partially_refunded')
+
+LEDGER_FIELDS = (
+    'id', 'transaction_id', 'gateway_reference',
+    'amount', 'currency', 'status', 'refund_amount',
+)
+
+# ISO 4217 numeric codes used by Redsys.
+REDSYS_CURRENCIES = {
+    '978': 'EUR',
+    '840': 'USD',
+    '826': 'GBP',
+    '756': 'CHF',
+}
+
+
+class SettlementRecord(NamedTuple):
+    """One normalized row of a settlement file."""
+
+    line: int
+    kind: str  # 'payment', 'refund' or 'failed'
+    transaction_id: str
+    reference: str
+    amount: Decimal
+    currency: str
+
+
+# =============================================================================
+# Parsers
+# =============================================================================
+
+def _normalize_header(name):
+    name = unicodedata.normalize('NFKD', name or '')
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    return ' '.join(name.strip().lower().split())
+
+
+def _pick(row, candidates):
+    for name in candidates:
+        value = row.get(name)
+        if value:
+            return value.strip()
+    return ''
+
+
+def _parse_amount(value):
+    value = value.strip().replace(' ', '')
+    if ',' in value and '.' in value:
+        # 1.234,56 (es) or 1,234.56 (en): the last separator is the decimal one.
+        if value.rfind(',') > value.rfind('.'):
+            value = value.replace('.', '').replace(',', '.')
+        else:
+            value = value.replace(',', '')
+    else:
+        value = value.replace(',', '.')
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f'Invalid amount: {value!r}')
+
+
+def _dict_rows(f):
+    """Yield (line, row) from a delimited file with a header, keys normalized."""
+    header = f.readline()
+    delimiter = ';' if header.count(';') > header.count(',') else ','
+    fieldnames = [_normalize_header(h) for h in next(csv.reader([header], delimiter=delimiter))]
+    for line, row in enumerate(csv.DictReader(f, fieldnames=fieldnames, delimiter=delimiter), start=2):
+        yield line, row
+
+
+STRIPE_TRANSACTION_ID_COLUMNS = (
+    'payment_metadata[transaction_id]', 'metadata[transaction_id]',
+    'transaction_id (metadata)', 'transaction_id',
+)
+STRIPE_REFERENCE_COLUMNS = ('payment_intent_id', 'payment_intent', 'source_id', 'source')
+STRIPE_AMOUNT_COLUMNS = ('gross', 'amount')
+STRIPE_TYPE_COLUMNS = ('reporting_category', 'type')
+STRIPE_PAYMENT_TYPES = ('charge', 'payment')
+STRIPE_REFUND_TYPES = ('refund', 'payment_refund')
+
+
+def parse_stripe_settlement(f):
+    """
+    Stream a Stripe balance-transaction export (CSV).
+
+    Accepts both the dashboard export and the itemized balance report
+    column names. Amounts are in major units. Rows that are not charges or
+    refunds (fees, payouts, adjustments) are skipped.
+    """
+    for line, row in _dict_rows(f):
+        row_type = _pick(row, STRIPE_TYPE_COLUMNS).lower()
+        if row_type in STRIPE_PAYMENT_TYPES:
+            kind = 'payment'
+        elif row_type in STRIPE_REFUND_TYPES:
+            kind = 'refund'
+        else:
+            continue
+        yield SettlementRecord(
+            line=line,
+            kind=kind,
+            transaction_id=_pick(row, STRIPE_TRANSACTION_ID_COLUMNS),
+            reference=_pick(row, STRIPE_REFERENCE_COLUMNS),
+            amount=abs(_parse_amount(_pick(row, STRIPE_AMOUNT_COLUMNS) or '0')),
+            currency=_pick(row, ('currency',)).upper(),
+        )
+
+
+REDSYS_ORDER_COLUMNS = ('pedido', 'no pedido', 'numero pedido', 'numero de pedido', 'ds_order', 'order')
+REDSYS_AMOUNT_COLUMNS = ('importe', 'amount')
+REDSYS_CURRENCY_COLUMNS = ('moneda', 'ds_currency', 'currency')
+REDSYS_RESPONSE_COLUMNS = ('resultado', 'respuesta', 'codigo respuesta', 'ds_response', 'response')
+REDSYS_TYPE_COLUMNS = ('tipo operacion', 'tipo de operacion', 'ds_transactiontype', 'type')
+REDSYS_REFERENCE_COLUMNS = ('codigo autorizacion', 'ds_authorisationcode', 'authorisation code')
+REDSYS_REFUND_TYPES = ('3', 'devolucion', 'refund')
+
+
+def _redsys_approved(response):
+    response = response.strip().lower()
+    if response.isdigit():
+        return int(response) <= 99
+    return response.startswith(('autoriz', 'aprob', 'approved', 'ok'))
+
+
+def parse_redsys_settlement(f):
+    """
+    Stream a Redsys settlement file (semicolon or comma separated).
+
+    Amounts may be given in major units (``importe``, ``10,50``) or in cents
+    (``ds_amount``). Denied operations are yielded with kind ``failed``.
+    """
+    for line, row in _dict_rows(f):
+        if row.get('ds_amount'):
+            amount = Decimal(row['ds_amount'].strip()) / 100
+        else:
+            amount = _parse_amount(_pick(row, REDSYS_AMOUNT_COLUMNS) or '0')
+
+        currency = _pick(row, REDSYS_CURRENCY_COLUMNS).upper()
+        currency = REDSYS_CURRENCIES.get(currency, currency)
+
+        op_type = _normalize_header(_pick(row, REDSYS_TYPE_COLUMNS))
+        if op_type in REDSYS_REFUND_TYPES:
+            kind = 'refund'
+        elif _redsys_approved(_pick(row, REDSYS_RESPONSE_COLUMNS) or '0000'):
+            kind = 'payment'
+        else:
+            kind = 'failed'
+
+        yield SettlementRecord(
+            line=line,
+            kind=kind,
+            transaction_id=_pick(row, REDSYS_ORDER_COLUMNS),
+            reference=_pick(row, REDSYS_REFERENCE_COLUMNS),
+            amount=abs(amount),
+            currency=currency,
+        )
+
+
+PARSERS = {
+    'stripe': parse_stripe_settlement,
+    'redsys': parse_redsys_settlement,
+}
+
+
+# =============================================================================
+# Reconciliation
+# =============================================================================
+
+class _Report:
+    """Accumulates mismatches while a run is in progress."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.items = []
+
+    def add(self, kind, **details):
+        self.counts[kind] += 1
+        if len(self.items) < MAX_STORED_MISMATCHES:
+            self.items.append({'kind': kind, **details})
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+
+def _compare(record, ledger, report):
+    """Compare one settlement record with its ledger row."""
+    _pk, transaction_id, _ref, amount, currency, status, refund_amount = ledger
+    details = {
+        'line': record.line,
+        'transaction_id': transaction_id,
+        'reference': record.reference,
+    }
+
+    if record.kind == 'payment':
+        if record.amount != amount or (record.currency and record.currency != currency):
+            report.add(
+                'amount_drift', **details,
+                local_amount=f'{amount} {currency}',
+                remote_amount=f'{record.amount} {record.currency}',
+            )
+        if status not in SETTLED_STATUSES:
+            report.add('status_drift', **details, local_status=status, remote_status='settled')
+
+    elif record.kind == 'refund':
+        if status not in REFUNDED_STATUSES:
+            report.add('status_drift', **details, local_status=status, remote_status='refunded')
+        elif record.amount > refund_amount:
+            report.add(
+                'amount_drift', **details,
+                local_amount=f'{refund_amount} {currency}',
+                remote_amount=f'{record.amount} {record.currency}',
+            )
+
+    elif status in SETTLED_STATUSES:
+        report.add('status_drift', **details, local_status=status, remote_status='failed')
+
+
+def _join_chunk(base, chunk, report, matched):
+    """Hash-join a chunk of settlement records against the ledger."""
+    by_transaction_id = {}
+    by_reference = {}
+    for record in chunk:
+        if record.transaction_id:
+            by_transaction_id.setdefault(record.transaction_id, []).append(record)
+        elif record.reference:
+            by_reference.setdefault(record.reference, []).append(record)
+        else:
+            report.add('missing_local', line=record.line, transaction_id='', reference='')
+
+    if not by_transaction_id and not by_reference:
+        return
+
+    ledger_rows = base.filter(
+        Q(transaction_id__in=list(by_transaction_id))
+        | Q(gateway_reference__in=list(by_reference)),
+    ).values_list(*LEDGER_FIELDS)
+
+    seen = set()
+    for row in ledger_rows:
+        pk, transaction_id, reference = row[0], row[1], row[2]
+        records = by_transaction_id.get(transaction_id, [])
+        if reference in by_reference:
+            records = records + by_reference[reference]
+            seen.add(('ref', reference))
+        if transaction_id in by_transaction_id:
+            seen.add(('id', transaction_id))
+        for record in records:
+            _compare(record, row, report)
+        if records:
+            matched.add(pk)
+
+    for key, records in by_transaction_id.items():
+        if ('id', key) not in seen:
+            for record in records:
+                if record.kind != 'failed':
+                    report.add('missing_local', line=record.line,
+                               transaction_id=key, reference=record.reference)
+    for key, records in by_reference.items():
+        if ('ref', key) not in seen:
+            for record in records:
+                if record.kind != 'failed':
+                    report.add('missing_local', line=record.line,
+                               transaction_id='', reference=key)
+
+
+def _find_missing_remote(base, period_start, period_end, matched, report, chunk_size):
+    """Report settled ledger rows in the period that the file never mentioned."""
+    rows = filter_date_range(
+        base.filter(status__in=SETTLED_STATUSES),
+        'completed_at', period_start, period_end,
+    ).values_list('id', 'transaction_id', 'gateway_reference').iterator(chunk_size=chunk_size)
+
+    for pk, transaction_id, reference in rows:
+        if pk not in matched:
+            report.add('missing_remote', line=None,
+                       transaction_id=transaction_id, reference=reference)
+
+
+def reconcile(hub_id, gateway, records, source_name='', period_start=None,
+              period_end=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Reconcile settlement records against the hub's ledger.
+
+    Args:
+        hub_id: Hub whose transactions are reconciled.
+        gateway: ``stripe`` or ``redsys``.
+        records: Iterable of SettlementRecord, consumed lazily.
+        source_name: Label stored on the run (usually the file name).
+        period_start, period_end: Optional inclusive date range. When
+            both are given, settled transactions completed in the range but
+            absent from the records are reported as ``missing_remote``.
+        chunk_size: Settlement records joined per ledger query.
+
+    Returns:
+        The saved ReconciliationRun.
+    """
+    run = ReconciliationRun.objects.create(
+        hub_id=hub_id,
+        gateway=gateway,
+        source_name=source_name,
+        period_start=period_start,
+        period_end=period_end,
+    )
+
+    base = PaymentTransaction.objects.filter(
+        hub_id=hub_id, is_deleted=False, gateway=gateway,
+    )
+    report = _Report()
+    matched = set()
+    records_count = 0
+
+    try:
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                _join_chunk(base, chunk, report, matched)
+                records_count += len(chunk)
+                chunk = []
+        if chunk:
+            _join_chunk(base, chunk, report, matched)
+            records_count += len(chunk)
+
+        if period_start and period_end:
+            _find_missing_remote(base, period_start, period_end, matched, report, chunk_size)
+    except Exception as e:
+        run.status = 'failed'
+        run.error_message = str(e)
+    else:
+        run.status = 'completed'
+
+    run.records_count = records_count
+    run.matched_count = len(matched)
+    run.mismatch_count = report.total
+    run.summary = dict(report.counts)
+    run.mismatches = report.items
+    run.finished_at = timezone.now()
+    run.save()
+    return run
+
+
+def reconcile_file(hub_id, gateway, path, **kwargs):
+    """Reconcile a settlement file on disk; see reconcile() for kwargs."""
+    if gateway not in PARSERS:
+        raise ValueError(f'Unsupported gateway: {gateway}')
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        return reconcile(
+            hub_id, gateway, PARSERS[gateway](f),
+            source_name=kwargs.pop('source_name', os.path.basename(path)),
+            **kwargs,
+        )
@@ -0,0 +1,324 @@
+"""
+Bulk refunds.
+
+Refunds many transactions at once, e.g. every ticket of a cancelled event.
+Candidates are loaded one chunk at a time and each one's remaining
+amount is reserved with a guarded UPDATE before any gateway is called.
+Reserved refunds are grouped per gateway and sent to that gateway's
+RefundClient from a bounded thread pool; only the gateway calls run in
+the pool. Rejected refunds release their reservation, accepted ones get
+their PaymentRefund records and rollup counters per chunk.
+
+Gateway clients are configured with ``ONLINE_PAYMENTS_REFUND_CLIENTS``, a
+``{gateway: 'dotted.path.ClientClass'}`` dict. Gateways without an entry
+use LocalRefundClient, which records the refund without calling out.
+"""
+
+import logging
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from django.utils.translation import gettext as _
+
+from .models import PaymentDailyRollup, PaymentRefund, PaymentTransaction
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_CONCURRENCY = 8
+
+
+class RefundError(Exception):
+    """The gateway rejected or failed a refund call."""
+
+
+class RefundRequest(NamedTuple):
+    """One refund sent to a gateway."""
+
+    transaction_id: str
+    gateway_reference: str
+    amount: Decimal
+    currency: str
+    reason: str
+
+
+class RefundClient:
+    """
+    Base class of gateway refund clients.
+
+    ``batch_size`` is the largest number of requests the gateway accepts in
+    one call; clients of gateways without a batch API keep the default 1.
+    Instances are shared by the worker threads of a run.
+    """
+
+    batch_size = 1
+
+    def refund_batch(self, requests):
+        """
+        Issue refunds at the gateway.
+
+        Args:
+            requests: List of RefundRequest, at most ``batch_size`` long.
+
+        Returns:
+            List with, per request, the gateway refund id or a RefundError
+            for a request the gateway rejected.
+
+        Raises:
+            RefundError: The whole call failed.
+        """
+        raise NotImplementedError
+
+
+class LocalRefundClient(RefundClient):
+    """Records refunds locally only, for manual payments and tests."""
+
+    batch_size = 500
+
+    def refund_batch(self, requests):
+        return [f'local_{uuid.uuid4().hex[:24]}' for _request in requests]
+
+
+def get_refund_client(gateway):
+    """Instantiate the configured RefundClient for ``gateway``."""
+    path = getattr(settings, 'ONLINE_PAYMENTS_REFUND_CLIENTS', {}).get(gateway)
+    return import_string(path)() if path else LocalRefundClient()
+
+
+class BulkRefundResult:
+    """Outcome of a bulk refund: refunded transactions and failures."""
+
+    def __init__(self):
+        self.refunded = []
+        self.errors = []
+        self.refunded_amount = Decimal('0.00')
+
+    @property
+    def refunded_count(self):
+        return len(self.refunded)
+
+    def error(self, transaction_id, message):
+        self.errors.append({'transaction_id': transaction_id, 'error': str(message)})
+
+    def as_dict(self):
+        return {
+            'refunded': self.refunded_count,
+            'refunded_amount': str(self.refunded_amount),
+            'transactions': self.refunded,
+            'errors': self.errors,
+        }
+
+
+def refundable(queryset):
+    """Restrict a transaction queryset to rows with an amount left to refund."""
+    return queryset.filter(
+        status__in=PaymentTransaction.REFUNDABLE_STATUSES,
+        refund_amount__lt=F('amount'),
+    )
+
+
+def _chunks_by_id(hub_id, transaction_ids, chunk_size, result):
+    ids = list(dict.fromkeys(transaction_ids))
+    for offset in range(0, len(ids), chunk_size):
+        chunk = ids[offset:offset + chunk_size]
+        found = PaymentTransaction.objects.filter(hub_id=hub_id).in_bulk(
+            chunk, field_name='transaction_id',
+        )
+        txns = []
+        for transaction_id in chunk:
+            txn = found.get(transaction_id)
+            if txn is None:
+                result.error(transaction_id, _('Transaction not found.'))
+            elif (txn.status not in PaymentTransaction.REFUNDABLE_STATUSES
+                    or txn.refund_amount >= txn.amount):
+                result.error(transaction_id, _('Transaction is not refundable.'))
+            else:
+                txns.append(txn)
+        yield txns
+
+
+def _chunks_by_filter(queryset, chunk_size):
+    # Keyset pagination: refunded rows leave the filter, so OFFSET would skip rows.
+    queryset = refundable(queryset).order_by('pk')
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        txns = list(page[:chunk_size])
+        if not txns:
+            return
+        yield txns
+        last_pk = txns[-1].pk
+
+
+def _reserve(txns, result):
+    """
+    Claim the remaining amount of each transaction before calling out.
+
+    Each row is raised to its full amount with a guarded UPDATE, so a
+    concurrent refund either lands before (and the reservation fails) or
+    is rejected by its own guard while the gateway call is in flight.
+
+    Returns:
+        [(txn, amount)] for the reserved transactions.
+    """
+    reserved = []
+    for txn in txns:
+        amount = txn.amount - txn.refund_amount
+        updated = PaymentTransaction.all_objects.filter(
+            pk=txn.pk,
+            status__in=PaymentTransaction.REFUNDABLE_STATUSES,
+            refund_amount__lte=F('amount') - amount,
+        ).update(
+            refund_amount=F('refund_amount') + amount,
+            status='refunded',
+            updated_at=timezone.now(),
+            version=F('version') + 1,
+        )
+        if updated:
+            reserved.append((txn, amount))
+        else:
+            result.error(txn.transaction_id, _('Transaction is not refundable.'))
+    return reserved
+
+
+def _release(txn, amount):
+    """Give back a reservation the gateway did not turn into a refund."""
+    PaymentTransaction.all_objects.filter(pk=txn.pk).update(
+        refund_amount=F('refund_amount') - amount,
+        status=Case(
+            When(refund_amount__gt=amount, then=Value('partially_refunded')),
+            default=Value('completed'),
+        ),
+        updated_at=timezone.now(),
+        version=F('version') + 1,
+    )
+
+
+def _call_gateways(reserved, reason, clients, pool, result):
+    """Send one chunk to the gateways; return [(txn, amount, refund_id)]."""
+    by_gateway = defaultdict(list)
+    for txn, amount in reserved:
+        by_gateway[txn.gateway].append((txn, amount))
+
+    calls = []
+    for gateway, group in by_gateway.items():
+        if gateway not in clients:
+            clients[gateway] = get_refund_client(gateway)
+        client = clients[gateway]
+        for offset in range(0, len(group), client.batch_size):
+            batch = group[offset:offset + client.batch_size]
+            requests = [
+                RefundRequest(
+                    txn.transaction_id, txn.gateway_reference,
+                    amount, txn.currency, reason,
+                )
+                for txn, amount in batch
+            ]
+            calls.append((gateway, batch, pool.submit(client.refund_batch, requests)))
+
+    issued = []
+    for gateway, batch, future in calls:
+        try:
+            outcomes = list(future.result())
+        except Exception as e:
+            if not isinstance(e, RefundError):
+                logger.exception('Refund client for %s failed', gateway)
+            outcomes = [e] * len(batch)
+        if len(outcomes) != len(batch):
+            logger.error(
+                'Refund client for %s returned %d results for %d requests',
+                gateway, len(outcomes), len(batch),
+            )
+            missing = RefundError(_('No result from the gateway.'))
+            outcomes = outcomes[:len(batch)] + [missing] * (len(batch) - len(outcomes))
+        for (txn, amount), outcome in zip(batch, outcomes):
+            if isinstance(outcome, Exception):
+                _release(txn, amount)
+                result.error(txn.transaction_id, outcome)
+            else:
+                issued.append((txn, amount, outcome))
+    return issued
+
+
+def _record(issued, reason, result):
+    """Write the PaymentRefund records and rollups of accepted refunds."""
+    if not issued:
+        return
+    now = timezone.now()
+    refunds = []
+    rollup_deltas = defaultdict(lambda: defaultdict(int))
+
+    for txn, amount, refund_id in issued:
+        refunds.append(PaymentRefund(
+            hub_id=txn.hub_id,
+            transaction=txn,
+            amount=amount,
+            reason=reason,
+            gateway_refund_id=refund_id,
+        ))
+        bucket = rollup_deltas[(txn.hub_id, txn.gateway, txn.currency)]
+        bucket['refund_count'] += 1
+        bucket['refunded_amount'] += amount
+        result.refunded.append({
+            'transaction_id': txn.transaction_id,
+            'amount': str(amount),
+            'gateway_refund_id': refund_id,
+        })
+        result.refunded_amount += amount
+
+    with transaction.atomic():
+        PaymentTransaction.all_objects.filter(
+            pk__in=[txn.pk for txn, _amount, _refund_id in issued],
+        ).update(refunded_at=now)
+        PaymentRefund.all_objects.bulk_create(refunds)
+        for (hub_id, gateway, currency), deltas in rollup_deltas.items():
+            PaymentDailyRollup.record(hub_id, gateway, currency, now, **deltas)
+
+
+def bulk_refund(hub_id, transaction_ids=None, queryset=None, reason='',
+                chunk_size=DEFAULT_CHUNK_SIZE, concurrency=DEFAULT_CONCURRENCY,
+                clients=None):
+    """
+    Fully refund many transactions of a hub.
+
+    Args:
+        hub_id: Hub the transactions belong to.
+        transaction_ids: Transaction IDs (TXN-...) to refund. Unknown and
+            non-refundable IDs are reported as errors.
+        queryset: Alternatively, a PaymentTransaction queryset selecting
+            the transactions (e.g. by source_type/source_id of a cancelled
+            event). Rows without an amount left to refund are skipped.
+        reason: Stored on every PaymentRefund.
+        chunk_size: Transactions loaded and sent to the gateways per batch.
+        concurrency: Maximum gateway calls in flight.
+        clients: Optional ``{gateway: RefundClient}`` overriding the
+            configured clients.
+
+    Returns:
+        BulkRefundResult.
+    """
+    if (transaction_ids is None) == (queryset is None):
+        raise ValueError('Pass either transaction_ids or queryset.')
+
+    result = BulkRefundResult()
+    if transaction_ids is not None:
+        chunks = _chunks_by_id(hub_id, transaction_ids, chunk_size, result)
+    else:
+        chunks = _chunks_by_filter(queryset.filter(hub_id=hub_id), chunk_size)
+
+    clients = dict(clients or {})
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for txns in chunks:
+            reserved = _reserve(txns, result)
+            issued = _call_gateways(reserved, reason, clients, pool, result)
+            _record(issued, reason, result)
+    return result
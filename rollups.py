@@ -0,0 +1,115 @@
+"""
+Backfill of the per-hub daily payment rollups.
+
+Normal operation keeps PaymentDailyRollup up to date from the transaction
+state changes; this module rebuilds it from the transaction history for
+hubs that existed before the rollup table, or after a manual data fix.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import PaymentDailyRollup, PaymentRefund, PaymentTransaction
+
+
+DEFAULT_BATCH_SIZE = 2000
+
+
+def _empty_bucket():
+    return {
+        'completed_count': 0,
+        'completed_amount': Decimal('0.00'),
+        'failed_count': 0,
+        'refund_count': 0,
+        'refunded_amount': Decimal('0.00'),
+    }
+
+
+def rebuild_rollups(hub_id=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Recompute daily rollups from the transaction and refund tables.
+
+    Rows are streamed in chunks of ``batch_size`` and folded into
+    in-memory buckets, so memory is bounded by the number of distinct
+    (hub, day, gateway, currency) buckets, not by the number of rows.
+
+    Refunds are counted per PaymentRefund on the day it was recorded, as
+    process_refund() does. Transactions refunded before the refund ledger
+    existed have no PaymentRefund rows; their refund total counts as one
+    refund on their ``refunded_at`` day.
+
+    Args:
+        hub_id: Restrict the rebuild to one hub. Rebuilds all hubs if None.
+        batch_size: Rows fetched per chunk and rollups inserted per INSERT.
+
+    Returns:
+        Number of rollup rows written.
+    """
+    queryset = PaymentTransaction.all_objects.filter(is_deleted=False)
+    refunds = PaymentRefund.all_objects.filter(is_deleted=False, transaction__is_deleted=False)
+    if hub_id is not None:
+        queryset = queryset.filter(hub_id=hub_id)
+        refunds = refunds.filter(hub_id=hub_id)
+
+    rows = queryset.order_by().annotate(
+        has_refunds=Exists(refunds.filter(transaction=OuterRef('pk'))),
+    ).values_list(
+        'hub_id', 'gateway', 'currency', 'status', 'amount',
+        'completed_at', 'failed_at', 'refund_amount', 'refunded_at', 'updated_at', 'has_refunds',
+    ).iterator(chunk_size=batch_size)
+
+    buckets = defaultdict(_empty_bucket)
+    for (row_hub, gateway, currency, status, amount, completed_at, failed_at,
+         refund_amount, refunded_at, updated_at, has_refunds) in rows:
+        if completed_at is not None:
+            bucket = buckets[(row_hub, timezone.localdate(completed_at), gateway, currency)]
+            bucket['completed_count'] += 1
+            bucket['completed_amount'] += amount
+        if status == 'failed':
+            # Same fallback as PaymentTransaction.failure_time().
+            bucket = buckets[(row_hub, timezone.localdate(failed_at or updated_at), gateway, currency)]
+            bucket['failed_count'] += 1
+        if refund_amount and refunded_at is not None and not has_refunds:
+            bucket = buckets[(row_hub, timezone.localdate(refunded_at), gateway, currency)]
+            bucket['refund_count'] += 1
+            bucket['refunded_amount'] += refund_amount
+
+    refund_rows = refunds.order_by().values_list(
+        'hub_id', 'transaction__gateway', 'transaction__currency', 'amount', 'created_at',
+    ).iterator(chunk_size=batch_size)
+    for row_hub, gateway, currency, amount, created_at in refund_rows:
+        bucket = buckets[(row_hub, timezone.localdate(created_at), gateway, currency)]
+        bucket['refund_count'] += 1
+        bucket['refunded_amount'] += amount
+
+    rollups = [
+        PaymentDailyRollup(
+            hub_id=row_hub, date=day, gateway=gateway, currency=currency,
+            **counters,
+        )
+        for (row_hub, day, gateway, currency), counters in buckets.items()
+    ]
+
+    with transaction.atomic():
+        # Zero every existing bucket first so days that no longer have any
+        # activity are reset, then upsert the recomputed buckets.
+        existing = PaymentDailyRollup.all_objects.all()
+        if hub_id is not None:
+            existing = existing.filter(hub_id=hub_id)
+        existing.update(
+            updated_at=timezone.now(),
+            **{field: 0 for field in PaymentDailyRollup.COUNTER_FIELDS},
+        )
+        PaymentDailyRollup.all_objects.bulk_create(
+            rollups,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['hub_id', 'date', 'gateway', 'currency'],
+            update_fields=list(PaymentDailyRollup.COUNTER_FIELDS),
+        )
+
+    return len(rollups)
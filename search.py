@@ -0,0 +1,59 @@
+"""
+Transaction search backend.
+
+Free-text search runs against ``PaymentTransaction.search_text``, a single
+normalized column maintained on save and backed by a trigram index on
+PostgreSQL. Transaction IDs and gateway references are recognised by their
+prefix and resolved through their own B-tree indexes instead.
+"""
+
+import re
+
+
+SEARCH_FIELDS = (
+    'transaction_id', 'customer_name', 'customer_email', 'gateway_reference',
+)
+
+# Separates fields in search_text so a term cannot match across two fields.
+FIELD_SEPARATOR = '|'
+
+TRANSACTION_ID_RE = re.compile(r'^TXN-\d{14}-[0-9A-F]{8}$')
+
+# Stripe object prefixes (payment intents, charges, sessions, refunds, payments)
+GATEWAY_REFERENCE_PREFIXES = ('pi_', 'ch_', 'cs_', 're_', 'py_')
+
+
+def normalize(value):
+    """Lowercase a value and collapse its whitespace."""
+    return ' '.join(str(value).split()).lower().replace(FIELD_SEPARATOR, ' ')
+
+
+def build_search_text(transaction):
+    """Build the normalized search column for a transaction."""
+    return FIELD_SEPARATOR.join(
+        normalize(getattr(transaction, field) or '') for field in SEARCH_FIELDS
+    )
+
+
+def search_transactions(queryset, term):
+    """
+    Filter a transaction queryset by a user-entered search term.
+
+    Args:
+        queryset: PaymentTransaction queryset to narrow.
+        term: Raw search input.
+    """
+    term = term.strip()
+    if not term:
+        return queryset
+
+    upper = term.upper()
+    if TRANSACTION_ID_RE.match(upper):
+        return queryset.filter(transaction_id=upper)
+    if upper.startswith('TXN-'):
+        return queryset.filter(transaction_id__startswith=upper)
+
+    if term.startswith(GATEWAY_REFERENCE_PREFIXES):
+        return queryset.filter(gateway_reference__startswith=term)
+
+    return queryset.filter(search_text__contains=normalize(term))
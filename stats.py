@@ -0,0 +1,65 @@
+"""
+Dashboard statistics for the Online Payments module.
+
+Completion and refund KPIs are read from PaymentDailyRollup, so their cost
+grows with the number of active days rather than with the number of
+transactions. Only the pending total, a small and short-lived set, is
+aggregated from the transaction table.
+"""
+
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .models import PaymentDailyRollup, PaymentLink, PaymentTransaction
+
+
+ZERO = Decimal('0.00')
+
+
+@dataclass(frozen=True)
+class DashboardStats:
+    """Payment KPIs for a single hub."""
+
+    total_collected: Decimal = ZERO
+    total_pending: Decimal = ZERO
+    total_refunded: Decimal = ZERO
+    collected_today: Decimal = ZERO
+    active_links_count: int = 0
+
+
+def get_dashboard_stats(hub_id):
+    """Compute dashboard KPIs for the given hub.
+
+    Issues one aggregate query over the daily rollups, one over pending
+    transactions and one count over payment links.
+    """
+    today = timezone.localdate()
+
+    totals = PaymentDailyRollup.objects.filter(
+        hub_id=hub_id,
+    ).aggregate(
+        total_collected=Sum('completed_amount'),
+        total_refunded=Sum('refunded_amount'),
+        collected_today=Sum('completed_amount', filter=Q(date=today)),
+    )
+
+    pending = PaymentTransaction.objects.filter(
+        hub_id=hub_id, is_deleted=False, status='pending',
+    ).aggregate(
+        total=Sum('amount'),
+    )
+
+    active_links_count = PaymentLink.objects.filter(
+        hub_id=hub_id, is_deleted=False, is_active=True,
+    ).count()
+
+    return DashboardStats(
+        total_collected=totals['total_collected'] or ZERO,
+        total_pending=pending['total'] or ZERO,
+        total_refunded=totals['total_refunded'] or ZERO,
+        collected_today=totals['collected_today'] or ZERO,
+        active_links_count=active_links_count,
+    )
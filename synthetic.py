@@ -0,0 +1,242 @@
+"""
+Synthetic payment data for load testing and local query-plan work.
+
+Generates realistic PaymentTransaction and PaymentLink rows per hub with
+``bulk_create`` in chunks: a weighted status and gateway mix, full and
+partial refunds with their PaymentRefund records, timestamps skewed
+towards recent days and link payments pointing at their PaymentLink.
+Output is deterministic for a given hub and seed.
+
+Rows are inserted directly, bypassing model save() hooks, so the daily
+rollups must be rebuilt afterwards (see rollups.rebuild_rollups()).
+"""
+
+import random
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from .models import PaymentLink, PaymentRefund, PaymentTransaction
+from .search import build_search_text
+
+
+DEFAULT_CHUNK_SIZE = 5000
+
+STATUS_WEIGHTS = {
+    'completed': 70,
+    'failed': 12,
+    'pending': 8,
+    'refunded': 5,
+    'partially_refunded': 3,
+    'processing': 2,
+}
+
+GATEWAY_WEIGHTS = {
+    'stripe': 60,
+    'redsys': 35,
+    'manual': 5,
+}
+
+PAYMENT_METHODS = ('card', 'card', 'card', 'bizum', 'sepa_debit', 'paypal')
+
+# Share of transactions paid through a payment link.
+LINK_PAYMENT_RATIO = 0.2
+
+CURRENCY = 'EUR'
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """
+    Let bulk_create keep explicit ``created_at``/``updated_at`` values.
+
+    Temporarily disables auto_now/auto_now_add on the given models. Not
+    thread-safe; only use it from a single-threaded generator.
+    """
+    fields = [
+        model._meta.get_field(name)
+        for model in models
+        for name in ('created_at', 'updated_at')
+    ]
+    saved = [(f.auto_now, f.auto_now_add) for f in fields]
+    for f in fields:
+        f.auto_now = f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, (auto_now, auto_now_add) in zip(fields, saved):
+            f.auto_now, f.auto_now_add = auto_now, auto_now_add
+
+
+class SyntheticGenerator:
+    """Deterministic generator of payment rows for a single hub."""
+
+    def __init__(self, hub_id, seed=0, days=365, now=None):
+        self.hub_id = hub_id
+        self.days = days
+        self.now = now or timezone.now()
+        self.rng = random.Random(f'{hub_id}:{seed}')
+        self._statuses = list(STATUS_WEIGHTS)
+        self._status_weights = list(STATUS_WEIGHTS.values())
+        self._gateways = list(GATEWAY_WEIGHTS)
+        self._gateway_weights = list(GATEWAY_WEIGHTS.values())
+
+    def _uuid(self):
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def _timestamp(self):
+        # Squaring the uniform draw skews towards recent days, like real traffic.
+        age = (self.rng.random() ** 2) * self.days * 86400
+        return self.now - timedelta(seconds=age)
+
+    def _amount(self):
+        return Decimal(int(self.rng.lognormvariate(8.0, 0.9)) + 100) / 100
+
+    def links(self, count):
+        """Build ``count`` unsaved PaymentLink instances."""
+        links = []
+        for i in range(count):
+            created = self._timestamp()
+            expires = None
+            if self.rng.random() < 0.3:
+                expires = created + timedelta(days=self.rng.randint(1, 60))
+            links.append(PaymentLink(
+                id=self._uuid(),
+                hub_id=self.hub_id,
+                title=f'Invoice {i + 1:06d}',
+                description='Synthetic payment link',
+                amount=self._amount(),
+                currency=CURRENCY,
+                slug=f'{self.rng.getrandbits(48):012x}',
+                is_active=self.rng.random() < 0.8,
+                expires_at=expires,
+                max_uses=self.rng.choice((0, 0, 1, 1, 1, 5, 10)),
+                customer_email=f'customer{i}@example.com' if self.rng.random() < 0.5 else '',
+                created_at=created,
+                updated_at=created,
+            ))
+        return links
+
+    def transaction(self, link=None):
+        """Build one unsaved PaymentTransaction, optionally paid via ``link``."""
+        created = self._timestamp()
+        status = self.rng.choices(self._statuses, self._status_weights)[0]
+        gateway = self.rng.choices(self._gateways, self._gateway_weights)[0]
+        amount = link.amount if link else self._amount()
+        customer = self.rng.randint(1, 50000)
+
+        completed_at = refunded_at = None
+        refund_amount = Decimal('0.00')
+        if status in ('completed', 'refunded', 'partially_refunded'):
+            completed_at = min(created + timedelta(seconds=self.rng.randint(5, 600)), self.now)
+        if status in ('refunded', 'partially_refunded'):
+            refund_window = max((self.now - completed_at).total_seconds(), 1)
+            refunded_at = completed_at + timedelta(
+                seconds=self.rng.uniform(0, min(refund_window, 30 * 86400)),
+            )
+            if status == 'refunded':
+                refund_amount = amount
+            else:
+                refund_amount = (amount * Decimal(self.rng.randint(10, 90)) / 100).quantize(Decimal('0.01'))
+
+        reference = ''
+        if status != 'pending':
+            if gateway == 'stripe':
+                reference = f'pi_{self.rng.getrandbits(96):024x}'
+            elif gateway == 'redsys':
+                reference = f'{self.rng.randint(0, 999999):06d}'
+
+        txn = PaymentTransaction(
+            id=self._uuid(),
+            hub_id=self.hub_id,
+            transaction_id=f'TXN-{created:%Y%m%d%H%M%S}-{self.rng.getrandbits(32):08X}',
+            gateway=gateway,
+            amount=amount,
+            currency=CURRENCY,
+            status=status,
+            gateway_reference=reference,
+            payment_method_type=self.rng.choice(PAYMENT_METHODS) if completed_at else '',
+            customer_email=f'customer{customer}@example.com',
+            customer_name=f'Customer {customer}',
+            description=link.title if link else 'Synthetic payment',
+            payment_link=link,
+            error_message='Card declined' if status == 'failed' else '',
+            refund_amount=refund_amount,
+            refunded_at=refunded_at,
+            completed_at=completed_at,
+            failed_at=created if status == 'failed' else None,
+            created_at=created,
+            updated_at=refunded_at or completed_at or created,
+        )
+        txn.search_text = build_search_text(txn)
+        return txn
+
+    def refund(self, transaction):
+        """Build the unsaved PaymentRefund of a refunded transaction."""
+        return PaymentRefund(
+            id=self._uuid(),
+            hub_id=self.hub_id,
+            transaction=transaction,
+            amount=transaction.refund_amount,
+            reason=self.rng.choice(('', 'Customer request', 'Duplicate', 'Cancelled')),
+            gateway_refund_id=(
+                f're_{self.rng.getrandbits(96):024x}' if transaction.gateway == 'stripe' else ''
+            ),
+            created_at=transaction.refunded_at,
+            updated_at=transaction.refunded_at,
+        )
+
+
+def generate(hub_id, transactions=10000, links=100, seed=0, days=365,
+             chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Insert synthetic payment links and transactions for a hub.
+
+    Args:
+        hub_id: Hub the rows belong to.
+        transactions: Number of transactions to create.
+        links: Number of payment links to create.
+        seed: Random seed; the same hub and seed always produce the same rows.
+        days: Spread of ``created_at`` into the past.
+        chunk_size: Rows per INSERT.
+
+    Returns:
+        dict with the number of ``transactions`` and ``links`` created.
+    """
+    generator = SyntheticGenerator(hub_id, seed=seed, days=days)
+    link_rows = generator.links(links)
+    # Links still accepting payments; limited links leave once used up.
+    open_links = list(link_rows)
+    uses = Counter()
+
+    with explicit_timestamps(PaymentLink, PaymentTransaction, PaymentRefund):
+        # Links go first so the transactions' foreign keys resolve.
+        PaymentLink.all_objects.bulk_create(link_rows, batch_size=chunk_size)
+
+        for offset in range(0, transactions, chunk_size):
+            rows = []
+            refunds = []
+            for _ in range(min(chunk_size, transactions - offset)):
+                link = None
+                if open_links and generator.rng.random() < LINK_PAYMENT_RATIO:
+                    link = generator.rng.choice(open_links)
+                txn = generator.transaction(link)
+                if link and txn.completed_at:
+                    uses[link.pk] += 1
+                    if link.max_uses and uses[link.pk] >= link.max_uses:
+                        open_links.remove(link)
+                if txn.refunded_at:
+                    refunds.append(generator.refund(txn))
+                rows.append(txn)
+            PaymentTransaction.all_objects.bulk_create(rows)
+            PaymentRefund.all_objects.bulk_create(refunds)
+
+        for link in link_rows:
+            link.current_uses = uses[link.pk]
+        PaymentLink.all_objects.bulk_update(link_rows, ['current_uses'], batch_size=chunk_size)
+
+    return {'transactions': transactions, 'links': len(link_rows)}
@@ -14,6 +14,15 @@ from django.utils import timezone
 os.environ['DJANGO_ALLOW_ASYNC_UNSAFE'] = 'true'
 
 
+@pytest.fixture(autouse=True)
+def _clear_local_caches():
+    """Process-local caches must not leak state across tests."""
+    from online_payments.caching import clear_all
+    clear_all()
+    yield
+    clear_all()
+
+
 @pytest.fixture
 def hub_id(hub_config):
     """Hub ID from HubConfig singleton."""
@@ -152,6 +161,16 @@ def maxed_out_payment_link(hub_id):
     )
 
 
+@pytest.fixture
+def synthetic_data(hub_id):
+    """Factory that bulk-generates synthetic links and transactions for the hub."""
+    from online_payments.synthetic import generate
+
+    def make(transactions=1000, links=20, seed=0, **kwargs):
+        return generate(hub_id, transactions=transactions, links=links, seed=seed, **kwargs)
+    return make
+
+
 @pytest.fixture
 def employee(db):
     """Create a local user (employee)."""
@@ -0,0 +1,226 @@
+"""
+Query-count and latency benchmarks for the module views.
+
+A dedicated hub is seeded once per module with synthetic.generate(), then
+every view is exercised against it. Query budgets are asserted so N+1
+regressions fail CI; wall time is measured with pytest-benchmark when the
+plugin is installed and recorded as a test property otherwise.
+
+The seed size defaults to a CI-friendly 2000 transactions. Set
+``ONLINE_PAYMENTS_BENCH_SIZE`` (e.g. ``10k``, ``100k``, ``1M``) for a
+realistic run::
+
+    ONLINE_PAYMENTS_BENCH_SIZE=100k pytest tests/test_benchmarks.py
+
+Budgets include the session and user lookups done by the host middleware.
+"""
+
+import json
+import os
+import time
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from django.db import connection
+from django.test import Client
+
+
+pytestmark = [pytest.mark.django_db]
+
+BENCH_HUB_ID = uuid.UUID('00000000-0000-4000-8000-00000000be4c')
+
+# Open payment link of the benchmark hub, independent of the random mix.
+BENCH_LINK_SLUG = 'bench-checkout'
+
+# synthetic.generate() spreads rows over the year before today, skewed
+# towards recent days, so search prefixes and date ranges are derived
+# from today to keep hitting real rows.
+TODAY = date.today()
+RANGE_FROM = (TODAY - timedelta(days=120)).isoformat()
+RANGE_TO = (TODAY - timedelta(days=30)).isoformat()
+
+# Maximum queries per request, including host middleware overhead.
+QUERY_BUDGETS = {
+    'dashboard': 12,
+    'transactions': 10,
+    'transactions_page': 11,
+    'checkout': 8,
+    'api_create_session': 10,
+    'api_webhook': 6,
+}
+
+
+def _bench_size():
+    raw = os.environ.get('ONLINE_PAYMENTS_BENCH_SIZE', '2000').strip().lower()
+    multiplier = 1
+    if raw.endswith('k'):
+        raw, multiplier = raw[:-1], 1000
+    elif raw.endswith('m'):
+        raw, multiplier = raw[:-1], 1000000
+    return int(float(raw) * multiplier)
+
+
+def _purge(hub_id):
+    from online_payments.models import (
+        PaymentDailyRollup, PaymentGatewaySettings, PaymentLink, PaymentRefund,
+        PaymentTransaction, WebhookEvent,
+    )
+    # Raw DELETE: the managers' delete() is a soft delete.
+    with connection.cursor() as cursor:
+        for model in (PaymentRefund, PaymentTransaction, PaymentLink, PaymentDailyRollup,
+                      PaymentGatewaySettings, WebhookEvent):
+            field = model._meta.get_field('hub_id')
+            cursor.execute(
+                f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)} WHERE hub_id = %s',
+                [field.get_db_prep_value(hub_id, connection)],
+            )
+
+
+@pytest.fixture(scope='module')
+def bench_hub(django_db_setup, django_db_blocker):
+    """Seed the benchmark hub once for the module and remove it afterwards."""
+    from online_payments.models import PaymentGatewaySettings, PaymentLink
+    from online_payments.rollups import rebuild_rollups
+    from online_payments.synthetic import generate
+
+    with django_db_blocker.unblock():
+        size = _bench_size()
+        generate(BENCH_HUB_ID, transactions=size, links=max(size // 100, 10))
+        rebuild_rollups(hub_id=BENCH_HUB_ID)
+        PaymentLink.objects.create(
+            hub_id=BENCH_HUB_ID,
+            title='Benchmark checkout',
+            amount=Decimal('25.00'),
+            currency='EUR',
+            slug=BENCH_LINK_SLUG,
+            is_active=True,
+            max_uses=0,
+        )
+        settings = PaymentGatewaySettings.get_settings(BENCH_HUB_ID)
+        settings.active_gateway = 'stripe'
+        settings.save()
+    yield BENCH_HUB_ID
+    with django_db_blocker.unblock():
+        _purge(BENCH_HUB_ID)
+
+
+@pytest.fixture
+def bench_client(auth_client, bench_hub):
+    """Authenticated client whose session points at the benchmark hub."""
+    session = auth_client.session
+    session['hub_id'] = str(bench_hub)
+    session.save()
+    return auth_client
+
+
+@pytest.fixture
+def measure(request):
+    """Time a callable with pytest-benchmark if available, else once."""
+    if request.config.pluginmanager.hasplugin('benchmark'):
+        benchmark = request.getfixturevalue('benchmark')
+        return lambda fn: benchmark.pedantic(fn, rounds=5, iterations=1, warmup_rounds=1)
+
+    def run(fn):
+        start = time.perf_counter()
+        result = fn()
+        request.node.user_properties.append(
+            ('wall_ms', round((time.perf_counter() - start) * 1000, 2)),
+        )
+        return result
+    return run
+
+
+def _check(budget_name, fn, django_assert_max_num_queries, measure):
+    with django_assert_max_num_queries(QUERY_BUDGETS[budget_name]):
+        response = fn()
+    assert response.status_code in (200, 304), response.status_code
+    measure(fn)
+    return response
+
+
+class TestViewBenchmarks:
+    """Query budgets and timings for every module view."""
+
+    def test_dashboard(self, bench_client, django_assert_max_num_queries, measure):
+        _check(
+            'dashboard',
+            lambda: bench_client.get('/m/online_payments/'),
+            django_assert_max_num_queries, measure,
+        )
+
+    @pytest.mark.parametrize('query', [
+        pytest.param('', id='all'),
+        pytest.param(f'search=TXN-{TODAY:%Y%m}', id='search-id-prefix'),
+        pytest.param('search=customer42@example.com', id='search-email'),
+        pytest.param('search=pi_0000', id='search-reference'),
+        pytest.param('status=completed', id='status'),
+        pytest.param('gateway=redsys', id='gateway'),
+        pytest.param(f'date_from={RANGE_FROM}&date_to={RANGE_TO}', id='date-range'),
+        pytest.param(
+            f'status=completed&gateway=stripe&date_from={RANGE_FROM}', id='combined',
+        ),
+    ])
+    def test_transactions(self, bench_client, query, django_assert_max_num_queries, measure):
+        _check(
+            'transactions',
+            lambda: bench_client.get(f'/m/online_payments/transactions/?{query}'),
+            django_assert_max_num_queries, measure,
+        )
+
+    def test_transactions_deep_cursor_page(self, bench_client, django_assert_max_num_queries, measure):
+        first = bench_client.get('/m/online_payments/transactions/?per_page=50')
+        cursor = first.context['page_obj'].next_cursor
+        for _ in range(5):
+            page = bench_client.get(f'/m/online_payments/transactions/?per_page=50&cursor={cursor}')
+            cursor = page.context['page_obj'].next_cursor
+        _check(
+            'transactions',
+            lambda: bench_client.get(f'/m/online_payments/transactions/?per_page=50&cursor={cursor}'),
+            django_assert_max_num_queries, measure,
+        )
+
+    def test_transactions_numbered_page(self, bench_client, django_assert_max_num_queries, measure):
+        _check(
+            'transactions_page',
+            lambda: bench_client.get('/m/online_payments/transactions/?page=3'),
+            django_assert_max_num_queries, measure,
+        )
+
+    def test_checkout(self, bench_hub, django_assert_max_num_queries, measure):
+        client = Client()
+        response = _check(
+            'checkout',
+            lambda: client.get(f'/m/online_payments/checkout/{BENCH_LINK_SLUG}/'),
+            django_assert_max_num_queries, measure,
+        )
+        assert response.status_code == 200
+
+    def test_api_create_session(self, bench_client, django_assert_max_num_queries, measure):
+        _check(
+            'api_create_session',
+            lambda: bench_client.post(
+                '/m/online_payments/api/create-session/',
+                data=json.dumps({'amount': 12.5, 'currency': 'EUR'}),
+                content_type='application/json',
+            ),
+            django_assert_max_num_queries, measure,
+        )
+
+    def test_api_webhook(self, bench_hub, django_assert_max_num_queries, measure):
+        client = Client()
+
+        def post():
+            return client.post(
+                '/m/online_payments/api/webhook/',
+                data=json.dumps({
+                    'gateway': 'stripe',
+                    'id': f'evt_{uuid.uuid4().hex}',
+                    'type': 'checkout.session.completed',
+                    'data': {'object': {'metadata': {'transaction_id': 'TXN-BENCH'}}},
+                }),
+                content_type='application/json',
+            )
+
+        _check('api_webhook', post, django_assert_max_num_queries, measure)
@@ -0,0 +1,106 @@
+"""
+Tests for half-open date range filtering.
+"""
+
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+import pytest
+from django.utils import timezone
+
+
+pytestmark = [pytest.mark.django_db, pytest.mark.unit]
+
+MADRID = ZoneInfo('Europe/Madrid')
+
+
+class TestDayRange:
+    """Tests for day_start() and day_range()."""
+
+    def test_day_range_is_local(self):
+        from online_payments.dateranges import day_range
+
+        start, end = day_range(date(2026, 7, 1), MADRID)
+
+        assert start == datetime(2026, 6, 30, 22, 0, tzinfo=ZoneInfo('UTC'))
+        assert end == datetime(2026, 7, 1, 22, 0, tzinfo=ZoneInfo('UTC'))
+
+    def test_dst_day_is_23_hours(self):
+        from online_payments.dateranges import day_range
+
+        start, end = day_range(date(2026, 3, 29), MADRID)
+
+        assert end - start == timedelta(hours=23)
+
+    def test_parse_day(self):
+        from online_payments.dateranges import parse_day
+
+        assert parse_day('2026-10-17') == date(2026, 10, 17)
+        assert parse_day(date(2026, 10, 17)) == date(2026, 10, 17)
+        assert parse_day('') is None
+        assert parse_day('17/10/2026') is None
+        assert parse_day('2026-02-30') is None
+
+
+class TestFilterDateRange:
+    """Tests for filter_date_range()."""
+
+    def _txn_at(self, hub_id, when):
+        from online_payments.models import PaymentTransaction
+        txn = PaymentTransaction.objects.create(
+            hub_id=hub_id, gateway='stripe', amount=Decimal('1.00'),
+        )
+        PaymentTransaction.all_objects.filter(pk=txn.pk).update(created_at=when)
+        return txn
+
+    def test_bounds_follow_local_midnight(self, hub_id):
+        from online_payments.dateranges import filter_date_range
+        from online_payments.models import PaymentTransaction
+
+        # 23:30 on Oct 16 UTC is already Oct 17 in Madrid.
+        late = self._txn_at(hub_id, datetime(2026, 10, 16, 23, 30, tzinfo=ZoneInfo('UTC')))
+        early = self._txn_at(hub_id, datetime(2026, 10, 16, 21, 30, tzinfo=ZoneInfo('UTC')))
+
+        with timezone.override(MADRID):
+            ids = set(filter_date_range(
+                PaymentTransaction.objects.filter(hub_id=hub_id),
+                'created_at', '2026-10-17', '2026-10-17',
+            ).values_list('pk', flat=True))
+
+        assert ids == {late.pk}
+        assert early.pk not in ids
+
+    def test_date_to_is_inclusive(self, hub_id):
+        from online_payments.dateranges import filter_date_range
+        from online_payments.models import PaymentTransaction
+
+        now = timezone.now()
+        txn = self._txn_at(hub_id, now)
+        today = timezone.localdate(now)
+
+        queryset = filter_date_range(
+            PaymentTransaction.objects.filter(hub_id=hub_id), 'created_at', None, today,
+        )
+        assert list(queryset) == [txn]
+
+    def test_invalid_bounds_are_ignored(self, hub_id, pending_transaction):
+        from online_payments.dateranges import filter_date_range
+        from online_payments.models import PaymentTransaction
+
+        queryset = filter_date_range(
+            PaymentTransaction.objects.filter(hub_id=hub_id), 'created_at', 'nope', '',
+        )
+        assert queryset.count() == 1
+
+    def test_no_date_cast_in_sql(self, hub_id):
+        from online_payments.dateranges import filter_date_range
+        from online_payments.models import PaymentTransaction
+
+        queryset = filter_date_range(
+            PaymentTransaction.objects.filter(hub_id=hub_id),
+            'created_at', '2026-01-01', '2026-01-31',
+        )
+        sql = str(queryset.query).upper()
+        assert 'CAST' not in sql
+        assert 'DJANGO_DATETIME_CAST_DATE' not in sql
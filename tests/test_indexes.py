@@ -0,0 +1,90 @@
+"""
+Query plan tests: the key listing queries must be served by an index.
+
+Tables in tests are tiny, so on PostgreSQL sequential scans are disabled
+for the duration of the EXPLAIN; the test then checks that a usable index
+exists and is the one the planner picks.
+"""
+
+from datetime import timedelta
+
+import pytest
+from django.db import connection, transaction
+from django.utils import timezone
+
+
+pytestmark = [pytest.mark.django_db, pytest.mark.unit]
+
+
+def _plan(queryset):
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+
+def _assert_uses_index(queryset, *index_names):
+    plan = _plan(queryset)
+    assert any(name in plan for name in index_names), plan
+
+
+class TestTransactionIndexes:
+    """Transaction queries issued by the dashboard and the list."""
+
+    def test_recent_transactions(self, hub_id, completed_transaction):
+        from online_payments.models import PaymentTransaction
+
+        queryset = PaymentTransaction.objects.filter(
+            hub_id=hub_id, is_deleted=False,
+        ).order_by('-created_at')[:10]
+        _assert_uses_index(queryset, 'online_paym_hub_id_ae658a_idx')
+
+    def test_list_by_status(self, hub_id, pending_transaction):
+        from online_payments.models import PaymentTransaction
+
+        queryset = PaymentTransaction.objects.filter(
+            hub_id=hub_id, is_deleted=False, status='pending',
+        ).order_by('-created_at')[:25]
+        _assert_uses_index(queryset, 'online_paym_hub_id_058cf8_idx')
+
+    def test_list_by_gateway(self, hub_id, completed_transaction):
+        from online_payments.models import PaymentTransaction
+
+        queryset = PaymentTransaction.objects.filter(
+            hub_id=hub_id, is_deleted=False, gateway='stripe',
+        ).order_by('-created_at')[:25]
+        _assert_uses_index(queryset, 'online_paym_hub_id_f12ba4_idx')
+
+    def test_completed_range(self, hub_id, completed_transaction):
+        from online_payments.models import PaymentTransaction
+
+        now = timezone.now()
+        queryset = PaymentTransaction.objects.filter(
+            hub_id=hub_id,
+            completed_at__gte=now - timedelta(days=1),
+            completed_at__lt=now,
+        ).values_list('id', flat=True)
+        _assert_uses_index(queryset, 'online_paym_hub_id_7afe8c_idx')
+
+
+class TestPaymentLinkIndexes:
+    """Payment link queries issued by the dashboard and the listing."""
+
+    def test_active_listing(self, hub_id, active_payment_link):
+        from online_payments.models import PaymentLink
+
+        queryset = PaymentLink.objects.filter(
+            hub_id=hub_id, is_deleted=False, is_active=True,
+        ).order_by('-created_at')
+        _assert_uses_index(
+            queryset, 'online_payments_link_live_idx', 'online_paym_hub_id_1b96b3_idx',
+        )
+
+    def test_inactive_listing(self, hub_id, active_payment_link):
+        from online_payments.models import PaymentLink
+
+        queryset = PaymentLink.objects.filter(
+            hub_id=hub_id, is_deleted=False, is_active=False,
+        ).order_by('-created_at')
+        _assert_uses_index(queryset, 'online_paym_hub_id_1b96b3_idx')
@@ -0,0 +1,100 @@
+"""
+Tests for bulk payment link creation.
+"""
+
+import io
+import json
+from decimal import Decimal
+
+import pytest
+from django.core.management import call_command
+
+
+pytestmark = [pytest.mark.django_db, pytest.mark.unit]
+
+
+class TestBulkCreatePaymentLinks:
+    """Tests for bulk_create_payment_links()."""
+
+    def test_creates_valid_rows(self, hub_id):
+        from online_payments.links import bulk_create_payment_links
+        from online_payments.models import PaymentLink
+
+        rows = [{'title': f'Invoice {i}', 'amount': '10.00'} for i in range(5)]
+        result = bulk_create_payment_links(hub_id, rows, chunk_size=2)
+
+        assert result.created_count == 5
+        assert result.errors == []
+        links = PaymentLink.objects.filter(hub_id=hub_id)
+        assert links.count() == 5
+        assert len({link.slug for link in links}) == 5
+        link = links.first()
+        assert link.currency == 'EUR'
+        assert link.max_uses == 1
+        assert link.amount == Decimal('10.00')
+
+    def test_reports_invalid_rows(self, hub_id):
+        from online_payments.links import bulk_create_payment_links
+        from online_payments.models import PaymentLink
+
+        rows = [
+            {'title': 'Good', 'amount': '5.00'},
+            {'title': '', 'amount': '5.00'},
+            {'title': 'Bad amount', 'amount': 'abc'},
+        ]
+        result = bulk_create_payment_links(hub_id, rows)
+
+        assert result.created_count == 1
+        assert [e['row'] for e in result.errors] == [2, 3]
+        assert 'title' in result.errors[0]['errors']
+        assert PaymentLink.objects.filter(hub_id=hub_id).count() == 1
+
+    def test_one_insert_per_chunk(self, hub_id, django_assert_num_queries):
+        from online_payments.links import bulk_create_payment_links
+
+        rows = [{'title': f'Link {i}', 'amount': '1.00'} for i in range(6)]
+        # Per chunk: slug collision check + INSERT (+ savepoint pair).
+        with django_assert_num_queries(8):
+            bulk_create_payment_links(hub_id, rows, chunk_size=3)
+
+    def test_generate_slugs_skips_existing(self, active_payment_link, monkeypatch):
+        from online_payments import links
+        from online_payments.models import PaymentLink
+
+        drawn = iter(['test-pay-link', 'fresh-slug-01'])
+        monkeypatch.setattr(PaymentLink, '_generate_slug', staticmethod(lambda: next(drawn)))
+
+        assert links.generate_slugs(1) == ['fresh-slug-01']
+
+
+class TestCreatePaymentLinksCommand:
+    """Tests for the create_payment_links management command."""
+
+    def test_csv(self, hub_id, tmp_path):
+        from online_payments.models import PaymentLink
+
+        path = tmp_path / 'links.csv'
+        path.write_text('title,amount,currency\nA,1.00,EUR\nB,2.00,USD\n')
+        out = io.StringIO()
+        call_command('create_payment_links', str(path), hub=str(hub_id), stdout=out)
+
+        assert '2 payment links created' in out.getvalue()
+        assert set(
+            PaymentLink.objects.filter(hub_id=hub_id).values_list('currency', flat=True)
+        ) == {'EUR', 'USD'}
+
+    def test_jsonl(self, hub_id, tmp_path):
+        from online_payments.models import PaymentLink
+
+        path = tmp_path / 'links.jsonl'
+        path.write_text(
+            json.dumps({'title': 'A', 'amount': '1.00'}) + '\n'
+            + json.dumps({'title': 'B'}) + '\n'
+        )
+        out, err = io.StringIO(), io.StringIO()
+        call_command('create_payment_links', str(path), hub=str(hub_id), stdout=out, stderr=err)
+
+        assert '1 payment links created, 1 rows rejected' in out.getvalue()
+        assert 'Row 2' in err.getvalue()
+        assert PaymentLink.objects.filter(hub_id=hub_id).count() == 1
+
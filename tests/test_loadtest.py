@@ -0,0 +1,91 @@
+"""
+Tests for the webhook load-test harness.
+"""
+
+import hashlib
+import hmac
+import json
+from decimal import Decimal
+
+import pytest
+
+
+pytestmark = [pytest.mark.django_db(transaction=True), pytest.mark.unit]
+
+
+class TestFakeGateway:
+    """Tests for FakeGateway."""
+
+    def test_stripe_signature(self, pending_transaction):
+        from online_payments.loadtest import FakeGateway
+
+        delivery = FakeGateway('whsec_x').notifications(pending_transaction)[0]
+
+        header = dict(part.split('=', 1) for part in delivery.headers['Stripe-Signature'].split(','))
+        expected = hmac.new(
+            b'whsec_x', f"{header['t']}.".encode() + delivery.body, hashlib.sha256,
+        ).hexdigest()
+        assert header['v1'] == expected
+        assert json.loads(delivery.body)['data']['object']['metadata']['transaction_id'] == (
+            pending_transaction.transaction_id
+        )
+
+    def test_scenario_has_duplicates_and_refunds(self, hub_id):
+        from online_payments.loadtest import FakeGateway, create_pending_transactions
+
+        transactions = create_pending_transactions(hub_id, 200)
+        deliveries = FakeGateway(seed=1).scenario(
+            transactions, duplicate_ratio=0.2, refund_ratio=0.5,
+        )
+
+        bodies = [d.body for d in deliveries]
+        assert len(bodies) > len(set(bodies))
+        assert any(d.kind == 'refund' for d in deliveries)
+
+
+class TestRunLoad:
+    """Tests for run_load() and drain_queue()."""
+
+    def test_run_and_drain(self, hub_id):
+        from online_payments.loadtest import (
+            FakeGateway, create_pending_transactions, drain_queue, run_load,
+        )
+        from online_payments.models import PaymentTransaction, WebhookEvent
+
+        transactions = create_pending_transactions(hub_id, 30)
+        deliveries = FakeGateway(seed=2).scenario(
+            transactions, duplicate_ratio=0.3, out_of_order_ratio=0, refund_ratio=0,
+        )
+
+        report = run_load(deliveries, concurrency=2)
+
+        assert report['sent'] == len(deliveries)
+        assert report['errors'] == 0
+        assert report['duplicates'] == len(deliveries) - 30
+        assert report['p99_ms'] >= report['p50_ms'] > 0
+        assert WebhookEvent.objects.count() == 30
+
+        drained = drain_queue(concurrency=1)
+        assert drained['processed'] == 30
+        assert not PaymentTransaction.objects.filter(hub_id=hub_id, status='pending').exists()
+
+
+class TestLoadTestCommand:
+    """Tests for the webhook_load_test management command."""
+
+    def test_in_process_requests_are_accepted(self, hub_id, settings):
+        import io
+        from django.core.management import call_command
+        from online_payments.models import WebhookEvent
+
+        # Outside the test runner 'testserver' is not an allowed host.
+        settings.ALLOWED_HOSTS = ['.payments.example.com']
+        out = io.StringIO()
+
+        call_command(
+            'webhook_load_test', hub_id=str(hub_id), transactions=10, concurrency=2,
+            duplicates=0, refunds=0, stdout=out,
+        )
+
+        assert '  errors: 0\n' in out.getvalue()
+        assert WebhookEvent.objects.count() == 10
@@ -0,0 +1,147 @@
+"""
+Tests for the scheduled maintenance jobs.
+"""
+
+import io
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+
+pytestmark = [pytest.mark.django_db, pytest.mark.unit]
+
+
+def _age(obj, **delta):
+    type(obj).all_objects.filter(pk=obj.pk).update(created_at=timezone.now() - timedelta(**delta))
+
+
+class TestExpireStaleTransactions:
+    """Tests for expire_stale_transactions()."""
+
+    def test_expires_old_pending_and_processing(self, hub_id, pending_transaction):
+        from online_payments.maintenance import expire_stale_transactions
+        from online_payments.models import PaymentTransaction
+
+        processing = PaymentTransaction.objects.create(
+            hub_id=hub_id, gateway='redsys', amount=Decimal('5.00'), status='processing',
+        )
+        _age(pending_transaction, hours=30)
+        _age(processing, hours=30)
+
+        assert expire_stale_transactions(hub_id=hub_id) == 2
+
+        pending_transaction.refresh_from_db()
+        processing.refresh_from_db()
+        assert pending_transaction.status == 'failed'
+        assert processing.status == 'failed'
+        assert pending_transaction.error_message.startswith('Expired')
+
+    def test_keeps_recent_and_settled(self, hub_id, pending_transaction, completed_transaction):
+        from online_payments.maintenance import expire_stale_transactions
+
+        _age(completed_transaction, days=3)
+
+        assert expire_stale_transactions(hub_id=hub_id) == 0
+        pending_transaction.refresh_from_db()
+        completed_transaction.refresh_from_db()
+        assert pending_transaction.status == 'pending'
+        assert completed_transaction.status == 'completed'
+
+    def test_keeps_manual_payments(self, hub_id):
+        from online_payments.maintenance import expire_stale_transactions
+        from online_payments.models import PaymentTransaction
+
+        manual = PaymentTransaction.objects.create(
+            hub_id=hub_id, gateway='manual', amount=Decimal('40.00'), status='processing',
+        )
+        _age(manual, days=10)
+
+        assert expire_stale_transactions() == 0
+        manual.refresh_from_db()
+        assert manual.status == 'processing'
+
+    def test_records_failed_rollup(self, hub_id):
+        from online_payments.maintenance import expire_stale_transactions
+        from online_payments.models import PaymentDailyRollup, PaymentTransaction
+
+        for _ in range(3):
+            txn = PaymentTransaction.objects.create(
+                hub_id=hub_id, gateway='stripe', amount=Decimal('1.00'), currency='EUR',
+            )
+            _age(txn, days=2)
+
+        assert expire_stale_transactions(hub_id=hub_id, batch_size=2) == 3
+
+        rollup = PaymentDailyRollup.objects.get(
+            hub_id=hub_id, date=timezone.localdate(), gateway='stripe', currency='EUR',
+        )
+        assert rollup.failed_count == 3
+
+    def test_sweeps_all_hubs(self, hub_id, pending_transaction):
+        import uuid
+        from online_payments.maintenance import expire_stale_transactions
+        from online_payments.models import PaymentTransaction
+
+        other = PaymentTransaction.objects.create(
+            hub_id=uuid.uuid4(), gateway='stripe', amount=Decimal('1.00'),
+        )
+        _age(pending_transaction, days=2)
+        _age(other, days=2)
+
+        assert expire_stale_transactions() == 2
+
+    def test_command(self, hub_id, pending_transaction):
+        _age(pending_transaction, hours=3)
+        out = io.StringIO()
+
+        call_command('expire_stale_transactions', hub=str(hub_id), older_than_hours=2, stdout=out)
+
+        assert '1 stale transactions expired' in out.getvalue()
+
+
+class TestDeactivateUnavailableLinks:
+    """Tests for deactivate_unavailable_links()."""
+
+    def test_deactivates_expired_and_exhausted(
+        self, hub_id, active_payment_link, expired_payment_link, maxed_out_payment_link,
+    ):
+        from online_payments.maintenance import deactivate_unavailable_links
+
+        assert deactivate_unavailable_links(hub_id=hub_id, batch_size=1) == 2
+
+        for link in (active_payment_link, expired_payment_link, maxed_out_payment_link):
+            link.refresh_from_db()
+        assert active_payment_link.is_active is True
+        assert expired_payment_link.is_active is False
+        assert maxed_out_payment_link.is_active is False
+
+    def test_unlimited_links_never_exhaust(self, hub_id):
+        from online_payments.maintenance import deactivate_unavailable_links
+        from online_payments.models import PaymentLink
+
+        link = PaymentLink.objects.create(
+            hub_id=hub_id, title='Unlimited', amount=Decimal('1.00'),
+            max_uses=0, current_uses=500,
+        )
+
+        assert deactivate_unavailable_links(hub_id=hub_id) == 0
+        link.refresh_from_db()
+        assert link.is_active is True
+
+    def test_dashboard_count_reflects_deactivation(
+        self, hub_id, active_payment_link, expired_payment_link,
+    ):
+        from online_payments.maintenance import deactivate_unavailable_links
+        from online_payments.stats import get_dashboard_stats
+
+        assert get_dashboard_stats(hub_id).active_links_count == 2
+        deactivate_unavailable_links()
+        assert get_dashboard_stats(hub_id).active_links_count == 1
+
+    def test_command(self, hub_id, expired_payment_link):
+        out = io.StringIO()
+        call_command('deactivate_payment_links', stdout=out)
+        assert '1 payment links deactivated' in out.getvalue()
@@ -102,6 +102,46 @@ class TestPaymentGatewaySettings:
         assert refreshed.require_deposit is True
         assert refreshed.deposit_percentage == Decimal('25.50')
 
+    def test_get_settings_cached(self, gateway_settings, django_assert_num_queries):
+        from online_payments.models import PaymentGatewaySettings
+        PaymentGatewaySettings.get_settings(gateway_settings.hub_id)
+        with django_assert_num_queries(0):
+            PaymentGatewaySettings.get_settings(gateway_settings.hub_id)
+
+    def test_get_settings_returns_copy(self, gateway_settings):
+        from online_payments.models import PaymentGatewaySettings
+        s1 = PaymentGatewaySettings.get_settings(gateway_settings.hub_id)
+        s1.currency = 'USD'
+        s2 = PaymentGatewaySettings.get_settings(gateway_settings.hub_id)
+        assert s2.currency == 'EUR'
+
+    def test_save_invalidates_cache(self, gateway_settings):
+        from online_payments.models import PaymentGatewaySettings
+        cached = PaymentGatewaySettings.get_settings(gateway_settings.hub_id)
+        cached.active_gateway = 'manual'
+        cached.save()
+        assert PaymentGatewaySettings.get_settings(gateway_settings.hub_id).active_gateway == 'manual'
+
+    def test_update_bypassing_save_served_from_cache(self, gateway_settings):
+        from online_payments.models import PaymentGatewaySettings, settings_cache
+        PaymentGatewaySettings.get_settings(gateway_settings.hub_id)
+        PaymentGatewaySettings.all_objects.filter(pk=gateway_settings.pk).update(currency='GBP')
+        assert PaymentGatewaySettings.get_settings(gateway_settings.hub_id).currency == 'EUR'
+        settings_cache.invalidate(gateway_settings.hub_id)
+        assert PaymentGatewaySettings.get_settings(gateway_settings.hub_id).currency == 'GBP'
+
+    def test_known_missing_hub_creates_once(self, hub_id):
+        from online_payments.models import PaymentGatewaySettings, settings_cache
+        settings_cache.mark_missing(hub_id)
+        s1 = PaymentGatewaySettings.get_settings(hub_id)
+        # Simulate a stale negative entry: the INSERT conflicts and the
+        # existing row is returned.
+        settings_cache.invalidate(hub_id)
+        settings_cache.mark_missing(hub_id)
+        s2 = PaymentGatewaySettings.get_settings(hub_id)
+        assert s1.pk == s2.pk
+        assert PaymentGatewaySettings.all_objects.filter(hub_id=hub_id).count() == 1
+
 
 # ---------------------------------------------------------------------------
 # PaymentTransaction
@@ -253,6 +293,276 @@ class TestPaymentTransaction:
         assert txn.metadata['extra'] == 'data'
 
 
+class TestTransactionTransitions:
+    """Compare-and-swap state transitions."""
+
+    def _copy(self, txn):
+        from online_payments.models import PaymentTransaction
+        return PaymentTransaction.objects.get(pk=txn.pk)
+
+    def test_only_one_concurrent_completion_applies(self, pending_transaction):
+        other = self._copy(pending_transaction)
+
+        from online_payments.models import retry_on_conflict
+
+        assert pending_transaction.mark_completed(gateway_reference='pi_first') is True
+        assert retry_on_conflict(
+            other, lambda txn: txn.mark_completed(gateway_reference='pi_second'),
+        ) is False
+
+        pending_transaction.refresh_from_db()
+        assert pending_transaction.gateway_reference == 'pi_first'
+        assert other.status == 'completed'
+
+    def test_completion_is_a_single_update(self, pending_transaction):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            pending_transaction.mark_completed(
+                gateway_reference='pi_one', payment_method_type='card',
+            )
+
+        updates = [
+            q['sql'] for q in ctx.captured_queries
+            if q['sql'].startswith('UPDATE') and 'online_payments_transaction' in q['sql']
+        ]
+        assert len(updates) == 1
+        pending_transaction.refresh_from_db()
+        assert pending_transaction.gateway_reference == 'pi_one'
+        assert 'pi_one' in pending_transaction.search_text
+
+    def test_cannot_fail_completed(self, completed_transaction):
+        assert completed_transaction.mark_failed('late expiry') is False
+        completed_transaction.refresh_from_db()
+        assert completed_transaction.status == 'completed'
+        assert completed_transaction.error_message == ''
+
+    def test_late_completion_after_failure(self, failed_transaction):
+        assert failed_transaction.mark_completed() is True
+        failed_transaction.refresh_from_db()
+        assert failed_transaction.status == 'completed'
+
+    def test_stale_refund_cannot_over_refund(self, completed_transaction):
+        other = self._copy(completed_transaction)
+
+        assert completed_transaction.process_refund(Decimal('60.00')) is True
+        assert other.process_refund(Decimal('60.00')) is False
+        assert other.refund_amount == Decimal('0.00')
+        assert other.status == 'completed'
+
+        completed_transaction.refresh_from_db()
+        assert completed_transaction.refund_amount == Decimal('60.00')
+
+    def test_concurrent_partial_refunds_both_apply(self, completed_transaction):
+        other = self._copy(completed_transaction)
+
+        assert completed_transaction.process_refund(Decimal('60.00')) is True
+        assert other.process_refund(Decimal('40.00')) is True
+        assert other.refund_amount == Decimal('100.00')
+        assert other.status == 'refunded'
+
+    def test_refund_requires_refundable_status(self, pending_transaction):
+        assert pending_transaction.process_refund(Decimal('10.00')) is False
+        pending_transaction.refresh_from_db()
+        assert pending_transaction.status == 'pending'
+
+    def test_completion_consumes_payment_link(self, pending_transaction, active_payment_link):
+        pending_transaction.payment_link = active_payment_link
+        pending_transaction.save()
+
+        assert pending_transaction.mark_completed() is True
+        assert pending_transaction.mark_completed() is False
+
+        active_payment_link.refresh_from_db()
+        assert active_payment_link.current_uses == 1
+
+    def test_transition_with_explicit_states(self, pending_transaction):
+        assert pending_transaction.transition('processing') is True
+        assert pending_transaction.transition('processing') is False
+        assert pending_transaction.transition(
+            'failed', allowed_from=('processing',), error_message='timeout',
+        ) is True
+        pending_transaction.refresh_from_db()
+        assert pending_transaction.status == 'failed'
+
+
+class TestOptimisticConcurrency:
+    """Version column checks on transactions and links."""
+
+    def test_new_rows_start_at_version_one(self, pending_transaction, active_payment_link):
+        assert pending_transaction.version == 1
+        assert active_payment_link.version == 1
+
+    def test_save_bumps_version(self, pending_transaction):
+        pending_transaction.description = 'Edited'
+        pending_transaction.save()
+        pending_transaction.refresh_from_db()
+        assert pending_transaction.version == 2
+
+    def test_stale_save_raises(self, pending_transaction):
+        from online_payments.models import ConcurrentUpdateError, PaymentTransaction
+
+        stale = PaymentTransaction.objects.get(pk=pending_transaction.pk)
+        pending_transaction.mark_completed(gateway_reference='pi_webhook')
+
+        stale.description = 'Edited'
+        with pytest.raises(ConcurrentUpdateError):
+            stale.save()
+        assert stale.version == 1
+        pending_transaction.refresh_from_db()
+        assert pending_transaction.status == 'completed'
+        assert pending_transaction.description == 'Test payment'
+
+    def test_stale_link_save_raises(self, active_payment_link):
+        from online_payments.models import ConcurrentUpdateError, PaymentLink
+
+        stale = PaymentLink.objects.get(pk=active_payment_link.pk)
+        assert PaymentLink.consume(pk=active_payment_link.pk)
+
+        stale.title = 'Renamed'
+        with pytest.raises(ConcurrentUpdateError):
+            stale.save(update_fields=['title'])
+        active_payment_link.refresh_from_db()
+        assert active_payment_link.current_uses == 1
+
+    def test_transition_bumps_version(self, pending_transaction):
+        pending_transaction.mark_completed()
+        assert pending_transaction.version == 2
+        pending_transaction.refresh_from_db()
+        assert pending_transaction.version == 2
+
+    def test_stale_transition_raises(self, pending_transaction):
+        from online_payments.models import ConcurrentUpdateError, PaymentTransaction
+
+        stale = PaymentTransaction.objects.get(pk=pending_transaction.pk)
+        pending_transaction.description = 'Edited'
+        pending_transaction.save()
+
+        with pytest.raises(ConcurrentUpdateError):
+            stale.mark_failed('timeout')
+        pending_transaction.refresh_from_db()
+        assert pending_transaction.status == 'pending'
+
+    def test_retry_on_conflict_reloads(self, pending_transaction):
+        from online_payments.models import PaymentTransaction, retry_on_conflict
+
+        stale = PaymentTransaction.objects.get(pk=pending_transaction.pk)
+        pending_transaction.description = 'Edited'
+        pending_transaction.save()
+
+        assert retry_on_conflict(stale, lambda txn: txn.mark_failed('timeout')) is True
+        assert stale.description == 'Edited'
+        assert stale.status == 'failed'
+
+    def test_retry_on_conflict_gives_up(self, pending_transaction):
+        from online_payments.models import ConcurrentUpdateError, retry_on_conflict
+
+        calls = []
+
+        def always_conflicts(txn):
+            calls.append(txn.version)
+            raise ConcurrentUpdateError('busy')
+
+        with pytest.raises(ConcurrentUpdateError):
+            retry_on_conflict(pending_transaction, always_conflicts, attempts=2)
+        assert len(calls) == 2
+
+    def test_link_deactivate(self, active_payment_link):
+        active_payment_link.deactivate()
+        active_payment_link.refresh_from_db()
+        assert active_payment_link.is_active is False
+        assert active_payment_link.version == 2
+
+    def test_stale_link_deactivate_raises(self, active_payment_link):
+        from online_payments.models import ConcurrentUpdateError, PaymentLink
+
+        stale = PaymentLink.objects.get(pk=active_payment_link.pk)
+        active_payment_link.title = 'Renamed'
+        active_payment_link.save()
+
+        with pytest.raises(ConcurrentUpdateError):
+            stale.deactivate()
+
+    def test_consume_bumps_link_version(self, active_payment_link):
+        from online_payments.models import PaymentLink
+
+        assert PaymentLink.consume(pk=active_payment_link.pk)
+        active_payment_link.refresh_from_db()
+        assert active_payment_link.version == 2
+
+
+# ---------------------------------------------------------------------------
+# PaymentRefund
+# ---------------------------------------------------------------------------
+
+class TestPaymentRefund:
+    """Refund ledger rows and the guarded refund total."""
+
+    def test_refund_is_recorded(self, completed_transaction):
+        completed_transaction.process_refund(
+            Decimal('25.00'), reason='Damaged', gateway_refund_id='re_1',
+        )
+        refund = completed_transaction.refunds.get()
+        assert refund.amount == Decimal('25.00')
+        assert refund.reason == 'Damaged'
+        assert refund.gateway_refund_id == 're_1'
+        assert refund.hub_id == completed_transaction.hub_id
+
+    def test_partial_refunds_accumulate(self, completed_transaction):
+        completed_transaction.process_refund(Decimal('30.00'))
+        completed_transaction.process_refund(Decimal('70.00'))
+
+        completed_transaction.refresh_from_db()
+        assert completed_transaction.status == 'refunded'
+        assert completed_transaction.refund_amount == Decimal('100.00')
+        assert sorted(r.amount for r in completed_transaction.refunds.all()) == [
+            Decimal('30.00'), Decimal('70.00'),
+        ]
+
+    def test_full_refund_defaults_to_remaining(self, completed_transaction):
+        completed_transaction.process_refund(Decimal('30.00'))
+        assert completed_transaction.process_refund() is True
+        assert completed_transaction.refund_amount == Decimal('100.00')
+        assert completed_transaction.refunds.count() == 2
+
+    def test_duplicate_gateway_refund_is_ignored(self, completed_transaction):
+        assert completed_transaction.process_refund(Decimal('10.00'), gateway_refund_id='re_dup')
+        assert completed_transaction.process_refund(Decimal('10.00'), gateway_refund_id='re_dup') is False
+
+        completed_transaction.refresh_from_db()
+        assert completed_transaction.refund_amount == Decimal('10.00')
+        assert completed_transaction.refunds.count() == 1
+
+    def test_rejected_refund_leaves_no_record(self, completed_transaction):
+        from online_payments.models import PaymentTransaction
+
+        other = PaymentTransaction.objects.get(pk=completed_transaction.pk)
+        completed_transaction.process_refund(Decimal('90.00'))
+        assert other.process_refund(Decimal('20.00')) is False
+        assert completed_transaction.refunds.count() == 1
+
+    def test_refund_total_is_a_single_update(self, completed_transaction):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            completed_transaction.process_refund(Decimal('15.00'))
+
+        updates = [
+            q['sql'] for q in ctx.captured_queries
+            if q['sql'].startswith('UPDATE') and 'online_payments_transaction' in q['sql']
+        ]
+        assert len(updates) == 1
+
+    def test_invalid_amount(self, completed_transaction):
+        with pytest.raises(ValueError):
+            completed_transaction.process_refund(Decimal('0'))
+        with pytest.raises(ValueError):
+            completed_transaction.process_refund(Decimal('100.01'))
+        assert completed_transaction.refunds.count() == 0
+
+
 # ---------------------------------------------------------------------------
 # PaymentLink
 # ---------------------------------------------------------------------------
@@ -348,6 +658,41 @@ class TestPaymentLink:
         active_payment_link.refresh_from_db()
         assert active_payment_link.current_uses == 1
 
+    def test_consume_use(self, active_payment_link):
+        assert active_payment_link.consume_use() is True
+        assert active_payment_link.current_uses == 1
+        active_payment_link.refresh_from_db()
+        assert active_payment_link.current_uses == 1
+
+    def test_consume_use_exhausted(self, maxed_out_payment_link):
+        assert maxed_out_payment_link.consume_use() is False
+        maxed_out_payment_link.refresh_from_db()
+        assert maxed_out_payment_link.current_uses == 3
+
+    def test_consume_use_stops_at_max(self, hub_id):
+        from online_payments.models import PaymentLink
+        link = PaymentLink.objects.create(
+            hub_id=hub_id, title='Flash', amount=Decimal('5.00'), max_uses=2,
+        )
+        results = [PaymentLink.consume(slug=link.slug) for _ in range(4)]
+        assert results == [True, True, False, False]
+        link.refresh_from_db()
+        assert link.current_uses == 2
+
+    def test_consume_use_unlimited(self, hub_id):
+        from online_payments.models import PaymentLink
+        link = PaymentLink.objects.create(
+            hub_id=hub_id, title='Open', amount=Decimal('5.00'), max_uses=0,
+        )
+        for _ in range(3):
+            assert link.consume_use() is True
+        link.refresh_from_db()
+        assert link.current_uses == 3
+
+    def test_consume_missing_link(self, hub_id):
+        from online_payments.models import PaymentLink
+        assert PaymentLink.consume(slug='does-not-exist') is False
+
     def test_source_reference(self, hub_id):
         from online_payments.models import PaymentLink
         import uuid
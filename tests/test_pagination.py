@@ -0,0 +1,67 @@
+"""
+Tests for keyset pagination of transactions.
+"""
+
+import pytest
+from decimal import Decimal
+
+
+pytestmark = [pytest.mark.django_db, pytest.mark.unit]
+
+
+@pytest.fixture
+def many_transactions(hub_id):
+    from online_payments.models import PaymentTransaction
+    return [
+        PaymentTransaction.objects.create(
+            hub_id=hub_id, gateway='stripe', amount=Decimal(i + 1),
+        )
+        for i in range(7)
+    ]
+
+
+def _ids(page):
+    return [t.pk for t in page]
+
+
+class TestCursorPagination:
+
+    def test_first_page(self, hub_id, many_transactions):
+        from online_payments.models import PaymentTransaction
+        from online_payments.pagination import paginate_by_cursor
+        qs = PaymentTransaction.objects.filter(hub_id=hub_id)
+        page = paginate_by_cursor(qs, '', 3)
+        assert len(page) == 3
+        assert page.has_next
+        assert not page.has_previous
+        assert _ids(page) == _ids(qs.order_by('-created_at', '-id')[:3])
+
+    def test_walks_forward_and_back(self, hub_id, many_transactions):
+        from online_payments.models import PaymentTransaction
+        from online_payments.pagination import paginate_by_cursor
+        qs = PaymentTransaction.objects.filter(hub_id=hub_id)
+        expected = _ids(qs.order_by('-created_at', '-id'))
+
+        first = paginate_by_cursor(qs, '', 3)
+        second = paginate_by_cursor(qs, first.next_cursor, 3)
+        third = paginate_by_cursor(qs, second.next_cursor, 3)
+        assert _ids(first) + _ids(second) + _ids(third) == expected
+        assert not third.has_next
+
+        back = paginate_by_cursor(qs, second.previous_cursor, 3)
+        assert _ids(back) == _ids(first)
+        assert not back.has_previous
+
+    def test_invalid_cursor_returns_first_page(self, hub_id, many_transactions):
+        from online_payments.models import PaymentTransaction
+        from online_payments.pagination import paginate_by_cursor
+        qs = PaymentTransaction.objects.filter(hub_id=hub_id)
+        page = paginate_by_cursor(qs, 'not-a-cursor', 3)
+        assert _ids(page) == _ids(qs.order_by('-created_at', '-id')[:3])
+
+    def test_no_count_query(self, hub_id, many_transactions, django_assert_num_queries):
+        from online_payments.models import PaymentTransaction
+        from online_payments.pagination import paginate_by_cursor
+        qs = PaymentTransaction.objects.filter(hub_id=hub_id)
+        with django_assert_num_queries(1):
+            paginate_by_cursor(qs, '', 3)
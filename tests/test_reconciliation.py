@@ -0,0 +1,145 @@
+"""
+Tests for settlement file reconciliation.
+"""
+
+import io
+from decimal import Decimal
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+
+pytestmark = [pytest.mark.django_db, pytest.mark.unit]
+
+
+def _stripe_txn(hub_id, transaction_id, amount, status='completed', reference=''):
+    from online_payments.models import PaymentTransaction
+    return PaymentTransaction.objects.create(
+        hub_id=hub_id,
+        transaction_id=transaction_id,
+        gateway='stripe',
+        amount=Decimal(amount),
+        currency='EUR',
+        status=status,
+        gateway_reference=reference,
+        completed_at=timezone.now() if status == 'completed' else None,
+    )
+
+
+class TestParsers:
+    """Tests for the settlement file parsers."""
+
+    def test_stripe_itemized_report(self):
+        from online_payments.reconciliation import parse_stripe_settlement
+
+        f = io.StringIO(
+            'balance_transaction_id,reporting_category,gross,currency,payment_intent_id,payment_metadata[transaction_id]\n'
+            'txn_1,charge,25.00,eur,pi_1,TXN-A\n'
+            'txn_2,fee,-0.50,eur,,\n'
+            'txn_3,refund,-5.00,eur,pi_1,TXN-A\n'
+        )
+        records = list(parse_stripe_settlement(f))
+
+        assert [(r.kind, r.transaction_id, r.reference, r.amount, r.currency) for r in records] == [
+            ('payment', 'TXN-A', 'pi_1', Decimal('25.00'), 'EUR'),
+            ('refund', 'TXN-A', 'pi_1', Decimal('5.00'), 'EUR'),
+        ]
+
+    def test_redsys_semicolon_file(self):
+        from online_payments.reconciliation import parse_redsys_settlement
+
+        f = io.StringIO(
+            'Fecha;Nº Pedido;Importe;Moneda;Resultado;Tipo operación\n'
+            '01/10/2026;TXN-B;1.234,50;978;0000;0\n'
+            '01/10/2026;TXN-C;10,00;978;0190;0\n'
+        )
+        records = list(parse_redsys_settlement(f))
+
+        assert records[0].transaction_id == 'TXN-B'
+        assert records[0].amount == Decimal('1234.50')
+        assert records[0].currency == 'EUR'
+        assert records[0].kind == 'payment'
+        assert records[1].kind == 'failed'
+
+
+class TestReconcile:
+    """Tests for reconcile()."""
+
+    def _records(self, *rows):
+        from online_payments.reconciliation import SettlementRecord
+        return [
+            SettlementRecord(line=i, kind=kind, transaction_id=txn, reference=ref,
+                             amount=Decimal(amount), currency='EUR')
+            for i, (kind, txn, ref, amount) in enumerate(rows, start=2)
+        ]
+
+    def test_matches_and_mismatches(self, hub_id):
+        from online_payments.reconciliation import reconcile
+
+        _stripe_txn(hub_id, 'TXN-OK', '10.00')
+        _stripe_txn(hub_id, 'TXN-DRIFT', '20.00')
+        _stripe_txn(hub_id, 'TXN-PENDING', '30.00', status='pending')
+        _stripe_txn(hub_id, 'TXN-BYREF', '40.00', reference='pi_ref')
+
+        run = reconcile(hub_id, 'stripe', self._records(
+            ('payment', 'TXN-OK', '', '10.00'),
+            ('payment', 'TXN-DRIFT', '', '19.00'),
+            ('payment', 'TXN-PENDING', '', '30.00'),
+            ('payment', '', 'pi_ref', '40.00'),
+            ('payment', 'TXN-UNKNOWN', '', '5.00'),
+        ), chunk_size=2)
+
+        assert run.status == 'completed'
+        assert run.records_count == 5
+        assert run.matched_count == 4
+        assert run.summary == {'amount_drift': 1, 'status_drift': 1, 'missing_local': 1}
+        kinds = {(m['kind'], m['transaction_id']) for m in run.mismatches}
+        assert ('amount_drift', 'TXN-DRIFT') in kinds
+        assert ('status_drift', 'TXN-PENDING') in kinds
+        assert ('missing_local', 'TXN-UNKNOWN') in kinds
+
+    def test_missing_remote_within_period(self, hub_id):
+        from online_payments.reconciliation import reconcile
+
+        _stripe_txn(hub_id, 'TXN-IN-FILE', '10.00')
+        _stripe_txn(hub_id, 'TXN-NOT-IN-FILE', '15.00')
+        today = timezone.localdate()
+
+        run = reconcile(
+            hub_id, 'stripe', self._records(('payment', 'TXN-IN-FILE', '', '10.00')),
+            period_start=today, period_end=today,
+        )
+
+        assert run.summary == {'missing_remote': 1}
+        assert run.mismatches[0]['transaction_id'] == 'TXN-NOT-IN-FILE'
+
+    def test_one_ledger_query_per_chunk(self, hub_id, django_assert_max_num_queries):
+        from online_payments.reconciliation import reconcile
+
+        for i in range(6):
+            _stripe_txn(hub_id, f'TXN-{i}', '1.00')
+        records = self._records(*[('payment', f'TXN-{i}', '', '1.00') for i in range(6)])
+
+        # run INSERT + 2 chunk joins + run UPDATE
+        with django_assert_max_num_queries(4):
+            run = reconcile(hub_id, 'stripe', records, chunk_size=3)
+        assert run.mismatch_count == 0
+
+
+class TestReconcileCommand:
+    """Tests for the reconcile_payments management command."""
+
+    def test_command(self, hub_id, tmp_path):
+        from online_payments.models import ReconciliationRun
+
+        _stripe_txn(hub_id, 'TXN-CMD', '12.00')
+        path = tmp_path / 'stripe.csv'
+        path.write_text('id,type,amount,currency,transaction_id\ntxn_1,charge,12.00,eur,TXN-CMD\n')
+        out = io.StringIO()
+
+        call_command('reconcile_payments', str(path), hub=str(hub_id), gateway='stripe', stdout=out)
+
+        assert '1 matched, 0 mismatches' in out.getvalue()
+        run = ReconciliationRun.objects.get(hub_id=hub_id)
+        assert run.source_name == 'stripe.csv'
@@ -0,0 +1,291 @@
+"""
+Tests for bulk refunds.
+"""
+
+import io
+import threading
+import uuid
+from decimal import Decimal
+
+import pytest
+from django.core.management import call_command
+
+
+pytestmark = [pytest.mark.django_db, pytest.mark.unit]
+
+EVENT_ID = uuid.UUID('00000000-0000-4000-8000-0000000e7e47')
+
+
+def _completed(hub_id, count, gateway='stripe', **fields):
+    from online_payments.models import PaymentTransaction
+    return [
+        PaymentTransaction.objects.create(
+            hub_id=hub_id,
+            gateway=gateway,
+            amount=Decimal('20.00'),
+            currency='EUR',
+            status='completed',
+            gateway_reference=f'pi_{i}',
+            **fields,
+        )
+        for i in range(count)
+    ]
+
+
+class RecordingClient:
+    """Refund client that records its batches and may reject some requests."""
+
+    def __init__(self, batch_size=2, reject=()):
+        self.batch_size = batch_size
+        self.reject = set(reject)
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def refund_batch(self, requests):
+        from online_payments.refunds import RefundError
+        with self._lock:
+            self.batches.append(requests)
+        return [
+            RefundError('Card closed') if r.transaction_id in self.reject else f're_{r.transaction_id}'
+            for r in requests
+        ]
+
+
+class ShortClient:
+    """Refund client that drops the last result of every batch."""
+
+    batch_size = 10
+
+    def refund_batch(self, requests):
+        return [f're_{r.transaction_id}' for r in requests[:-1]]
+
+
+class FailingClient:
+    batch_size = 10
+
+    def refund_batch(self, requests):
+        from online_payments.refunds import RefundError
+        raise RefundError('Gateway unavailable')
+
+
+class TestBulkRefund:
+    """Tests for bulk_refund()."""
+
+    def test_refunds_by_transaction_ids(self, hub_id):
+        from online_payments.models import PaymentDailyRollup, PaymentRefund
+        from online_payments.refunds import bulk_refund
+
+        txns = _completed(hub_id, 5)
+        result = bulk_refund(hub_id, transaction_ids=[t.transaction_id for t in txns], reason='Cancelled')
+
+        assert result.refunded_count == 5
+        assert result.refunded_amount == Decimal('100.00')
+        assert result.errors == []
+        for txn in txns:
+            txn.refresh_from_db()
+            assert txn.status == 'refunded'
+            assert txn.refund_amount == Decimal('20.00')
+            assert txn.version == 2
+        refunds = PaymentRefund.objects.filter(hub_id=hub_id)
+        assert refunds.count() == 5
+        assert {r.reason for r in refunds} == {'Cancelled'}
+        assert all(r.gateway_refund_id.startswith('local_') for r in refunds)
+        rollup = PaymentDailyRollup.objects.get(hub_id=hub_id)
+        assert rollup.refund_count == 5
+        assert rollup.refunded_amount == Decimal('100.00')
+
+    def test_refunds_remaining_amount(self, hub_id):
+        from online_payments.refunds import bulk_refund
+
+        txn = _completed(hub_id, 1)[0]
+        txn.process_refund(Decimal('5.00'))
+        result = bulk_refund(hub_id, transaction_ids=[txn.transaction_id])
+
+        assert result.refunded == [{
+            'transaction_id': txn.transaction_id,
+            'amount': '15.00',
+            'gateway_refund_id': result.refunded[0]['gateway_refund_id'],
+        }]
+        txn.refresh_from_db()
+        assert txn.refund_amount == Decimal('20.00')
+        assert txn.refunds.count() == 2
+
+    def test_reports_unknown_and_unrefundable(self, hub_id, pending_transaction):
+        from online_payments.refunds import bulk_refund
+
+        txn = _completed(hub_id, 1)[0]
+        result = bulk_refund(hub_id, transaction_ids=[
+            txn.transaction_id, pending_transaction.transaction_id, 'TXN-MISSING', txn.transaction_id,
+        ])
+
+        assert result.refunded_count == 1
+        assert {e['transaction_id'] for e in result.errors} == {
+            pending_transaction.transaction_id, 'TXN-MISSING',
+        }
+
+    def test_refunds_by_source(self, hub_id):
+        from online_payments.models import PaymentTransaction
+        from online_payments.refunds import bulk_refund
+
+        tickets = _completed(hub_id, 7, source_type='event', source_id=EVENT_ID)
+        other = _completed(hub_id, 2, source_type='event', source_id=uuid.uuid4())
+
+        queryset = PaymentTransaction.objects.filter(source_type='event', source_id=EVENT_ID)
+        result = bulk_refund(hub_id, queryset=queryset, chunk_size=3)
+
+        assert result.refunded_count == 7
+        assert PaymentTransaction.objects.filter(
+            pk__in=[t.pk for t in tickets], status='refunded',
+        ).count() == 7
+        assert PaymentTransaction.objects.filter(
+            pk__in=[t.pk for t in other], status='completed',
+        ).count() == 2
+
+    def test_groups_calls_per_gateway(self, hub_id):
+        from online_payments.refunds import bulk_refund
+
+        stripe = _completed(hub_id, 5, gateway='stripe')
+        redsys = _completed(hub_id, 3, gateway='redsys')
+        clients = {'stripe': RecordingClient(batch_size=2), 'redsys': RecordingClient(batch_size=10)}
+
+        result = bulk_refund(
+            hub_id, transaction_ids=[t.transaction_id for t in stripe + redsys], clients=clients,
+        )
+
+        assert result.refunded_count == 8
+        assert sorted(len(b) for b in clients['stripe'].batches) == [1, 2, 2]
+        assert [len(b) for b in clients['redsys'].batches] == [3]
+        stripe[0].refresh_from_db()
+        assert stripe[0].refunds.get().gateway_refund_id == f're_{stripe[0].transaction_id}'
+
+    def test_rejected_requests_are_not_recorded(self, hub_id):
+        from online_payments.refunds import bulk_refund
+
+        txns = _completed(hub_id, 3)
+        client = RecordingClient(reject={txns[1].transaction_id})
+        result = bulk_refund(
+            hub_id, transaction_ids=[t.transaction_id for t in txns], clients={'stripe': client},
+        )
+
+        assert result.refunded_count == 2
+        assert result.errors == [{'transaction_id': txns[1].transaction_id, 'error': 'Card closed'}]
+        txns[1].refresh_from_db()
+        assert txns[1].status == 'completed'
+        assert txns[1].refund_amount == Decimal('0.00')
+        assert txns[1].refunds.count() == 0
+
+    def test_rejected_request_restores_partial_refund(self, hub_id):
+        from online_payments.refunds import bulk_refund
+
+        txn = _completed(hub_id, 1)[0]
+        txn.process_refund(Decimal('5.00'))
+        client = RecordingClient(reject={txn.transaction_id})
+        bulk_refund(hub_id, transaction_ids=[txn.transaction_id], clients={'stripe': client})
+
+        txn.refresh_from_db()
+        assert txn.status == 'partially_refunded'
+        assert txn.refund_amount == Decimal('5.00')
+
+    def test_missing_results_are_failures(self, hub_id):
+        from online_payments.refunds import bulk_refund
+
+        txns = _completed(hub_id, 3)
+        result = bulk_refund(
+            hub_id, transaction_ids=[t.transaction_id for t in txns],
+            clients={'stripe': ShortClient()},
+        )
+
+        assert result.refunded_count == 2
+        assert [e['transaction_id'] for e in result.errors] == [txns[2].transaction_id]
+        txns[2].refresh_from_db()
+        assert txns[2].status == 'completed'
+        assert txns[2].refunds.count() == 0
+
+    def test_reservation_blocks_concurrent_refund(self, hub_id):
+        from online_payments.refunds import BulkRefundResult, _reserve
+
+        txn = _completed(hub_id, 1)[0]
+        reserved = _reserve([txn], BulkRefundResult())
+
+        assert reserved == [(txn, Decimal('20.00'))]
+        # A refund from a copy loaded before the reservation is rejected
+        # while the gateway call is in flight.
+        assert txn.process_refund(Decimal('1.00')) is False
+        assert _reserve([txn], BulkRefundResult()) == []
+
+    def test_failed_gateway_call(self, hub_id):
+        from online_payments.models import PaymentRefund
+        from online_payments.refunds import bulk_refund
+
+        txns = _completed(hub_id, 3)
+        result = bulk_refund(
+            hub_id, transaction_ids=[t.transaction_id for t in txns],
+            clients={'stripe': FailingClient()},
+        )
+
+        assert result.refunded_count == 0
+        assert len(result.errors) == 3
+        assert PaymentRefund.objects.count() == 0
+
+    def test_one_reservation_query_per_transaction(self, hub_id):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from online_payments.refunds import bulk_refund
+
+        small = _completed(hub_id, 3)
+        large = _completed(hub_id, 30)
+
+        with CaptureQueriesContext(connection) as few:
+            bulk_refund(hub_id, transaction_ids=[t.transaction_id for t in small])
+        with CaptureQueriesContext(connection) as many:
+            bulk_refund(hub_id, transaction_ids=[t.transaction_id for t in large])
+
+        # Only the guarded reservation UPDATE runs per transaction.
+        assert len(many.captured_queries) <= len(few.captured_queries) + (30 - 3) + 2
+
+    def test_requires_one_selection(self, hub_id):
+        from online_payments.refunds import bulk_refund
+        with pytest.raises(ValueError):
+            bulk_refund(hub_id)
+
+    def test_configured_client(self, settings):
+        from online_payments.refunds import LocalRefundClient, get_refund_client
+
+        assert isinstance(get_refund_client('stripe'), LocalRefundClient)
+        settings.ONLINE_PAYMENTS_REFUND_CLIENTS = {
+            'stripe': 'online_payments.refunds.LocalRefundClient',
+        }
+        assert isinstance(get_refund_client('stripe'), LocalRefundClient)
+
+
+class TestBulkRefundCommand:
+    """Tests for the bulk_refund management command."""
+
+    def test_refunds_ids_file(self, hub_id, tmp_path):
+        txns = _completed(hub_id, 2)
+        path = tmp_path / 'ids.txt'
+        path.write_text('\n'.join(t.transaction_id for t in txns) + '\nTXN-MISSING\n')
+        out, err = io.StringIO(), io.StringIO()
+
+        call_command(
+            'bulk_refund', hub=str(hub_id), ids_file=str(path), reason='Cancelled',
+            stdout=out, stderr=err,
+        )
+
+        assert '2 transactions refunded (40.00), 1 failed.' in out.getvalue()
+        assert 'TXN-MISSING' in err.getvalue()
+
+    def test_refunds_by_source(self, hub_id):
+        _completed(hub_id, 4, source_type='event', source_id=EVENT_ID)
+        out = io.StringIO()
+
+        call_command(
+            'bulk_refund', hub=str(hub_id), source_type='event', source_id=str(EVENT_ID), stdout=out,
+        )
+
+        assert '4 transactions refunded' in out.getvalue()
+
+    def test_requires_selection(self, hub_id):
+        from django.core.management.base import CommandError
+        with pytest.raises(CommandError):
+            call_command('bulk_refund', hub=str(hub_id))
@@ -0,0 +1,64 @@
+"""
+Tests for the transaction search backend.
+"""
+
+import pytest
+from decimal import Decimal
+
+
+pytestmark = [pytest.mark.django_db, pytest.mark.unit]
+
+
+class TestSearchText:
+
+    def test_maintained_on_create(self, completed_transaction):
+        assert 'completed customer' in completed_transaction.search_text
+        assert 'customer@example.com' in completed_transaction.search_text
+        assert 'pi_test_123' in completed_transaction.search_text
+
+    def test_maintained_on_partial_save(self, pending_transaction):
+        from online_payments.models import PaymentTransaction
+        pending_transaction.gateway_reference = 'pi_NEW_REF'
+        pending_transaction.save(update_fields=['gateway_reference', 'updated_at'])
+        refreshed = PaymentTransaction.objects.get(pk=pending_transaction.pk)
+        assert 'pi_new_ref' in refreshed.search_text
+
+
+class TestSearchTransactions:
+
+    def _search(self, hub_id, term):
+        from online_payments.models import PaymentTransaction
+        from online_payments.search import search_transactions
+        qs = PaymentTransaction.objects.filter(hub_id=hub_id)
+        return list(search_transactions(qs, term))
+
+    def test_by_name_case_insensitive(self, hub_id, completed_transaction, pending_transaction):
+        assert self._search(hub_id, 'COMPLETED cust') == [completed_transaction]
+
+    def test_by_email(self, hub_id, completed_transaction, failed_transaction):
+        assert self._search(hub_id, 'customer@example') == [completed_transaction]
+
+    def test_exact_transaction_id(self, hub_id, completed_transaction, pending_transaction):
+        term = completed_transaction.transaction_id.lower()
+        assert self._search(hub_id, term) == [completed_transaction]
+
+    def test_transaction_id_prefix(self, hub_id, completed_transaction):
+        term = completed_transaction.transaction_id[:12]
+        assert completed_transaction in self._search(hub_id, term)
+
+    def test_gateway_reference_prefix(self, hub_id, completed_transaction, pending_transaction):
+        assert self._search(hub_id, 'pi_test') == [completed_transaction]
+
+    def test_empty_term(self, hub_id, completed_transaction, pending_transaction):
+        assert len(self._search(hub_id, '  ')) == 2
+
+    def test_no_match(self, hub_id, completed_transaction):
+        assert self._search(hub_id, 'nobody') == []
+
+    def test_does_not_match_across_fields(self, hub_id):
+        from online_payments.models import PaymentTransaction
+        PaymentTransaction.objects.create(
+            hub_id=hub_id, gateway='stripe', amount=Decimal('1.00'),
+            customer_name='Ann', customer_email='bob@example.com',
+        )
+        assert self._search(hub_id, 'ann bob') == []
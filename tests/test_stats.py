@@ -0,0 +1,180 @@
+"""
+Tests for Online Payments dashboard statistics and daily rollups.
+"""
+
+import pytest
+from decimal import Decimal
+from datetime import timedelta
+from django.utils import timezone
+
+
+pytestmark = [pytest.mark.django_db, pytest.mark.unit]
+
+
+# ---------------------------------------------------------------------------
+# Dashboard stats
+# ---------------------------------------------------------------------------
+
+class TestDashboardStats:
+
+    def test_empty_hub(self, hub_id):
+        from online_payments.stats import get_dashboard_stats
+        stats = get_dashboard_stats(hub_id)
+        assert stats.total_collected == Decimal('0.00')
+        assert stats.total_pending == Decimal('0.00')
+        assert stats.total_refunded == Decimal('0.00')
+        assert stats.collected_today == Decimal('0.00')
+        assert stats.active_links_count == 0
+
+    def test_totals(self, hub_id, pending_transaction, active_payment_link):
+        from online_payments.models import PaymentTransaction
+        from online_payments.stats import get_dashboard_stats
+        paid = PaymentTransaction.objects.create(
+            hub_id=hub_id, gateway='stripe', amount=Decimal('100.00'),
+        )
+        paid.mark_completed()
+        stats = get_dashboard_stats(hub_id)
+        assert stats.total_collected == Decimal('100.00')
+        assert stats.total_pending == Decimal('50.00')
+        assert stats.collected_today == Decimal('100.00')
+        assert stats.active_links_count == 1
+
+    def test_refunds(self, hub_id, pending_transaction):
+        from online_payments.stats import get_dashboard_stats
+        pending_transaction.mark_completed()
+        pending_transaction.process_refund(Decimal('20.00'))
+        stats = get_dashboard_stats(hub_id)
+        assert stats.total_refunded == Decimal('20.00')
+
+    def test_collected_today_excludes_older(self, hub_id, completed_transaction):
+        from online_payments.rollups import rebuild_rollups
+        from online_payments.stats import get_dashboard_stats
+        completed_transaction.completed_at = timezone.now() - timedelta(days=2)
+        completed_transaction.save()
+        rebuild_rollups(hub_id=hub_id)
+        stats = get_dashboard_stats(hub_id)
+        assert stats.total_collected == Decimal('100.00')
+        assert stats.collected_today == Decimal('0.00')
+
+    def test_ignores_deleted(self, hub_id, pending_transaction):
+        from online_payments.rollups import rebuild_rollups
+        from online_payments.stats import get_dashboard_stats
+        pending_transaction.mark_completed()
+        pending_transaction.process_refund(Decimal('20.00'))
+        pending_transaction.delete()
+        stats = get_dashboard_stats(hub_id)
+        assert stats.total_collected == Decimal('0.00')
+        assert stats.collected_today == Decimal('0.00')
+        assert stats.total_refunded == Decimal('0.00')
+
+        rebuild_rollups(hub_id=hub_id)
+        assert get_dashboard_stats(hub_id) == stats
+
+    def test_query_budget(self, hub_id, django_assert_num_queries):
+        from online_payments.stats import get_dashboard_stats
+        with django_assert_num_queries(3):
+            get_dashboard_stats(hub_id)
+
+
+# ---------------------------------------------------------------------------
+# Daily rollups
+# ---------------------------------------------------------------------------
+
+class TestPaymentDailyRollup:
+
+    def test_mark_completed_records(self, hub_id, pending_transaction):
+        from online_payments.models import PaymentDailyRollup
+        pending_transaction.mark_completed()
+        rollup = PaymentDailyRollup.objects.get(hub_id=hub_id)
+        assert rollup.date == timezone.localdate()
+        assert rollup.gateway == 'stripe'
+        assert rollup.completed_count == 1
+        assert rollup.completed_amount == Decimal('50.00')
+
+    def test_mark_completed_twice_counts_once(self, hub_id, pending_transaction):
+        from online_payments.models import PaymentDailyRollup
+        pending_transaction.mark_completed()
+        pending_transaction.mark_completed()
+        rollup = PaymentDailyRollup.objects.get(hub_id=hub_id)
+        assert rollup.completed_count == 1
+
+    def test_mark_failed_records(self, hub_id, pending_transaction):
+        from online_payments.models import PaymentDailyRollup
+        pending_transaction.mark_failed('Card declined')
+        rollup = PaymentDailyRollup.objects.get(hub_id=hub_id)
+        assert rollup.failed_count == 1
+
+    def test_refund_records(self, hub_id, completed_transaction):
+        from online_payments.models import PaymentDailyRollup
+        completed_transaction.process_refund(Decimal('30.00'))
+        completed_transaction.process_refund(Decimal('20.00'))
+        rollup = PaymentDailyRollup.objects.get(hub_id=hub_id)
+        assert rollup.refund_count == 2
+        assert rollup.refunded_amount == Decimal('50.00')
+
+    def test_late_completion_takes_back_failure(self, hub_id, pending_transaction):
+        from online_payments.models import PaymentDailyRollup
+        pending_transaction.mark_failed('Timeout')
+        pending_transaction.mark_completed()
+        rollup = PaymentDailyRollup.objects.get(hub_id=hub_id)
+        assert rollup.failed_count == 0
+        assert rollup.completed_count == 1
+
+    def test_late_completion_uses_failure_day(self, hub_id, pending_transaction):
+        from online_payments.models import PaymentDailyRollup, PaymentTransaction
+        pending_transaction.mark_failed('Timeout')
+        # A later write (e.g. an admin edit) moves updated_at to another day.
+        PaymentTransaction.objects.filter(pk=pending_transaction.pk).update(
+            updated_at=timezone.now() + timedelta(days=2),
+        )
+        pending_transaction.refresh_from_db()
+        pending_transaction.mark_completed()
+        rollup = PaymentDailyRollup.objects.get(hub_id=hub_id, date=timezone.localdate())
+        assert rollup.failed_count == 0
+        assert not PaymentDailyRollup.objects.filter(
+            hub_id=hub_id, date=timezone.localdate() + timedelta(days=2),
+        ).exists()
+
+    def test_rebuild_matches_incremental(self, hub_id, pending_transaction):
+        from online_payments.models import PaymentDailyRollup
+        from online_payments.rollups import rebuild_rollups
+        pending_transaction.mark_failed('Timeout')
+        pending_transaction.mark_completed()
+        pending_transaction.process_refund(Decimal('30.00'))
+        pending_transaction.process_refund(Decimal('20.00'))
+        fields = PaymentDailyRollup.COUNTER_FIELDS
+        incremental = PaymentDailyRollup.objects.filter(hub_id=hub_id).values(*fields).get()
+
+        rebuild_rollups(hub_id=hub_id)
+
+        rebuilt = PaymentDailyRollup.objects.filter(hub_id=hub_id).values(*fields).get()
+        assert rebuilt == incremental
+        assert rebuilt['refund_count'] == 2
+        assert rebuilt['failed_count'] == 0
+
+    def test_rebuild_from_history(self, hub_id, completed_transaction, failed_transaction):
+        from online_payments.models import PaymentDailyRollup
+        from online_payments.rollups import rebuild_rollups
+        completed_transaction.completed_at = timezone.now() - timedelta(days=3)
+        completed_transaction.save()
+        written = rebuild_rollups(hub_id=hub_id, batch_size=1)
+        assert written == 2
+        rollups = PaymentDailyRollup.objects.filter(hub_id=hub_id)
+        assert sum(r.completed_count for r in rollups) == 1
+        assert sum(r.failed_count for r in rollups) == 1
+
+    def test_rebuild_is_idempotent(self, hub_id, completed_transaction):
+        from online_payments.models import PaymentDailyRollup
+        from online_payments.rollups import rebuild_rollups
+        rebuild_rollups(hub_id=hub_id)
+        rebuild_rollups(hub_id=hub_id)
+        rollup = PaymentDailyRollup.objects.get(hub_id=hub_id)
+        assert rollup.completed_count == 1
+        assert rollup.completed_amount == Decimal('100.00')
+
+    def test_rebuild_command(self, hub_id, completed_transaction):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('rebuild_payment_rollups', hub_id=str(hub_id), stdout=out)
+        assert '1 rollup rows written' in out.getvalue()
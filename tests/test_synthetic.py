@@ -0,0 +1,101 @@
+"""
+Tests for the synthetic data generator.
+"""
+
+import io
+import uuid
+
+import pytest
+from django.core.management import call_command
+from django.db.models import Sum
+
+
+pytestmark = [pytest.mark.django_db, pytest.mark.unit]
+
+
+class TestGenerate:
+    """Tests for synthetic.generate()."""
+
+    def test_creates_requested_rows(self, hub_id, synthetic_data):
+        from online_payments.models import PaymentLink, PaymentTransaction
+
+        assert synthetic_data(transactions=500, links=10, chunk_size=120) == {
+            'transactions': 500, 'links': 10,
+        }
+        assert PaymentTransaction.objects.filter(hub_id=hub_id).count() == 500
+        assert PaymentLink.objects.filter(hub_id=hub_id).count() == 10
+
+    def test_realistic_mix(self, hub_id, synthetic_data):
+        from online_payments.models import PaymentTransaction
+
+        synthetic_data(transactions=1000)
+        txns = PaymentTransaction.objects.filter(hub_id=hub_id)
+
+        statuses = set(txns.values_list('status', flat=True))
+        assert {'completed', 'failed', 'pending', 'refunded'} <= statuses
+        assert set(txns.values_list('gateway', flat=True)) >= {'stripe', 'redsys'}
+        assert len(set(txns.values_list('created_at__date', flat=True))) > 30
+        assert not txns.filter(status='completed', completed_at__isnull=True).exists()
+        assert not txns.filter(status='refunded', refunded_at__isnull=True).exists()
+        assert txns.exclude(search_text='').count() == 1000
+
+    def test_refunds_are_recorded(self, hub_id, synthetic_data):
+        from online_payments.models import PaymentRefund, PaymentTransaction
+
+        synthetic_data(transactions=1000)
+        refunded = PaymentTransaction.objects.filter(hub_id=hub_id, refunded_at__isnull=False)
+
+        assert PaymentRefund.objects.filter(hub_id=hub_id).count() == refunded.count()
+        refund = PaymentRefund.objects.filter(hub_id=hub_id).select_related('transaction').first()
+        assert refund.amount == refund.transaction.refund_amount
+        assert refund.created_at == refund.transaction.refunded_at
+
+    def test_link_uses_match_payments(self, hub_id, synthetic_data):
+        from online_payments.models import PaymentLink, PaymentTransaction
+
+        synthetic_data(transactions=800, links=5)
+
+        paid = PaymentTransaction.objects.filter(
+            hub_id=hub_id, completed_at__isnull=False,
+            payment_link__isnull=False,
+        ).count()
+        uses = PaymentLink.objects.filter(hub_id=hub_id).aggregate(total=Sum('current_uses'))
+        assert paid > 0
+        assert uses['total'] == paid
+
+    def test_link_uses_within_limit(self, hub_id, synthetic_data):
+        from django.db.models import F
+        from online_payments.models import PaymentLink
+
+        synthetic_data(transactions=800, links=20)
+
+        limited = PaymentLink.objects.filter(hub_id=hub_id, max_uses__gt=0)
+        assert limited.exists()
+        assert not limited.filter(current_uses__gt=F('max_uses')).exists()
+
+    def test_deterministic(self, hub_id):
+        from online_payments.synthetic import SyntheticGenerator
+
+        first = SyntheticGenerator(hub_id, seed=7, now=None)
+        second = SyntheticGenerator(hub_id, seed=7, now=first.now)
+        a, b = first.transaction(), second.transaction()
+        assert (a.id, a.transaction_id, a.amount, a.status) == (b.id, b.transaction_id, b.amount, b.status)
+
+        other = SyntheticGenerator(uuid.uuid4(), seed=7, now=first.now).transaction()
+        assert other.transaction_id != a.transaction_id
+
+
+class TestGenerateCommand:
+    """Tests for the generate_payment_data management command."""
+
+    def test_command_rebuilds_rollups(self, hub_id):
+        from online_payments.models import PaymentDailyRollup
+
+        out = io.StringIO()
+        call_command(
+            'generate_payment_data', hub=str(hub_id),
+            transactions=200, links=5, stdout=out,
+        )
+
+        assert '200 transactions and 5 links created' in out.getvalue()
+        assert PaymentDailyRollup.objects.filter(hub_id=hub_id).exists()
@@ -178,6 +178,37 @@ class TestTransactions:
         response = auth_client.get('/m/online_payments/transactions/?gateway=stripe')
         assert response.status_code == 200
 
+    def test_date_filter(self, auth_client, completed_transaction):
+        from django.utils import timezone
+        today = timezone.localdate()
+        response = auth_client.get(
+            f'/m/online_payments/transactions/?date_from={today}&date_to={today}'
+        )
+        assert completed_transaction in response.context['transactions']
+
+        response = auth_client.get('/m/online_payments/transactions/?date_to=2000-01-01')
+        assert completed_transaction not in response.context['transactions']
+
+    def test_invalid_date_filter_is_ignored(self, auth_client, completed_transaction):
+        response = auth_client.get('/m/online_payments/transactions/?date_from=garbage')
+        assert response.status_code == 200
+
+    def test_cursor_pagination(self, auth_client, completed_transaction, pending_transaction):
+        response = auth_client.get('/m/online_payments/transactions/?per_page=1')
+        assert response.status_code == 200
+        page_obj = response.context['page_obj']
+        assert page_obj.next_cursor
+        response = auth_client.get(
+            f'/m/online_payments/transactions/?per_page=1&cursor={page_obj.next_cursor}',
+        )
+        assert response.status_code == 200
+        assert response.context['page_obj'].previous_cursor
+
+    def test_numbered_pagination(self, auth_client, completed_transaction, pending_transaction):
+        response = auth_client.get('/m/online_payments/transactions/?per_page=1&page=2')
+        assert response.status_code == 200
+        assert response.context['page_obj'].number == 2
+
 
 # ---------------------------------------------------------------------------
 # Transaction Detail
@@ -196,6 +227,24 @@ class TestTransactionDetail:
         response = auth_client.get(f'/m/online_payments/transactions/{fake_uuid}/')
         assert response.status_code == 404
 
+    def test_detail_lists_refunds_in_one_query(self, auth_client, completed_transaction):
+        from decimal import Decimal
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        url = f'/m/online_payments/transactions/{completed_transaction.pk}/'
+        completed_transaction.process_refund(Decimal('10.00'), reason='First')
+        with CaptureQueriesContext(connection) as one:
+            auth_client.get(url)
+        for i in range(5):
+            completed_transaction.process_refund(Decimal('1.00'), reason=f'Extra {i}')
+        with CaptureQueriesContext(connection) as six:
+            response = auth_client.get(url)
+
+        assert len(six.captured_queries) == len(one.captured_queries)
+        assert len(response.context['refunds']) == 6
+        assert b'Extra 4' in response.content
+
 
 # ---------------------------------------------------------------------------
 # Refund
@@ -225,6 +274,16 @@ class TestRefund:
         assert data['status'] == 'partially_refunded'
         assert data['refund_amount'] == 30.0
 
+    def test_refund_records_reason(self, auth_client, completed_transaction):
+        response = auth_client.post(
+            f'/m/online_payments/transactions/{completed_transaction.pk}/refund/',
+            data=json.dumps({'amount': 20.0, 'reason': 'Customer request'}),
+            content_type='application/json',
+        )
+        assert response.json()['success'] is True
+        refund = completed_transaction.refunds.get()
+        assert refund.reason == 'Customer request'
+
     def test_refund_pending_fails(self, auth_client, pending_transaction):
         response = auth_client.post(
             f'/m/online_payments/transactions/{pending_transaction.pk}/refund/',
@@ -243,6 +302,34 @@ class TestRefund:
         data = response.json()
         assert data['success'] is False
 
+    def test_refund_exceeded_by_concurrent_refund(self, auth_client, completed_transaction, monkeypatch):
+        from online_payments.models import PaymentTransaction
+        process_refund = PaymentTransaction.process_refund
+
+        def racing_refund(self, amount=None, **kwargs):
+            # Another refund commits between the view's read and its update.
+            process_refund(PaymentTransaction.objects.get(pk=self.pk), Decimal('80.00'))
+            return process_refund(self, amount, **kwargs)
+
+        monkeypatch.setattr(PaymentTransaction, 'process_refund', racing_refund)
+        response = auth_client.post(
+            f'/m/online_payments/transactions/{completed_transaction.pk}/refund/',
+            data=json.dumps({'amount': 30.0}),
+            content_type='application/json',
+        )
+        assert response.status_code == 400
+        assert 'exceeds' in response.json()['error']
+
+    def test_refund_lost_race_conflict(self, auth_client, completed_transaction, monkeypatch):
+        from online_payments.models import PaymentTransaction
+        monkeypatch.setattr(PaymentTransaction, 'process_refund', lambda self, *args, **kwargs: False)
+        response = auth_client.post(
+            f'/m/online_payments/transactions/{completed_transaction.pk}/refund/',
+            data=json.dumps({'amount': 30.0}),
+            content_type='application/json',
+        )
+        assert response.status_code == 409
+
     def test_refund_not_found(self, auth_client):
         fake_uuid = uuid.uuid4()
         response = auth_client.post(
@@ -276,6 +363,14 @@ class TestPaymentLinks:
         response = auth_client.get('/m/online_payments/links/?search=Test')
         assert response.status_code == 200
 
+    def test_filter_active_links(self, auth_client, active_link):
+        response = auth_client.get('/m/online_payments/links/?status=active')
+        assert response.status_code == 200
+        assert active_link in response.context['payment_links']
+
+        response = auth_client.get('/m/online_payments/links/?status=inactive')
+        assert active_link not in response.context['payment_links']
+
 
 # ---------------------------------------------------------------------------
 # Payment Link Create
@@ -408,6 +503,50 @@ class TestCheckout:
         response = client.get('/m/online_payments/checkout/nonexistent-slug/')
         assert response.status_code == 404
 
+    def test_checkout_sends_validators(self, active_link, gateway_settings):
+        client = Client()
+        response = client.get(f'/m/online_payments/checkout/{active_link.slug}/')
+        assert response['ETag']
+        assert response['Last-Modified']
+
+    def test_checkout_conditional_get(self, active_link, gateway_settings):
+        client = Client()
+        url = f'/m/online_payments/checkout/{active_link.slug}/'
+        etag = client.get(url)['ETag']
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+
+    def test_checkout_served_from_cache(self, active_link, gateway_settings, settings):
+        from unittest import mock
+        settings.CACHES = {
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        }
+        client = Client()
+        url = f'/m/online_payments/checkout/{active_link.slug}/'
+        first = client.get(url)
+        with mock.patch('online_payments.views.render_to_string') as render:
+            second = client.get(url)
+        render.assert_not_called()
+        assert second.content == first.content
+
+    def test_consuming_link_changes_etag(self, active_link, gateway_settings):
+        client = Client()
+        url = f'/m/online_payments/checkout/{active_link.slug}/'
+        etag = client.get(url)['ETag']
+        active_link.consume_use()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response['ETag'] != etag
+
+    def test_deactivated_link_not_served_from_cache(self, active_link, gateway_settings):
+        client = Client()
+        url = f'/m/online_payments/checkout/{active_link.slug}/'
+        available = client.get(url)
+        active_link.is_active = False
+        active_link.save()
+        unavailable = client.get(url)
+        assert unavailable.content != available.content
+
 
 # ---------------------------------------------------------------------------
 # Settings
@@ -530,10 +669,30 @@ class TestWebhook:
         data = response.json()
         assert data['received'] is True
 
+        # The notification is only queued until the worker runs
+        completed_transaction.refresh_from_db()
+        assert completed_transaction.status == 'pending'
+
+        from online_payments.webhooks import process_pending_events
+        process_pending_events()
+
         completed_transaction.refresh_from_db()
         assert completed_transaction.status == 'completed'
         assert completed_transaction.gateway_reference == 'pi_webhook_test'
 
+    def test_webhook_is_queued(self):
+        from online_payments.models import WebhookEvent
+        client = Client()
+        response = client.post(
+            '/m/online_payments/api/webhook/',
+            data=json.dumps({'gateway': 'redsys', 'Ds_Order': 'TXN-X'}),
+            content_type='application/json',
+        )
+        assert response.status_code == 200
+        event = WebhookEvent.objects.get()
+        assert event.gateway == 'redsys'
+        assert event.status == 'pending'
+
     def test_webhook_unknown_gateway(self):
         client = Client()
         response = client.post(
@@ -609,6 +768,32 @@ class TestAPICreateSession:
         assert 'transaction_id' in data
         assert data['gateway'] == 'stripe'
 
+    def test_links_payment_link(self, auth_client, stripe_settings, active_payment_link):
+        from online_payments.models import PaymentTransaction
+
+        response = auth_client.post(
+            '/m/online_payments/api/create-session/',
+            data=json.dumps({
+                'amount': 50.00,
+                'payment_link_slug': active_payment_link.slug,
+            }),
+            content_type='application/json',
+        )
+        data = response.json()
+        assert data['success'] is True
+        txn = PaymentTransaction.objects.get(transaction_id=data['transaction_id'])
+        assert txn.payment_link_id == active_payment_link.pk
+        assert list(active_payment_link.transactions.all()) == [txn]
+
+    def test_unknown_payment_link_fails(self, auth_client, stripe_settings):
+        response = auth_client.post(
+            '/m/online_payments/api/create-session/',
+            data=json.dumps({'amount': 50.00, 'payment_link_slug': 'does-not-exist'}),
+            content_type='application/json',
+        )
+        assert response.status_code == 400
+        assert response.json()['success'] is False
+
     def test_zero_amount_fails(self, auth_client, stripe_settings):
         response = auth_client.post(
             '/m/online_payments/api/create-session/',
@@ -620,3 +805,121 @@ class TestAPICreateSession:
         )
         data = response.json()
         assert data['success'] is False
+
+
+class TestBulkCreateView:
+    """Tests for the bulk creation endpoint."""
+
+    def test_bulk_create(self, auth_client, hub_id):
+        from online_payments.models import PaymentLink
+
+        response = auth_client.post(
+            '/m/online_payments/links/bulk/',
+            data=json.dumps({'links': [
+                {'title': 'A', 'amount': '1.00'},
+                {'title': 'B', 'amount': 'abc'},
+            ]}),
+            content_type='application/json',
+        )
+
+        data = response.json()
+        assert response.status_code == 200
+        assert data['created'] == 1
+        assert data['errors'][0]['row'] == 2
+        assert PaymentLink.objects.filter(slug=data['links'][0]['slug']).exists()
+
+    def test_rejects_non_list(self, auth_client):
+        response = auth_client.post(
+            '/m/online_payments/links/bulk/',
+            data=json.dumps({'links': 'nope'}),
+            content_type='application/json',
+        )
+        assert response.status_code == 400
+
+
+class TestBulkRefundView:
+    """Tests for the bulk refund endpoint."""
+
+    def test_refund_by_ids(self, auth_client, completed_transaction, pending_transaction):
+        response = auth_client.post(
+            '/m/online_payments/transactions/refund/bulk/',
+            data=json.dumps({
+                'transaction_ids': [completed_transaction.transaction_id, pending_transaction.transaction_id],
+                'reason': 'Event cancelled',
+            }),
+            content_type='application/json',
+        )
+
+        data = response.json()
+        assert data['success'] is True
+        assert data['refunded'] == 1
+        assert data['refunded_amount'] == '100.00'
+        assert data['errors'][0]['transaction_id'] == pending_transaction.transaction_id
+        assert completed_transaction.refunds.get().reason == 'Event cancelled'
+
+    def test_refund_by_source(self, auth_client, completed_transaction):
+        completed_transaction.source_type = 'event'
+        completed_transaction.source_id = uuid.uuid4()
+        completed_transaction.save()
+
+        response = auth_client.post(
+            '/m/online_payments/transactions/refund/bulk/',
+            data=json.dumps({
+                'source_type': 'event', 'source_id': str(completed_transaction.source_id),
+            }),
+            content_type='application/json',
+        )
+
+        assert response.json()['refunded'] == 1
+        completed_transaction.refresh_from_db()
+        assert completed_transaction.status == 'refunded'
+
+    def test_requires_selection(self, auth_client):
+        response = auth_client.post(
+            '/m/online_payments/transactions/refund/bulk/',
+            data=json.dumps({'reason': 'x'}),
+            content_type='application/json',
+        )
+        assert response.status_code == 400
+
+
+class TestTransactionsExport:
+    """Tests for the streaming transaction export."""
+
+    def _content(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_csv(self, auth_client, completed_transaction, pending_transaction):
+        response = auth_client.get('/m/online_payments/transactions/export/?format=csv')
+
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'text/csv'
+        assert 'attachment' in response['Content-Disposition']
+        lines = self._content(response).decode().splitlines()
+        assert lines[0].startswith('transaction_id,created_at')
+        assert len(lines) == 3
+        assert any(completed_transaction.transaction_id in line for line in lines)
+
+    def test_jsonl_uses_filters(self, auth_client, completed_transaction, pending_transaction):
+        response = auth_client.get(
+            '/m/online_payments/transactions/export/?format=jsonl&status=completed',
+        )
+
+        records = [json.loads(line) for line in self._content(response).decode().splitlines()]
+        assert [r['transaction_id'] for r in records] == [completed_transaction.transaction_id]
+        assert records[0]['amount'] == '100.00'
+        assert records[0]['customer_email'] == 'customer@example.com'
+
+    def test_gzip(self, auth_client, completed_transaction):
+        import gzip
+
+        response = auth_client.get('/m/online_payments/transactions/export/?format=csv&gzip=1')
+
+        assert response['Content-Type'] == 'application/gzip'
+        assert response['Content-Disposition'].endswith('.csv.gz"')
+        text = gzip.decompress(self._content(response)).decode()
+        assert completed_transaction.transaction_id in text
+
+    def test_unsupported_format(self, auth_client):
+        response = auth_client.get('/m/online_payments/transactions/export/?format=xml')
+        assert response.status_code == 400
@@ -0,0 +1,388 @@
+"""
+Tests for the webhook ingestion queue.
+"""
+
+import json
+import pytest
+
+
+pytestmark = [pytest.mark.django_db, pytest.mark.unit]
+
+
+def _stripe_completed(transaction_id, reference='pi_queue_test'):
+    return json.dumps({
+        'gateway': 'stripe',
+        'type': 'checkout.session.completed',
+        'data': {
+            'object': {
+                'metadata': {'transaction_id': transaction_id},
+                'payment_intent': reference,
+                'payment_method_types': ['card'],
+            },
+        },
+    })
+
+
+class TestWebhookQueue:
+
+    def test_enqueue(self):
+        from online_payments.webhooks import enqueue_event
+        event = enqueue_event('stripe', b'{"gateway": "stripe"}')
+        assert event.status == 'pending'
+        assert event.payload == '{"gateway": "stripe"}'
+        assert event.attempts == 0
+
+    def test_process_completes_transaction(self, pending_transaction):
+        from online_payments.webhooks import enqueue_event, process_pending_events
+        event = enqueue_event('stripe', _stripe_completed(pending_transaction.transaction_id))
+        result = process_pending_events()
+        assert result == {'claimed': 1, 'processed': 1}
+
+        event.refresh_from_db()
+        assert event.status == 'processed'
+        assert event.processed_at is not None
+        pending_transaction.refresh_from_db()
+        assert pending_transaction.status == 'completed'
+
+    def test_unknown_transaction_fails_event(self):
+        from online_payments.webhooks import enqueue_event, process_pending_events
+        event = enqueue_event('stripe', _stripe_completed('TXN-MISSING'))
+        process_pending_events()
+        event.refresh_from_db()
+        assert event.status == 'failed'
+        assert 'not found' in event.error_message
+
+    def test_event_processed_once(self, pending_transaction):
+        from online_payments.webhooks import enqueue_event, process_event
+        event = enqueue_event('stripe', _stripe_completed(pending_transaction.transaction_id))
+        assert process_event(event) is True
+        assert process_event(event) is False
+
+    def test_refund_before_completion_is_retried(self, pending_transaction):
+        from decimal import Decimal
+        from online_payments.webhooks import enqueue_event, process_pending_events
+        refund = enqueue_event('stripe', json.dumps({
+            'gateway': 'stripe',
+            'type': 'charge.refunded',
+            'data': {'object': {
+                'metadata': {'transaction_id': pending_transaction.transaction_id},
+                'amount_refunded': 5000,
+                'refunds': {'data': [{'id': 're_early'}]},
+            }},
+        }))
+
+        assert process_pending_events() == {'claimed': 1, 'processed': 0}
+        refund.refresh_from_db()
+        assert refund.status == 'pending'
+        assert refund.attempts == 1
+
+        enqueue_event('stripe', _stripe_completed(pending_transaction.transaction_id))
+        process_pending_events()
+        process_pending_events()
+
+        refund.refresh_from_db()
+        assert refund.status == 'processed'
+        pending_transaction.refresh_from_db()
+        assert pending_transaction.status == 'refunded'
+        assert pending_transaction.refund_amount == Decimal('50.00')
+        assert pending_transaction.refunds.get().gateway_refund_id == 're_early'
+
+    def test_abandoned_event_reclaimed_after_lease(self, pending_transaction):
+        from datetime import timedelta
+        from django.utils import timezone
+        from online_payments.models import WebhookEvent
+        from online_payments.webhooks import (
+            PROCESSING_LEASE, enqueue_event, process_pending_events,
+        )
+        event = enqueue_event('stripe', _stripe_completed(pending_transaction.transaction_id))
+        # A worker claimed the event and died.
+        WebhookEvent.objects.filter(pk=event.pk).update(status='processing', attempts=1)
+        assert process_pending_events()['claimed'] == 0
+
+        WebhookEvent.objects.filter(pk=event.pk).update(
+            updated_at=timezone.now() - PROCESSING_LEASE - timedelta(seconds=1),
+        )
+        assert process_pending_events() == {'claimed': 1, 'processed': 1}
+        event.refresh_from_db()
+        assert event.status == 'processed'
+        assert event.attempts == 2
+
+    def test_abandoned_event_out_of_attempts_fails(self, pending_transaction):
+        from datetime import timedelta
+        from django.utils import timezone
+        from online_payments.models import WebhookEvent
+        from online_payments.webhooks import (
+            MAX_ATTEMPTS, PROCESSING_LEASE, enqueue_event, process_pending_events,
+        )
+        event = enqueue_event('stripe', _stripe_completed(pending_transaction.transaction_id))
+        WebhookEvent.objects.filter(pk=event.pk).update(
+            status='processing',
+            attempts=MAX_ATTEMPTS,
+            updated_at=timezone.now() - PROCESSING_LEASE - timedelta(seconds=1),
+        )
+        assert process_pending_events()['claimed'] == 0
+        event.refresh_from_db()
+        assert event.status == 'failed'
+        pending_transaction.refresh_from_db()
+        assert pending_transaction.status == 'pending'
+
+    def test_redsys_event(self, pending_transaction):
+        from online_payments.webhooks import enqueue_event, process_pending_events
+        enqueue_event('redsys', json.dumps({
+            'gateway': 'redsys',
+            'Ds_Order': pending_transaction.transaction_id,
+            'Ds_Response': '0000',
+            'Ds_AuthorisationCode': '123456',
+        }))
+        process_pending_events()
+        pending_transaction.refresh_from_db()
+        assert pending_transaction.status == 'completed'
+        assert pending_transaction.gateway_reference == '123456'
+
+    def test_command(self, pending_transaction):
+        from io import StringIO
+        from django.core.management import call_command
+        from online_payments.webhooks import enqueue_event
+        enqueue_event('stripe', _stripe_completed(pending_transaction.transaction_id))
+        out = StringIO()
+        call_command('process_webhook_events', concurrency=1, stdout=out)
+        assert '1 webhook events processed' in out.getvalue()
+
+
+class TestWebhookDeduplication:
+
+    def test_event_id_stripe(self):
+        from online_payments.webhooks import event_id_for
+        assert event_id_for('stripe', {'id': 'evt_123'}) == 'evt_123'
+
+    def test_event_id_redsys(self):
+        from online_payments.webhooks import event_id_for
+        body = {'Ds_Order': 'TXN-1', 'Ds_Response': '0000'}
+        assert event_id_for('redsys', body) == 'TXN-1:0000'
+
+    def test_duplicate_rejected_by_cache(self, pending_transaction):
+        from online_payments.models import WebhookEvent
+        from online_payments.webhooks import enqueue_event, get_webhook_metrics
+        payload = _stripe_completed(pending_transaction.transaction_id)
+        before = get_webhook_metrics()['duplicates']
+        assert enqueue_event('stripe', payload) is not None
+        assert enqueue_event('stripe', payload) is None
+        assert WebhookEvent.objects.count() == 1
+        assert get_webhook_metrics()['duplicates'] == before + 1
+
+    def test_duplicate_rejected_by_constraint(self, pending_transaction):
+        from online_payments.caching import clear_all
+        from online_payments.models import WebhookEvent
+        from online_payments.webhooks import enqueue_event
+        payload = _stripe_completed(pending_transaction.transaction_id)
+        enqueue_event('stripe', payload)
+        clear_all()
+        assert enqueue_event('stripe', payload) is None
+        event = WebhookEvent.objects.get()
+        assert event.duplicate_count == 1
+
+    def test_duplicate_not_reprocessed(self, pending_transaction):
+        from online_payments.models import PaymentDailyRollup
+        from online_payments.webhooks import enqueue_event, process_pending_events
+        payload = _stripe_completed(pending_transaction.transaction_id)
+        enqueue_event('stripe', payload)
+        process_pending_events()
+        enqueue_event('stripe', payload)
+        assert process_pending_events()['claimed'] == 0
+        rollup = PaymentDailyRollup.objects.get()
+        assert rollup.completed_count == 1
+
+    def test_view_reports_duplicate(self):
+        from django.test import Client
+        client = Client()
+        payload = json.dumps({'gateway': 'redsys', 'Ds_Order': 'TXN-DUP', 'Ds_Response': '0000'})
+        first = client.post('/m/online_payments/api/webhook/', data=payload,
+                            content_type='application/json')
+        second = client.post('/m/online_payments/api/webhook/', data=payload,
+                             content_type='application/json')
+        assert 'duplicate' not in first.json()
+        assert second.json()['duplicate'] is True
+
+
+class TestProcessEvents:
+
+    def _completed(self, txn, reference='pi_batch'):
+        return json.loads(_stripe_completed(txn.transaction_id, reference))
+
+    def test_applies_batch(self, hub_id, pending_transaction, active_payment_link):
+        from online_payments.models import PaymentTransaction
+        from online_payments.webhooks import process_events
+        other = PaymentTransaction.objects.create(
+            hub_id=hub_id, gateway='redsys', amount='10.00',
+            payment_link=active_payment_link,
+        )
+        results = process_events([
+            self._completed(pending_transaction),
+            {'gateway': 'redsys', 'Ds_Order': other.transaction_id,
+             'Ds_Response': '0000', 'Ds_AuthorisationCode': 'A1'},
+        ], hub_id)
+        assert [r['result'] for r in results] == ['applied', 'applied']
+
+        pending_transaction.refresh_from_db()
+        other.refresh_from_db()
+        active_payment_link.refresh_from_db()
+        assert pending_transaction.status == 'completed'
+        assert pending_transaction.gateway_reference == 'pi_batch'
+        assert 'pi_batch' in pending_transaction.search_text
+        assert other.status == 'completed'
+        assert active_payment_link.current_uses == 1
+
+    def test_one_update_per_event(self, hub_id, django_assert_max_num_queries):
+        from online_payments.models import PaymentTransaction
+        from online_payments.webhooks import process_events
+        txns = [
+            PaymentTransaction.objects.create(hub_id=hub_id, gateway='stripe', amount='5.00')
+            for _ in range(20)
+        ]
+        events = [self._completed(t) for t in txns]
+        with django_assert_max_num_queries(len(events) + 10):
+            results = process_events(events, hub_id)
+        assert all(r['result'] == 'applied' for r in results)
+
+    def test_concurrent_change_is_not_overwritten(self, hub_id, pending_transaction, monkeypatch):
+        from online_payments.models import PaymentTransaction
+        from online_payments.webhooks import process_events
+
+        stale = PaymentTransaction.objects.get(pk=pending_transaction.pk)
+        pending_transaction.mark_completed(gateway_reference='pi_admin')
+        monkeypatch.setattr(
+            type(PaymentTransaction.objects.none()), 'in_bulk',
+            lambda self, *args, **kwargs: {stale.transaction_id: stale},
+        )
+
+        results = process_events([{
+            'gateway': 'stripe', 'type': 'checkout.session.expired',
+            'data': {'object': {'metadata': {'transaction_id': stale.transaction_id}}},
+        }], hub_id)
+
+        assert results[0]['result'] == 'skipped'
+        pending_transaction.refresh_from_db()
+        assert pending_transaction.status == 'completed'
+        assert pending_transaction.gateway_reference == 'pi_admin'
+
+    def test_replay_is_skipped(self, hub_id, pending_transaction):
+        from online_payments.models import PaymentDailyRollup
+        from online_payments.webhooks import process_events
+        event = self._completed(pending_transaction)
+        process_events([event], hub_id)
+        results = process_events([event], hub_id)
+        assert results[0]['result'] == 'skipped'
+        assert PaymentDailyRollup.objects.get().completed_count == 1
+
+    def test_cumulative_refunds_apply_deltas(self, hub_id, completed_transaction):
+        from decimal import Decimal
+        from online_payments.webhooks import process_events
+
+        def refund(cents, refund_id):
+            return {
+                'gateway': 'stripe', 'type': 'charge.refunded',
+                'data': {'object': {
+                    'metadata': {'transaction_id': completed_transaction.transaction_id},
+                    'amount_refunded': cents,
+                    'refunds': {'data': [{'id': refund_id}]},
+                }},
+            }
+
+        results = process_events(
+            [refund(6000, 're_1'), refund(6000, 're_1'), refund(10000, 're_2')], hub_id,
+        )
+        assert [r['result'] for r in results] == ['applied', 'skipped', 'applied']
+        completed_transaction.refresh_from_db()
+        assert completed_transaction.refund_amount == Decimal('100.00')
+        assert completed_transaction.status == 'refunded'
+        assert {
+            (r.gateway_refund_id, r.amount) for r in completed_transaction.refunds.all()
+        } == {('re_1', Decimal('60.00')), ('re_2', Decimal('40.00'))}
+
+        assert process_events([refund(10000, 're_2')], hub_id)[0]['result'] == 'skipped'
+
+    def test_stale_refund_cannot_over_refund(self, hub_id, completed_transaction, monkeypatch):
+        from decimal import Decimal
+        from online_payments.models import PaymentTransaction
+        from online_payments.webhooks import process_events
+
+        stale = PaymentTransaction.objects.get(pk=completed_transaction.pk)
+        completed_transaction.process_refund(Decimal('60.00'), gateway_refund_id='re_1')
+        monkeypatch.setattr(
+            type(PaymentTransaction.objects.none()), 'in_bulk',
+            lambda self, *args, **kwargs: {stale.transaction_id: stale},
+        )
+
+        results = process_events([{
+            'gateway': 'stripe', 'type': 'charge.refunded',
+            'data': {'object': {
+                'metadata': {'transaction_id': stale.transaction_id},
+                'amount_refunded': 10000,
+                'refunds': {'data': [{'id': 're_2'}]},
+            }},
+        }], hub_id)
+
+        assert results[0]['result'] == 'applied'
+        completed_transaction.refresh_from_db()
+        assert completed_transaction.refund_amount == Decimal('100.00')
+        assert sorted(r.amount for r in completed_transaction.refunds.all()) == [
+            Decimal('40.00'), Decimal('60.00'),
+        ]
+
+    def test_errors_reported(self, hub_id):
+        from online_payments.webhooks import process_events
+        results = process_events([
+            {'gateway': 'unknown'},
+            {'gateway': 'redsys', 'Ds_Order': 'TXN-NOPE', 'Ds_Response': '0000'},
+        ], hub_id)
+        assert results[0]['result'] == 'error'
+        assert results[1]['error'] == 'Transaction not found'
+
+    def test_other_hub_transaction_not_found(self, hub_id):
+        import uuid
+        from online_payments.models import PaymentTransaction
+        from online_payments.webhooks import process_events
+        other = PaymentTransaction.objects.create(
+            hub_id=uuid.uuid4(), gateway='stripe', amount='10.00',
+        )
+        results = process_events([self._completed(other)], hub_id)
+        assert results[0] == {
+            'index': 0, 'transaction_id': other.transaction_id,
+            'result': 'error', 'error': 'Transaction not found',
+        }
+        other.refresh_from_db()
+        assert other.status == 'pending'
+
+    def test_commits_per_chunk(self, hub_id, monkeypatch):
+        from django.db import DatabaseError
+        from online_payments.models import PaymentDailyRollup, PaymentTransaction
+        from online_payments.webhooks import process_events
+        txns = [
+            PaymentTransaction.objects.create(hub_id=hub_id, gateway='stripe', amount='5.00')
+            for _ in range(4)
+        ]
+        record = PaymentDailyRollup.record
+        calls = []
+
+        def flaky_record(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 2:
+                raise DatabaseError('connection lost')
+            return record(*args, **kwargs)
+
+        monkeypatch.setattr(PaymentDailyRollup, 'record', flaky_record)
+        results = process_events([self._completed(t) for t in txns], hub_id, chunk_size=2)
+
+        assert [r['result'] for r in results] == ['applied', 'applied', 'error', 'error']
+        statuses = [PaymentTransaction.objects.get(pk=t.pk).status for t in txns]
+        assert statuses == ['completed', 'completed', 'pending', 'pending']
+
+    def test_batch_endpoint(self, auth_client, pending_transaction):
+        response = auth_client.post(
+            '/m/online_payments/api/webhook/batch/',
+            data=json.dumps({'events': [self._completed(pending_transaction)]}),
+            content_type='application/json',
+        )
+        data = response.json()
+        assert data['success'] is True
+        assert data['applied'] == 1
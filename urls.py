@@ -13,12 +13,15 @@ urlpatterns = [
 
     # Transactions
     path('transactions/', views.transactions, name='transactions'),
+    path('transactions/export/', views.transactions_export, name='transactions_export'),
+    path('transactions/refund/bulk/', views.transactions_bulk_refund, name='transactions_bulk_refund'),
     path('transactions/<uuid:pk>/', views.transaction_detail, name='transaction_detail'),
     path('transactions/<uuid:pk>/refund/', views.refund, name='refund'),
 
     # Payment Links
     path('links/', views.payment_links, name='payment_links'),
     path('links/create/', views.payment_link_create, name='payment_link_create'),
+    path('links/bulk/', views.payment_link_bulk_create, name='payment_link_bulk_create'),
     path('links/<uuid:pk>/deactivate/', views.payment_link_deactivate, name='payment_link_deactivate'),
     path('links/<uuid:pk>/delete/', views.payment_link_delete, name='payment_link_delete'),
 
@@ -28,6 +31,7 @@ urlpatterns = [
     # API
     path('api/create-session/', views.api_create_session, name='api_create_session'),
     path('api/webhook/', views.api_webhook, name='api_webhook'),
+    path('api/webhook/batch/', views.api_webhook_batch, name='api_webhook_batch'),
 
     # Settings
     path('settings/', views.settings_view, name='settings'),
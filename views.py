@@ -1,10 +1,14 @@
+import hashlib
 import json
 from decimal import Decimal
 
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render
-from django.db.models import Sum, Count, Q
-from django.utils import timezone
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone, translation
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 from django.utils.translation import gettext_lazy as _
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
@@ -13,8 +17,18 @@ from apps.accounts.decorators import login_required, public_view, permission_req
 from apps.core.htmx import htmx_view
 from apps.modules_runtime.navigation import with_module_nav
 
-from .models import PaymentGatewaySettings, PaymentTransaction, PaymentLink
+from .models import PaymentGatewaySettings, PaymentLink, PaymentTransaction, retry_on_conflict
+from .dateranges import filter_date_range
+from .exports import EXPORT_FORMATS, stream_transactions
 from .forms import PaymentGatewaySettingsForm, PaymentLinkForm
+from .links import DEFAULT_CHUNK_SIZE, bulk_create_payment_links
+from .pagination import paginate_by_cursor
+from .refunds import bulk_refund
+from .search import search_transactions
+from .stats import get_dashboard_stats
+from .webhooks import (
+    WEBHOOK_GATEWAYS, RetryEvent, enqueue_event, process_events, stripe_refund,
+)
 
 
 def _hub_id(request):
@@ -34,51 +48,20 @@ def _hub_id(request):
 )
 def dashboard(request):
     hub = _hub_id(request)
-    today = timezone.now().date()
-
-    base_qs = PaymentTransaction.objects.filter(
-        hub_id=hub, is_deleted=False,
-    )
-
-    # Totals
-    completed_qs = base_qs.filter(status='completed')
-    total_collected = completed_qs.aggregate(
-        s=Sum('amount'),
-    )['s'] or Decimal('0.00')
 
-    pending_qs = base_qs.filter(status='pending')
-    total_pending = pending_qs.aggregate(
-        s=Sum('amount'),
-    )['s'] or Decimal('0.00')
-
-    total_refunded = completed_qs.aggregate(
-        s=Sum('refund_amount'),
-    )['s'] or Decimal('0.00')
-
-    # Today stats
-    today_qs = completed_qs.filter(completed_at__date=today)
-    collected_today = today_qs.aggregate(
-        s=Sum('amount'),
-    )['s'] or Decimal('0.00')
+    stats = get_dashboard_stats(hub)
 
     # Recent transactions
-    recent_transactions = base_qs.order_by('-created_at')[:10]
-
-    # Active payment links count
-    active_links_count = PaymentLink.objects.filter(
-        hub_id=hub, is_deleted=False, is_active=True,
-    ).count()
+    recent_transactions = PaymentTransaction.objects.filter(
+        hub_id=hub, is_deleted=False,
+    ).order_by('-created_at')[:10]
 
     # Settings
     settings = PaymentGatewaySettings.get_settings(hub)
 
     return {
-        'total_collected': total_collected,
-        'total_pending': total_pending,
-        'total_refunded': total_refunded,
-        'collected_today': collected_today,
+        'stats': stats,
         'recent_transactions': recent_transactions,
-        'active_links_count': active_links_count,
         'gateway_settings': settings,
     }
 
@@ -87,29 +70,21 @@ def dashboard(request):
 # Transactions
 # ============================================================================
 
-@require_http_methods(["GET"])
-@login_required
-@with_module_nav('online_payments', 'transactions')
-@htmx_view(
-    'online_payments/pages/transactions.html',
-    'online_payments/partials/transactions_content.html',
-)
-def transactions(request):
-    hub = _hub_id(request)
+def _filter_transactions(request, hub):
+    """
+    Apply the transaction list filters from the query string.
 
+    Returns:
+        (queryset, filters) where ``filters`` holds the template context
+        values describing the active filters.
+    """
     queryset = PaymentTransaction.objects.filter(
         hub_id=hub, is_deleted=False,
     )
 
-    # Filters
     search = request.GET.get('search', '').strip()
     if search:
-        queryset = queryset.filter(
-            Q(transaction_id__icontains=search)
-            | Q(customer_name__icontains=search)
-            | Q(customer_email__icontains=search)
-            | Q(gateway_reference__icontains=search)
-        )
+        queryset = search_transactions(queryset, search)
 
     status = request.GET.get('status', '')
     if status:
@@ -121,38 +96,82 @@ def transactions(request):
 
     date_from = request.GET.get('date_from', '')
     date_to = request.GET.get('date_to', '')
-    if date_from:
-        queryset = queryset.filter(created_at__date__gte=date_from)
-    if date_to:
-        queryset = queryset.filter(created_at__date__lte=date_to)
+    queryset = filter_date_range(queryset, 'created_at', date_from, date_to)
 
-    queryset = queryset.order_by('-created_at')
+    return queryset, {
+        'search': search,
+        'status_filter': status,
+        'gateway_filter': gateway,
+        'date_from': date_from,
+        'date_to': date_to,
+    }
 
-    # Pagination
-    from django.core.paginator import Paginator
-    per_page = int(request.GET.get('per_page', 25))
-    paginator = Paginator(queryset, per_page)
-    page_num = int(request.GET.get('page', 1))
-    page_obj = paginator.get_page(page_num)
 
-    # HTMX table-only requests
-    if request.headers.get('HX-Target') == 'transactions-table-container':
-        return render(request, 'online_payments/partials/transactions_table_body.html', {
-            'transactions': page_obj.object_list,
-            'page_obj': page_obj,
-            'search': search,
-            'status_filter': status,
-            'gateway_filter': gateway,
-        })
+@require_http_methods(["GET"])
+@login_required
+@with_module_nav('online_payments', 'transactions')
+@htmx_view(
+    'online_payments/pages/transactions.html',
+    'online_payments/partials/transactions_content.html',
+)
+def transactions(request):
+    hub = _hub_id(request)
 
-    return {
+    queryset, filters = _filter_transactions(request, hub)
+
+    # Pagination: keyset by default, numbered pages when ?page= is given
+    per_page = int(request.GET.get('per_page', 25))
+    if request.GET.get('page'):
+        from django.core.paginator import Paginator
+        paginator = Paginator(queryset.order_by('-created_at'), per_page)
+        page_num = int(request.GET.get('page', 1))
+        page_obj = paginator.get_page(page_num)
+    else:
+        page_obj = paginate_by_cursor(
+            queryset, request.GET.get('cursor', ''), per_page,
+        )
+
+    context = {
         'transactions': page_obj.object_list,
         'page_obj': page_obj,
-        'search': search,
-        'status_filter': status,
-        'gateway_filter': gateway,
+        **filters,
     }
 
+    # HTMX table-only requests
+    if request.headers.get('HX-Target') == 'transactions-table-container':
+        return render(request, 'online_payments/partials/transactions_table_body.html', context)
+
+    return context
+
+
+@require_http_methods(["GET"])
+@login_required
+def transactions_export(request):
+    """Stream the filtered transaction list as CSV or JSON Lines."""
+    hub = _hub_id(request)
+    queryset, _filters = _filter_transactions(request, hub)
+
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return JsonResponse({
+            'success': False,
+            'error': str(_('Unsupported export format.')),
+        }, status=400)
+    compress = request.GET.get('gzip', '') in ('1', 'true')
+
+    content_type, extension = EXPORT_FORMATS[fmt]
+    filename = f'transactions-{timezone.localdate().isoformat()}.{extension}'
+    if compress:
+        content_type = 'application/gzip'
+        filename += '.gz'
+
+    response = StreamingHttpResponse(
+        stream_transactions(queryset, fmt, compress=compress),
+        content_type=content_type,
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
 
 @require_http_methods(["GET"])
 @login_required
@@ -170,6 +189,7 @@ def transaction_detail(request, pk):
 
     return {
         'transaction': transaction,
+        'refunds': list(transaction.refunds.all()),
     }
 
 
@@ -183,20 +203,30 @@ def refund(request, pk):
         PaymentTransaction,
         id=pk, hub_id=hub, is_deleted=False,
     )
+    not_refundable = str(_('Only completed transactions can be refunded.'))
     try:
-        if transaction.status not in ('completed', 'partially_refunded'):
-            return JsonResponse({
-                'success': False,
-                'error': str(_('Only completed transactions can be refunded.')),
-            })
+        if transaction.status not in PaymentTransaction.REFUNDABLE_STATUSES:
+            return JsonResponse({'success': False, 'error': not_refundable})
 
         body = json.loads(request.body) if request.body else {}
         amount = body.get('amount')
+        reason = str(body.get('reason', ''))[:255]
 
         if amount is not None:
             amount = Decimal(str(amount))
 
-        transaction.process_refund(amount)
+        if not transaction.process_refund(amount, reason=reason):
+            # Report what the stored row no longer allows; only a refund
+            # that would still fit lost a race and can simply be retried.
+            transaction.refresh_from_db(fields=['status', 'refund_amount', 'version'])
+            if transaction.status not in PaymentTransaction.REFUNDABLE_STATUSES:
+                return JsonResponse({'success': False, 'error': not_refundable}, status=400)
+            if amount is not None:
+                transaction.validate_refund(amount)
+            return JsonResponse({
+                'success': False,
+                'error': str(_('The transaction was refunded concurrently. Reload and try again.')),
+            }, status=409)
 
         return JsonResponse({
             'success': True,
@@ -209,6 +239,48 @@ def refund(request, pk):
         return JsonResponse({'success': False, 'error': str(e)}, status=400)
 
 
+@require_http_methods(["POST"])
+@login_required
+def transactions_bulk_refund(request):
+    """
+    Fully refund many transactions at once.
+
+    The JSON body selects the transactions either by ``transaction_ids``
+    or by ``source_type`` and ``source_id`` (e.g. a cancelled event), plus
+    an optional ``reason``.
+    """
+    hub = _hub_id(request)
+
+    try:
+        body = json.loads(request.body)
+        reason = str(body.get('reason', ''))[:255]
+        transaction_ids = body.get('transaction_ids')
+        source_type = body.get('source_type', '')
+        source_id = body.get('source_id')
+
+        if transaction_ids is not None:
+            if not isinstance(transaction_ids, list):
+                return JsonResponse({
+                    'success': False,
+                    'error': str(_('Expected a list of transaction IDs.')),
+                }, status=400)
+            result = bulk_refund(hub, transaction_ids=[str(t) for t in transaction_ids], reason=reason)
+        elif source_type and source_id:
+            queryset = PaymentTransaction.objects.filter(source_type=source_type, source_id=source_id)
+            result = bulk_refund(hub, queryset=queryset, reason=reason)
+        else:
+            return JsonResponse({
+                'success': False,
+                'error': str(_('Pass transaction_ids, or source_type and source_id.')),
+            }, status=400)
+
+        return JsonResponse({'success': True, **result.as_dict()})
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': str(_('Invalid JSON'))}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+
 # ============================================================================
 # Payment Links
 # ============================================================================
@@ -235,9 +307,17 @@ def payment_links(request):
             | Q(slug__icontains=search)
         )
 
+    status = request.GET.get('status', '')
+    if status == 'active':
+        queryset = queryset.filter(is_active=True)
+    elif status == 'inactive':
+        queryset = queryset.filter(is_active=False)
+
     return {
         'payment_links': queryset,
         'link_form': PaymentLinkForm(),
+        'search': search,
+        'status_filter': status,
     }
 
 
@@ -274,6 +354,33 @@ def payment_link_create(request):
     }
 
 
+@require_http_methods(["POST"])
+@login_required
+def payment_link_bulk_create(request):
+    """Create many payment links from a JSON list of link definitions."""
+    hub = _hub_id(request)
+
+    try:
+        body = json.loads(request.body)
+        rows = body.get('links', []) if isinstance(body, dict) else body
+        if not isinstance(rows, list):
+            return JsonResponse({
+                'success': False,
+                'error': str(_('Expected a list of payment links.')),
+            }, status=400)
+        chunk_size = DEFAULT_CHUNK_SIZE
+        if isinstance(body, dict) and body.get('chunk_size'):
+            chunk_size = int(body['chunk_size'])
+
+        result = bulk_create_payment_links(hub, rows, chunk_size=chunk_size)
+
+        return JsonResponse({'success': True, **result.as_dict()})
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': str(_('Invalid JSON'))}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+
 @require_http_methods(["POST"])
 @login_required
 def payment_link_deactivate(request, pk):
@@ -285,8 +392,7 @@ def payment_link_deactivate(request, pk):
         id=pk, hub_id=hub, is_deleted=False,
     )
     try:
-        link.is_active = False
-        link.save(update_fields=['is_active', 'updated_at'])
+        retry_on_conflict(link, lambda link: link.deactivate())
 
         return JsonResponse({'success': True})
     except Exception as e:
@@ -315,26 +421,80 @@ def payment_link_delete(request, pk):
 # Checkout (Public)
 # ============================================================================
 
+def _checkout_cache():
+    from django.conf import settings as django_settings
+    from django.core.cache import caches
+    return caches[getattr(django_settings, 'ONLINE_PAYMENTS_CHECKOUT_CACHE', 'default')]
+
+
+def _checkout_cache_timeout(link):
+    """Seconds a rendered checkout page may be cached; never past expiry."""
+    from django.conf import settings as django_settings
+    timeout = getattr(django_settings, 'ONLINE_PAYMENTS_CHECKOUT_CACHE_TTL', 300)
+    if link.expires_at is not None:
+        remaining = int((link.expires_at - timezone.now()).total_seconds())
+        timeout = max(0, min(timeout, remaining))
+    return timeout
+
+
 @require_http_methods(["GET"])
 @public_view
 def checkout(request, slug):
-    """Public checkout page for a payment link. No login required."""
+    """Public checkout page for a payment link. No login required.
+
+    Rendered pages are cached under the link and settings versions and
+    served with an ETag/Last-Modified pair, so repeat visitors get a 304.
+    Consuming, deactivating or editing a link bumps its ``updated_at`` and
+    therefore changes the cache key.
+    """
     link = get_object_or_404(
         PaymentLink,
         slug=slug, is_deleted=False,
     )
 
-    if not link.is_available:
-        return render(request, 'online_payments/pages/checkout_unavailable.html', {
-            'link': link,
-        })
-
-    settings = PaymentGatewaySettings.get_settings(link.hub_id)
-
-    return render(request, 'online_payments/pages/checkout.html', {
-        'link': link,
-        'gateway_settings': settings,
-    })
+    available = link.is_available
+    settings = PaymentGatewaySettings.get_settings(link.hub_id) if available else None
+
+    last_modified = link.updated_at
+    if settings is not None and settings.updated_at > last_modified:
+        last_modified = settings.updated_at
+
+    version = ':'.join([
+        link.slug,
+        link.updated_at.isoformat(),
+        settings.updated_at.isoformat() if settings is not None else '-',
+        translation.get_language() or '',
+        '1' if available else '0',
+    ])
+    digest = hashlib.md5(version.encode(), usedforsecurity=False).hexdigest()
+    etag = quote_etag(digest)
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp()),
+    )
+    if response is None:
+        cache = _checkout_cache()
+        cache_key = f'online_payments:checkout:{digest}'
+        content = cache.get(cache_key)
+        if content is None:
+            if available:
+                content = render_to_string('online_payments/pages/checkout.html', {
+                    'link': link,
+                    'gateway_settings': settings,
+                }, request=request)
+            else:
+                content = render_to_string('online_payments/pages/checkout_unavailable.html', {
+                    'link': link,
+                }, request=request)
+            timeout = _checkout_cache_timeout(link)
+            if timeout:
+                cache.set(cache_key, content, timeout)
+        response = HttpResponse(content)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified.timestamp())
+    patch_cache_control(response, no_cache=True)
+    return response
 
 
 # ============================================================================
@@ -364,6 +524,17 @@ def api_create_session(request):
                 'error': str(_('Amount must be greater than zero.')),
             }, status=400)
 
+        payment_link_id = None
+        if payment_link_slug:
+            payment_link_id = PaymentLink.objects.filter(
+                hub_id=hub, slug=payment_link_slug, is_deleted=False,
+            ).values_list('id', flat=True).first()
+            if payment_link_id is None:
+                return JsonResponse({
+                    'success': False,
+                    'error': str(_('Payment link not found.')),
+                }, status=400)
+
         settings = PaymentGatewaySettings.get_settings(hub)
 
         if settings.active_gateway == 'none':
@@ -384,9 +555,7 @@ def api_create_session(request):
             description=description,
             source_type=source_type,
             source_id=source_id,
-            metadata={
-                'payment_link_slug': payment_link_slug,
-            },
+            payment_link_id=payment_link_id,
         )
 
         # Gateway-specific session creation
@@ -411,8 +580,7 @@ def api_create_session(request):
             )
 
         elif settings.active_gateway == 'manual':
-            transaction.status = 'processing'
-            transaction.save(update_fields=['status', 'updated_at'])
+            transaction.transition('processing')
             session_data['message'] = str(
                 _('Manual payment pending confirmation.')
             )
@@ -437,24 +605,62 @@ def api_webhook(request):
     """
     Webhook handler for payment gateway notifications.
     No login required. CSRF exempt.
+
+    The notification is stored and acknowledged immediately; it is applied
+    by the webhook worker (see webhooks.process_pending_events).
     """
     try:
         body = json.loads(request.body)
         gateway = body.get('gateway', '')
 
-        if gateway == 'stripe':
-            return _handle_stripe_webhook(request, body)
-        elif gateway == 'redsys':
-            return _handle_redsys_webhook(request, body)
-        else:
+        if gateway not in WEBHOOK_GATEWAYS:
             return JsonResponse({'error': 'Unknown gateway'}, status=400)
 
+        event = enqueue_event(gateway, request.body, body)
+        if event is None:
+            return JsonResponse({'received': True, 'duplicate': True})
+        return JsonResponse({'received': True})
+
     except json.JSONDecodeError:
         return JsonResponse({'error': _('Invalid JSON')}, status=400)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 
+@require_http_methods(["POST"])
+@login_required
+def api_webhook_batch(request):
+    """
+    Apply a batch of gateway notifications synchronously.
+
+    Accepts a JSON list of events (or ``{"events": [...]}``) in the same
+    format as api_webhook. Used to replay gateway event exports and for
+    reconciliation backfills. Only transactions of the session's hub are
+    changed.
+    """
+    try:
+        body = json.loads(request.body)
+        events = body.get('events', []) if isinstance(body, dict) else body
+        if not isinstance(events, list):
+            return JsonResponse({
+                'success': False,
+                'error': str(_('Expected a list of events.')),
+            }, status=400)
+
+        results = process_events(events, _hub_id(request))
+
+        return JsonResponse({
+            'success': True,
+            'applied': sum(1 for r in results if r['result'] == 'applied'),
+            'results': results,
+        })
+
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': str(_('Invalid JSON'))}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+
 def _handle_stripe_webhook(request, body):
     """Handle Stripe webhook events."""
     event_type = body.get('type', '')
@@ -472,28 +678,25 @@ def _handle_stripe_webhook(request, body):
         return JsonResponse({'error': 'Transaction not found'}, status=404)
 
     if event_type == 'checkout.session.completed':
-        transaction.gateway_reference = data.get('payment_intent', '')
-        transaction.payment_method_type = data.get('payment_method_types', ['card'])[0]
-        transaction.save(update_fields=['gateway_reference', 'payment_method_type', 'updated_at'])
-        transaction.mark_completed()
-
-        # Increment payment link usage if applicable
-        slug = transaction.metadata.get('payment_link_slug')
-        if slug:
-            try:
-                link = PaymentLink.objects.get(slug=slug)
-                link.current_uses += 1
-                link.save(update_fields=['current_uses', 'updated_at'])
-            except PaymentLink.DoesNotExist:
-                pass
+        # mark_completed() also consumes the payment link use, so only the
+        # delivery that completed the transaction counts.
+        retry_on_conflict(transaction, lambda txn: txn.mark_completed(
+            gateway_reference=data.get('payment_intent', ''),
+            payment_method_type=data.get('payment_method_types', ['card'])[0],
+        ))
 
     elif event_type == 'checkout.session.expired':
-        transaction.mark_failed('Session expired')
+        retry_on_conflict(transaction, lambda txn: txn.mark_failed('Session expired'))
 
     elif event_type == 'charge.refunded':
-        refund_amount = Decimal(str(data.get('amount_refunded', 0))) / 100
-        if refund_amount > 0:
-            transaction.process_refund(refund_amount)
+        # amount_refunded is cumulative; apply what is not recorded yet.
+        refunded_total, refund_id = stripe_refund(data)
+        delta = refunded_total - transaction.refund_amount
+        if delta > 0 and not transaction.process_refund(delta, gateway_refund_id=refund_id):
+            transaction.refresh_from_db(fields=['status'])
+            if transaction.status not in PaymentTransaction.REFUNDABLE_STATUSES:
+                # Delivered before the completion; keep the event queued.
+                raise RetryEvent(f'{transaction_id} is {transaction.status}, not refundable yet')
 
     return JsonResponse({'received': True})
 
@@ -517,22 +720,17 @@ def _handle_redsys_webhook(request, body):
     try:
         code = int(response_code)
         if 0 <= code <= 99:
-            transaction.gateway_reference = body.get('Ds_AuthorisationCode', '')
-            transaction.mark_completed()
-
-            # Increment payment link usage
-            slug = transaction.metadata.get('payment_link_slug')
-            if slug:
-                try:
-                    link = PaymentLink.objects.get(slug=slug)
-                    link.current_uses += 1
-                    link.save(update_fields=['current_uses', 'updated_at'])
-                except PaymentLink.DoesNotExist:
-                    pass
+            retry_on_conflict(transaction, lambda txn: txn.mark_completed(
+                gateway_reference=body.get('Ds_AuthorisationCode', ''),
+            ))
         else:
-            transaction.mark_failed(f'Redsys error code: {response_code}')
+            retry_on_conflict(
+                transaction, lambda txn: txn.mark_failed(f'Redsys error code: {response_code}'),
+            )
     except (ValueError, TypeError):
-        transaction.mark_failed(f'Invalid Redsys response: {response_code}')
+        retry_on_conflict(
+            transaction, lambda txn: txn.mark_failed(f'Invalid Redsys response: {response_code}'),
+        )
 
     return JsonResponse({'received': True})
 
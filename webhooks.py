@@ -0,0 +1,530 @@
+"""
+Webhook ingestion queue.
+
+``api_webhook`` only stores the raw notification as a WebhookEvent and
+acknowledges it, so gateway retries are not driven by database latency.
+Stored events are drained by ``process_pending_events()`` (see the
+``process_webhook_events`` management command), which feeds them through
+the regular gateway handlers.
+"""
+
+import json
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .caching import LocalCache
+from .models import (
+    ConcurrentUpdateError, PaymentDailyRollup, PaymentLink, PaymentTransaction,
+    WebhookEvent, retry_on_conflict,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class RetryEvent(Exception):
+    """A handler cannot apply the event yet; it is retried later."""
+
+
+WEBHOOK_GATEWAYS = ('stripe', 'redsys')
+
+# Events failing with an unexpected error are retried this many times.
+MAX_ATTEMPTS = 5
+
+# An event left in 'processing' this long belongs to a worker that died
+# mid-event; it is claimed again (or failed once out of attempts).
+PROCESSING_LEASE = timedelta(
+    seconds=getattr(settings, 'ONLINE_PAYMENTS_WEBHOOK_LEASE_SECONDS', 300),
+)
+
+# Recently accepted (gateway, event_id) pairs. Redeliveries that hit this
+# cache are rejected without a database round-trip; the unique constraint
+# on WebhookEvent catches the rest.
+_recent_events = LocalCache(
+    maxsize=getattr(settings, 'ONLINE_PAYMENTS_WEBHOOK_DEDUP_CACHE_SIZE', 10000),
+)
+
+_metrics_lock = threading.Lock()
+_metrics = {'received': 0, 'duplicates': 0, 'processed': 0, 'failed': 0}
+
+
+def _count(metric, value=1):
+    with _metrics_lock:
+        _metrics[metric] += value
+
+
+def get_webhook_metrics():
+    """Return this process's webhook counters (received, duplicates, ...)."""
+    with _metrics_lock:
+        return dict(_metrics)
+
+
+def event_id_for(gateway, body):
+    """
+    Return the deduplication key of a gateway notification.
+
+    Stripe events carry a unique ``id``; payloads without one fall back to
+    their type and object. Redsys notifications are identified by order
+    and response code.
+    """
+    if gateway == 'stripe':
+        if body.get('id'):
+            return str(body['id'])
+        data = body.get('data', {}).get('object', {})
+        transaction_id = data.get('metadata', {}).get('transaction_id', '')
+        return ':'.join(str(part) for part in (
+            body.get('type', ''),
+            data.get('id') or transaction_id,
+            data.get('amount_refunded', ''),
+        ))
+    if gateway == 'redsys':
+        return f"{body.get('Ds_Order', '')}:{body.get('Ds_Response', '')}"
+    return ''
+
+
+def enqueue_event(gateway, raw_body, body=None):
+    """
+    Persist an inbound notification for asynchronous processing.
+
+    Args:
+        gateway: Gateway the notification came from.
+        raw_body: Request body as received.
+        body: Parsed body, used to derive the deduplication key.
+
+    Returns:
+        The new WebhookEvent, or None if the event was already received.
+    """
+    if isinstance(raw_body, bytes):
+        raw_body = raw_body.decode('utf-8')
+    if body is None:
+        body = json.loads(raw_body)
+
+    event_id = event_id_for(gateway, body)
+    key = (gateway, event_id)
+    _count('received')
+
+    if event_id and key in _recent_events:
+        _count('duplicates')
+        return None
+
+    try:
+        with transaction.atomic():
+            event = WebhookEvent.objects.create(
+                gateway=gateway, event_id=event_id, payload=raw_body,
+            )
+    except IntegrityError:
+        WebhookEvent.objects.filter(gateway=gateway, event_id=event_id).update(
+            duplicate_count=F('duplicate_count') + 1,
+        )
+        _recent_events.set(key, True)
+        _count('duplicates')
+        return None
+
+    if event_id:
+        _recent_events.set(key, True)
+    return event
+
+
+def _claimable(now):
+    """Pending events, plus 'processing' events whose lease has expired."""
+    return Q(status='pending') | Q(
+        status='processing',
+        updated_at__lt=now - PROCESSING_LEASE,
+        attempts__lt=MAX_ATTEMPTS,
+    )
+
+
+def fail_expired_leases(now=None):
+    """
+    Fail events whose lease expired on their last attempt.
+
+    Returns:
+        Number of events marked failed.
+    """
+    now = now or timezone.now()
+    failed = WebhookEvent.objects.filter(
+        status='processing',
+        updated_at__lt=now - PROCESSING_LEASE,
+        attempts__gte=MAX_ATTEMPTS,
+    ).update(
+        status='failed',
+        error_message='Processing lease expired.',
+        updated_at=now,
+    )
+    if failed:
+        _count('failed', failed)
+    return failed
+
+
+def _get_handler(gateway):
+    from .views import _handle_redsys_webhook, _handle_stripe_webhook
+    return {
+        'stripe': _handle_stripe_webhook,
+        'redsys': _handle_redsys_webhook,
+    }[gateway]
+
+
+def process_event(event):
+    """
+    Process a single stored event.
+
+    The event is claimed with a conditional UPDATE first, so concurrent
+    workers never handle the same event twice. The claim is a lease: an
+    event still 'processing' after PROCESSING_LEASE (its worker died) can
+    be claimed again, counting as another attempt.
+
+    Returns:
+        True if the event was processed successfully.
+    """
+    now = timezone.now()
+    claimed = WebhookEvent.objects.filter(_claimable(now), pk=event.pk).update(
+        status='processing',
+        attempts=F('attempts') + 1,
+        updated_at=now,
+    )
+    if not claimed:
+        return False
+
+    try:
+        body = json.loads(event.payload)
+        response = _get_handler(event.gateway)(None, body)
+    except Exception as e:
+        if isinstance(e, RetryEvent):
+            logger.info('Webhook event %s deferred: %s', event.pk, e)
+        else:
+            logger.exception('Webhook event %s failed', event.pk)
+        event.refresh_from_db(fields=['attempts'])
+        retry = event.attempts < MAX_ATTEMPTS
+        WebhookEvent.objects.filter(pk=event.pk).update(
+            status='pending' if retry else 'failed',
+            error_message=str(e),
+            updated_at=timezone.now(),
+        )
+        if not retry:
+            _count('failed')
+        return False
+
+    if response.status_code >= 400:
+        WebhookEvent.objects.filter(pk=event.pk).update(
+            status='failed',
+            error_message=response.content.decode('utf-8'),
+            processed_at=timezone.now(),
+            updated_at=timezone.now(),
+        )
+        _count('failed')
+        return False
+
+    WebhookEvent.objects.filter(pk=event.pk).update(
+        status='processed',
+        error_message='',
+        processed_at=timezone.now(),
+        updated_at=timezone.now(),
+    )
+    _count('processed')
+    return True
+
+
+def _transaction_key(event):
+    """Return the transaction an event refers to, for ordered partitioning."""
+    try:
+        body = json.loads(event.payload)
+    except ValueError:
+        return ''
+    if event.gateway == 'stripe':
+        data = body.get('data', {}).get('object', {})
+        return data.get('metadata', {}).get('transaction_id', '')
+    return body.get('Ds_Order', '')
+
+
+def _process_chunk(events):
+    processed = 0
+    try:
+        for event in events:
+            if process_event(event):
+                processed += 1
+    finally:
+        # Worker threads own their connection; release it when done.
+        connection.close()
+    return processed
+
+
+def process_pending_events(limit=500, concurrency=1):
+    """
+    Drain up to ``limit`` pending events, oldest first.
+
+    Events abandoned in 'processing' by a dead worker are picked up again
+    once their lease expires.
+
+    Args:
+        limit: Maximum number of events to take from the queue.
+        concurrency: Number of worker threads. With 1, events are
+            processed in the calling thread.
+
+    Returns:
+        dict with the number of ``claimed`` and ``processed`` events.
+    """
+    now = timezone.now()
+    fail_expired_leases(now)
+    events = list(
+        WebhookEvent.objects.filter(_claimable(now))
+        .order_by('received_at')[:limit]
+    )
+    if not events:
+        return {'claimed': 0, 'processed': 0}
+
+    if concurrency <= 1:
+        processed = sum(process_event(event) for event in events)
+    else:
+        # Events for the same transaction go to the same worker, in
+        # arrival order, so e.g. a refund never overtakes its completion.
+        chunks = [[] for _ in range(concurrency)]
+        for event in events:
+            chunks[hash(_transaction_key(event)) % concurrency].append(event)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            processed = sum(executor.map(_process_chunk, chunks))
+
+    return {'claimed': len(events), 'processed': processed}
+
+
+# ---------------------------------------------------------------------------
+# Batch processing
+# ---------------------------------------------------------------------------
+
+COMPLETABLE_STATUSES = PaymentTransaction.TRANSITIONS['completed']
+FAILABLE_STATUSES = PaymentTransaction.TRANSITIONS['failed']
+REFUNDABLE_STATUSES = PaymentTransaction.REFUNDABLE_STATUSES
+
+# Events of a batch committed per database transaction.
+BATCH_CHUNK_SIZE = 100
+
+def stripe_refund(charge):
+    """
+    Read the refund totals of a Stripe ``charge.refunded`` object.
+
+    ``amount_refunded`` is cumulative over all refunds of the charge, so
+    callers apply the difference with the locally recorded refund total.
+
+    Returns:
+        (refunded_total, refund_id) with the total as a Decimal and the id
+        of the most recent refund ('' if the charge does not embed them).
+    """
+    total = Decimal(str(charge.get('amount_refunded', 0))) / 100
+    refunds = (charge.get('refunds') or {}).get('data') or [{}]
+    return total, refunds[0].get('id', '')
+
+
+def parse_event(body):
+    """
+    Translate a gateway notification into a state change.
+
+    Returns:
+        (transaction_id, action, params) where action is ``complete``,
+        ``fail``, ``refund`` or None for events that change nothing.
+
+    Raises:
+        ValueError: If the event is malformed.
+    """
+    gateway = body.get('gateway', '')
+
+    if gateway == 'stripe':
+        event_type = body.get('type', '')
+        data = body.get('data', {}).get('object', {})
+        transaction_id = data.get('metadata', {}).get('transaction_id', '')
+        if not transaction_id:
+            raise ValueError('Missing transaction_id')
+        if event_type == 'checkout.session.completed':
+            return transaction_id, 'complete', {
+                'gateway_reference': data.get('payment_intent', ''),
+                'payment_method_type': data.get('payment_method_types', ['card'])[0],
+            }
+        if event_type == 'checkout.session.expired':
+            return transaction_id, 'fail', {'error': 'Session expired'}
+        if event_type == 'charge.refunded':
+            total, refund_id = stripe_refund(data)
+            if total > 0:
+                return transaction_id, 'refund', {
+                    'refunded_total': total, 'gateway_refund_id': refund_id,
+                }
+        return transaction_id, None, {}
+
+    if gateway == 'redsys':
+        transaction_id = body.get('Ds_Order', '')
+        response_code = body.get('Ds_Response', '')
+        if not transaction_id:
+            raise ValueError('Missing Ds_Order')
+        try:
+            code = int(response_code)
+        except (ValueError, TypeError):
+            return transaction_id, 'fail', {
+                'error': f'Invalid Redsys response: {response_code}',
+            }
+        if 0 <= code <= 99:
+            return transaction_id, 'complete', {
+                'gateway_reference': body.get('Ds_AuthorisationCode', ''),
+            }
+        return transaction_id, 'fail', {
+            'error': f'Redsys error code: {response_code}',
+        }
+
+    raise ValueError('Unknown gateway')
+
+
+def _apply_event(txn, action, params, now):
+    """
+    Apply one parsed event to ``txn`` with a conditional UPDATE.
+
+    Completions and failures match the version that was read; refunds go
+    through process_refund(), whose UPDATE is guarded by
+    ``refund_amount + x <= amount`` and which records the PaymentRefund
+    and its rollup counters itself.
+
+    Returns:
+        True if the event applied, False if it does not apply to the
+        current state.
+
+    Raises:
+        ConcurrentUpdateError: The row changed since ``txn`` was read.
+        ValueError: The refund amount is invalid.
+    """
+    if action == 'complete' and txn.status in COMPLETABLE_STATUSES:
+        failed_at = txn.failure_time() if txn.status == 'failed' else None
+        applied = txn.transition('completed', completed_at=now, **params)
+        if applied and failed_at is not None:
+            # Take back the failure counted on the day it happened, as
+            # mark_completed() does.
+            PaymentDailyRollup.record(
+                txn.hub_id, txn.gateway, txn.currency, failed_at, failed_count=-1,
+            )
+        return applied
+    if action == 'fail' and txn.status in FAILABLE_STATUSES:
+        return txn.transition('failed', error_message=params['error'])
+    if action == 'refund' and txn.status in REFUNDABLE_STATUSES:
+        # Stripe reports the cumulative refunded amount; redeliveries
+        # and already recorded refunds leave nothing to apply.
+        for _attempt in range(2):
+            delta = params['refunded_total'] - txn.refund_amount
+            if delta <= 0:
+                return False
+            if txn.process_refund(delta, gateway_refund_id=params['gateway_refund_id']):
+                return True
+            # The guard rejected a delta computed from a stale total;
+            # recompute it once from the stored refunds.
+            txn.refresh_from_db(fields=['status', 'refund_amount', 'refunded_at', 'version'])
+            if txn.status not in REFUNDABLE_STATUSES:
+                return False
+    return False
+
+
+def process_events(events, hub_id, chunk_size=BATCH_CHUNK_SIZE):
+    """
+    Apply a batch of gateway notifications with a bounded number of queries.
+
+    All referenced transactions of ``hub_id`` are loaded with one query;
+    events for transactions of other hubs report "Transaction not found".
+    Each event is then written as its own conditional UPDATE matching the
+    version that was read (see PaymentTransaction.transition()), so a
+    concurrent webhook, refund or admin change is never overwritten; on a
+    conflict the row is reloaded and the event re-validated. Refunds use
+    the guarded update of process_refund(). Events whose transition no
+    longer applies (e.g. completing an already completed transaction) are
+    skipped, so replays are safe.
+
+    Events are committed ``chunk_size`` at a time, each chunk together
+    with its completion, failure and payment link counters, so rows are
+    only locked for the length of one short chunk. If a chunk fails with
+    a database error, its events are reported as errors and the
+    remaining chunks still apply.
+
+    Args:
+        events: Iterable of parsed notification bodies, as accepted by
+            api_webhook.
+        hub_id: Hub whose transactions the events may change.
+        chunk_size: Events committed per database transaction.
+
+    Returns:
+        List of per-event result dicts with ``index``, ``transaction_id``
+        and ``result`` (applied/skipped/conflict/error), plus ``error`` on
+        failures. ``conflict`` means the row kept changing concurrently.
+    """
+    parsed = []
+    results = []
+    for index, body in enumerate(events):
+        try:
+            transaction_id, action, params = parse_event(body)
+        except (ValueError, TypeError, AttributeError) as e:
+            results.append({'index': index, 'transaction_id': '', 'result': 'error', 'error': str(e)})
+            continue
+        parsed.append((index, transaction_id, action, params))
+
+    transactions = PaymentTransaction.objects.filter(
+        hub_id=hub_id, is_deleted=False,
+    ).in_bulk(
+        {transaction_id for _index, transaction_id, _action, _params in parsed},
+        field_name='transaction_id',
+    )
+
+    now = timezone.now()
+    for offset in range(0, len(parsed), chunk_size):
+        chunk_results = []
+        try:
+            with transaction.atomic():
+                _apply_chunk(parsed[offset:offset + chunk_size], transactions, now, chunk_results)
+        except DatabaseError as e:
+            logger.exception('Webhook batch chunk at event %d failed', offset)
+            for result in chunk_results:
+                if result['result'] != 'error':
+                    result.update(result='error', error=str(e))
+        results.extend(chunk_results)
+
+    results.sort(key=lambda r: r['index'])
+    return results
+
+
+def _apply_chunk(chunk, transactions, now, results):
+    rollup_deltas = defaultdict(lambda: defaultdict(int))
+    link_uses = defaultdict(int)
+
+    for index, transaction_id, action, params in chunk:
+        result = {'index': index, 'transaction_id': transaction_id, 'result': 'skipped'}
+        results.append(result)
+
+        txn = transactions.get(transaction_id)
+        if txn is None:
+            result.update(result='error', error='Transaction not found')
+            continue
+
+        try:
+            applied = retry_on_conflict(
+                txn, lambda txn: _apply_event(txn, action, params, now),
+            )
+        except ConcurrentUpdateError:
+            result['result'] = 'conflict'
+            continue
+        except ValueError as e:
+            result.update(result='error', error=str(e))
+            continue
+        if not applied:
+            continue
+
+        bucket = rollup_deltas[(txn.hub_id, txn.gateway, txn.currency)]
+        if action == 'complete':
+            bucket['completed_count'] += 1
+            bucket['completed_amount'] += txn.amount
+            if txn.payment_link_id:
+                link_uses[txn.payment_link_id] += 1
+        elif action == 'fail':
+            bucket['failed_count'] += 1
+        result['result'] = 'applied'
+
+    for (row_hub, gateway, currency), deltas in rollup_deltas.items():
+        PaymentDailyRollup.record(row_hub, gateway, currency, now, **deltas)
+    PaymentLink.consume_bulk(link_uses)